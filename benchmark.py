@@ -0,0 +1,300 @@
+"""
+Benchmark de las etapas del pipeline sobre exportaciones sintéticas.
+
+Genera (o reutiliza) una exportación con sintetico.py y mide cada etapa en un
+proceso propio, para que el pico de memoria de una no contamine a la otra:
+
+- procesar_csv: transformación de la exportación (script1).
+- leer_registros: lectura del archivo procesado y conversión a registros (script2).
+- serializacion: cuerpo (JSON comprimido) de los bloques que se envían a Ninox.
+- tuplas: tuplas para el INSERT del almacén.
+
+Por etapa se registra el tiempo de reloj, las filas por segundo y el pico de
+memoria (RSS) en un archivo JSON y se compara con la línea base del
+repositorio (benchmark_base.json, medida con 100000 filas): el comando
+termina con código 1 cuando alguna etapa queda por debajo de la base en más
+de la tolerancia, y con código 2 si no encuentra la base.
+
+Las filas por segundo dependen de la máquina, así que cada medición corre
+también una calibración (un trabajo fijo de texto, diccionarios, JSON y
+numpy) y la base se escala por la razón entre la calibración actual y la de
+la base: lo que se compara es la velocidad relativa a la máquina. Si la base
+se vuelve a medir (por ejemplo, después de una mejora intencional), se
+regenera en la misma máquina con:
+    python benchmark.py --filas 100000 --guardar-base
+y se versiona el benchmark_base.json resultante.
+
+Uso:
+    python benchmark.py --filas 100000                    # mide y compara con la base
+    python benchmark.py --filas 100000 --guardar-base     # guarda la medición como base
+    python benchmark.py --filas 100000 --sin-comparar     # sólo mide
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from telemetria import MedicionMemoria
+
+RUTA_RESULTADOS = os.environ.get("RUTA_BENCHMARK", "benchmark_resultados.json")
+RUTA_BASE = os.environ.get("RUTA_BENCHMARK_BASE", "benchmark_base.json")
+# Fracción de filas por segundo que una etapa puede perder contra la base
+TOLERANCIA = float(os.environ.get("TOLERANCIA_BENCHMARK", "0.2"))
+
+ETAPAS = ("procesar_csv", "leer_registros", "serializacion", "tuplas")
+
+def _etapa_procesar_csv(directorio, exportacion):
+    import script1
+    # Se trabaja sobre una copia para no mezclar salidas entre ejecuciones
+    entrada = os.path.join(directorio, "transformacion", os.path.basename(exportacion))
+    os.makedirs(os.path.dirname(entrada), exist_ok=True)
+    shutil.copyfile(exportacion, entrada)
+    inicio = time.perf_counter()
+    # Lo mismo que procesar_csv, pero propagando errores y con el número de filas
+    procesado, filas = script1.transformar_archivo(entrada)
+    segundos = time.perf_counter() - inicio
+    shutil.move(procesado, _ruta_procesado(directorio, procesado))
+    return segundos, filas
+
+def _ruta_procesado(directorio, procesado=None):
+    """
+    Ruta donde queda el archivo procesado (CSV, Arrow o Parquet según la configuración).
+    """
+    if procesado is not None:
+        return os.path.join(directorio, "procesado" + os.path.splitext(procesado)[1])
+    return next(os.path.join(directorio, nombre) for nombre in sorted(os.listdir(directorio))
+                if nombre.startswith("procesado."))
+
+def _etapa_leer_registros(directorio, exportacion):
+    import script2
+    inicio = time.perf_counter()
+    filas = sum(len(lote) for lote in script2.leer_por_lotes(_ruta_procesado(directorio)))
+    return time.perf_counter() - inicio, filas
+
+def _medir_por_lote(directorio, operacion):
+    """
+    Recorre los lotes del archivo procesado y suma sólo el tiempo de
+    'operacion' sobre cada lote (la lectura no cuenta). Devuelve (segundos, filas).
+    """
+    import script2
+    segundos, filas = 0.0, 0
+    for lote in script2.leer_por_lotes(_ruta_procesado(directorio)):
+        inicio = time.perf_counter()
+        operacion(lote)
+        segundos += time.perf_counter() - inicio
+        filas += len(lote)
+    return segundos, filas
+
+def _etapa_serializacion(directorio, exportacion):
+    from ninox import SubidorNinox, TAMANO_BLOQUE_NINOX
+    subidor = SubidorNinox("http://localhost", {})
+
+    def serializar(lote):
+        # Recorre el cuerpo por partes tal como lo consume requests al enviarlo
+        for i in range(0, len(lote), TAMANO_BLOQUE_NINOX):
+            for _ in subidor.cuerpo(lote[i:i + TAMANO_BLOQUE_NINOX]):
+                pass
+
+    try:
+        return _medir_por_lote(directorio, serializar)
+    finally:
+        subidor.cerrar()
+
+def _etapa_tuplas(directorio, exportacion):
+    import script2
+    return _medir_por_lote(directorio, script2.construir_tuplas)
+
+FUNCIONES_ETAPA = {
+    "procesar_csv": _etapa_procesar_csv,
+    "leer_registros": _etapa_leer_registros,
+    "serializacion": _etapa_serializacion,
+    "tuplas": _etapa_tuplas,
+}
+
+def _calibracion(segundos=0.4, rondas=3):
+    """
+    Repite un trabajo fijo parecido al del pipeline (armar diccionarios,
+    texto, JSON y numpy) y devuelve repeticiones por segundo: la mejor de
+    'rondas' rondas de 'segundos', para que una interrupción no la baje.
+    """
+    import numpy as np
+    generador = np.random.default_rng(0)
+    mejor = 0.0
+    for _ in range(rondas):
+        repeticiones = 0
+        inicio = time.perf_counter()
+        while time.perf_counter() - inicio < segundos:
+            filas = [{"Sku": str(i), "Depto": f"Depto {i % 40}", "Venta": i * 1.5}
+                     for i in range(5000)]
+            json.loads(json.dumps(filas))
+            np.sort(generador.random(50_000))
+            repeticiones += 1
+        mejor = max(mejor, repeticiones / (time.perf_counter() - inicio))
+    return mejor
+
+def _contar_filas(ruta):
+    with open(ruta, "rb") as f:
+        return max(0, sum(1 for _ in f) - 1)
+
+def _medir_en_proceso(etapa, directorio, exportacion):
+    """
+    Se ejecuta en un proceso nuevo: corre la etapa y devuelve su medición.
+    """
+    # ru_maxrss no sirve aquí: el proceso nuevo hereda el pico del que lo lanzó
+    with MedicionMemoria() as memoria:
+        segundos, filas = FUNCIONES_ETAPA[etapa](directorio, exportacion)
+    return {
+        "segundos": round(segundos, 4),
+        "filas": filas,
+        "filas_por_segundo": round(filas / segundos, 1) if segundos > 0 else None,
+        "pico_memoria_mb": round(memoria.pico_mb, 1),
+    }
+
+def medir(exportacion, etapas=ETAPAS):
+    """
+    Mide las etapas en orden, cada una en un proceso propio, después de la
+    calibración. Devuelve (diccionario etapa -> medición, calibración).
+    """
+    directorio = tempfile.mkdtemp(prefix="benchmark_")
+    contexto = multiprocessing.get_context("spawn")
+    mediciones = {}
+    try:
+        with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as ejecutor:
+            calibracion = ejecutor.submit(_calibracion).result()
+        print(f"{'calibracion':<15} {calibracion:>9.1f} repeticiones/s")
+        # leer_registros, serializacion y tuplas usan el archivo que deja procesar_csv
+        for etapa in ("procesar_csv",) + tuple(e for e in etapas if e != "procesar_csv"):
+            with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as ejecutor:
+                medicion = ejecutor.submit(_medir_en_proceso, etapa, directorio, exportacion).result()
+            if etapa in etapas:
+                mediciones[etapa] = medicion
+                print(f"{etapa:<15} {medicion['segundos']:>9.2f} s {medicion['filas']:>10} filas "
+                      f"{medicion['filas_por_segundo'] or 0:>12,.0f} filas/s "
+                      f"{medicion['pico_memoria_mb']:>8.1f} MB")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+    return mediciones, calibracion
+
+def escala_maquina(calibracion, base):
+    """
+    Razón entre la velocidad de esta máquina y la de la base según la
+    calibración (1.0 si la base no tiene calibración).
+    """
+    referencia = base.get("calibracion")
+    if not referencia or not calibracion:
+        return 1.0
+    return calibracion / referencia
+
+def comparar_con_base(mediciones, base, tolerancia=TOLERANCIA, escala=1.0):
+    """
+    Devuelve la lista de etapas más lentas que la base (filas por segundo por
+    debajo de base * escala * (1 - tolerancia)), con un texto que explica cada una.
+    'escala' ajusta la base a la velocidad de esta máquina (escala_maquina).
+    """
+    regresiones = []
+    for etapa, medicion in mediciones.items():
+        referencia = base.get("etapas", {}).get(etapa, {}).get("filas_por_segundo")
+        actual = medicion.get("filas_por_segundo")
+        if not referencia or actual is None:
+            continue
+        esperado = referencia * escala
+        minimo = esperado * (1 - tolerancia)
+        if actual < minimo:
+            regresiones.append(f"{etapa}: {actual:,.0f} filas/s, la base ajustada a esta máquina "
+                               f"es {esperado:,.0f} (mínimo {minimo:,.0f} con tolerancia {tolerancia:.0%})")
+    return regresiones
+
+def _leer_json(ruta):
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _escribir_json(ruta, datos):
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(datos, f, indent=2, ensure_ascii=False)
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide las etapas del pipeline con datos sintéticos.")
+    parser.add_argument("--filas", type=int, default=100_000,
+                        help="Filas de la exportación sintética (por defecto %(default)s).")
+    parser.add_argument("--exportacion", help="Usar esta exportación en lugar de generar una.")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--etapas", nargs="+", choices=ETAPAS, default=list(ETAPAS))
+    parser.add_argument("--resultados", default=RUTA_RESULTADOS,
+                        help="Archivo JSON de resultados (por defecto %(default)s).")
+    parser.add_argument("--base", default=RUTA_BASE,
+                        help="Archivo JSON de la línea base (por defecto %(default)s).")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA,
+                        help="Pérdida de filas/s permitida contra la base (por defecto %(default)s).")
+    parser.add_argument("--guardar-base", action="store_true",
+                        help="Guarda esta medición como la nueva línea base.")
+    parser.add_argument("--sin-comparar", action="store_true",
+                        help="Sólo mide, sin comparar con la línea base.")
+    args = parser.parse_args()
+
+    directorio = None
+    exportacion = args.exportacion
+    if exportacion is None:
+        import sintetico
+        directorio = tempfile.mkdtemp(prefix="sintetico_")
+        exportacion = os.path.join(directorio, "exportacion.csv")
+        inicio = time.perf_counter()
+        sintetico.generar(exportacion, args.filas, args.semilla)
+        print(f"Exportación sintética de {args.filas} filas generada en {time.perf_counter() - inicio:.1f} s")
+    try:
+        mediciones, calibracion = medir(exportacion, tuple(args.etapas))
+    finally:
+        if directorio:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    resultados = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "filas_exportacion": args.filas if args.exportacion is None else _contar_filas(exportacion),
+        "python": sys.version.split()[0],
+        "plataforma": platform.platform(),
+        "calibracion": round(calibracion, 2),
+        "etapas": mediciones,
+    }
+    _escribir_json(args.resultados, resultados)
+    print(f"Resultados guardados en {args.resultados}")
+
+    if args.guardar_base:
+        _escribir_json(args.base, resultados)
+        print(f"Línea base guardada en {args.base}")
+        return
+
+    if args.sin_comparar:
+        return
+    base = _leer_json(args.base)
+    if base is None:
+        # Sin base no hay control de regresiones: no se debe pasar como éxito
+        print(f"ERROR: no hay línea base en {args.base}; no se pudo comparar. Use --guardar-base "
+              "para crearla o --sin-comparar para sólo medir.", file=sys.stderr)
+        sys.exit(2)
+    if base.get("filas_exportacion") != resultados["filas_exportacion"]:
+        print(f"Aviso: la línea base se midió con {base.get('filas_exportacion')} filas y esta "
+              f"medición con {resultados['filas_exportacion']}; las filas/s pueden no ser comparables.")
+    escala = escala_maquina(calibracion, base)
+    if base.get("calibracion"):
+        print(f"Calibración: esta máquina rinde {escala:.2f} veces la de la línea base.")
+    else:
+        print("Aviso: la línea base no tiene calibración; se compara sin ajustar por máquina.")
+    regresiones = comparar_con_base(mediciones, base, args.tolerancia, escala)
+    if regresiones:
+        print("Etapas más lentas que la línea base:")
+        for linea in regresiones:
+            print(" -", linea)
+        sys.exit(1)
+    print("Todas las etapas dentro de la línea base.")
+
+if __name__ == "__main__":
+    main()
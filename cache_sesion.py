@@ -0,0 +1,163 @@
+"""
+Caché persistente de la sesión autenticada de chedlink.
+
+Las cookies de la sesión se guardan en disco cifradas (Fernet) con una clave
+derivada de los secretos de sk.CONFIG, junto con su fecha de expiración. Al
+iniciar se validan con una solicitud ligera y sólo si no son válidas se hace
+el inicio de sesión completo. Los aciertos y fallos se acumulan en un archivo
+de estadísticas para estimar el tiempo de inicio de sesión ahorrado.
+"""
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+
+from filelock import FileLock
+
+# Ubicación del caché (puede ser un recurso compartido montado) y vigencia en segundos
+RUTA_CACHE_SESION = os.environ.get("RUTA_CACHE_SESION", os.path.join("/tmp", "chedlink_sesion.bin"))
+TTL_SESION = int(os.environ.get("TTL_SESION", str(8 * 3600)))
+USAR_CACHE_SESION = os.environ.get("CACHE_SESION", "1") == "1"
+
+# Plazo de la solicitud de validación (conexión, lectura) en segundos
+TIMEOUT_VALIDACION = (5, 10)
+
+def derivar_clave(config):
+    """
+    Deriva una clave Fernet de los secretos de chedraui en sk.CONFIG.
+    Si las credenciales cambian, el caché anterior deja de poder descifrarse.
+    """
+    secretos = config["chedraui"]
+    material = "\0".join([
+        secretos.get("CLAVE_CACHE", ""), secretos["USUARIO"], secretos["PASSWORD"]
+    ]).encode("utf-8")
+    clave = hashlib.pbkdf2_hmac("sha256", material, b"chedlink-cache-sesion", 100_000)
+    return base64.urlsafe_b64encode(clave)
+
+class CacheSesion:
+    """
+    Guarda y recupera las cookies de la sesión de chedlink.
+    """
+
+    def __init__(self, ruta=RUTA_CACHE_SESION, ttl=TTL_SESION, config=None):
+        from cryptography.fernet import Fernet
+        if config is None:
+            from sk import CONFIG as config
+        self.ruta = ruta
+        self.ruta_estadisticas = os.path.splitext(ruta)[0] + "_estadisticas.json"
+        self.ttl = ttl
+        self.fernet = Fernet(derivar_clave(config))
+
+    def _escribir(self, ruta, contenido):
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        # Temporal propio de cada proceso e hilo: dos escrituras a la vez (reportes
+        # en paralelo, otra instancia de la función) no se pisan el archivo a medias
+        temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        fd = os.open(temporal, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(contenido)
+        os.replace(temporal, ruta)
+
+    def cargar(self):
+        """
+        Devuelve las cookies guardadas si existen, se pueden descifrar y no expiraron;
+        en cualquier otro caso devuelve None.
+        """
+        from cryptography.fernet import InvalidToken
+        try:
+            with open(self.ruta, "rb") as f:
+                datos = json.loads(self.fernet.decrypt(f.read()))
+        except (OSError, InvalidToken, ValueError):
+            return None
+        if datos.get("expira", 0) <= time.time():
+            return None
+        return datos.get("cookies") or None
+
+    def guardar(self, cookies, segundos_login=None):
+        """
+        Guarda las cookies cifradas. La expiración es la menor entre el TTL y la
+        expiración de las cookies que la indiquen.
+        """
+        expira = time.time() + self.ttl
+        expiraciones = [c["expiry"] for c in cookies if c.get("expiry")]
+        if expiraciones:
+            expira = min(expira, min(expiraciones))
+        datos = {"guardado": time.time(), "expira": expira, "cookies": cookies}
+        self._escribir(self.ruta, self.fernet.encrypt(json.dumps(datos).encode("utf-8")))
+        if segundos_login is not None:
+            self._actualizar_estadisticas(segundos_login=segundos_login)
+
+    def invalidar(self):
+        try:
+            os.remove(self.ruta)
+        except OSError:
+            pass
+
+    def validar(self, cookies, url):
+        """
+        Comprueba con una sola solicitud GET que las cookies siguen autenticadas.
+        """
+        import requests
+        import descarga_http
+        try:
+            with descarga_http.sesion_desde_cookies(cookies) as sesion:
+                respuesta = sesion.get(url, timeout=TIMEOUT_VALIDACION)
+                return respuesta.ok and not descarga_http.es_pagina_login(respuesta)
+        except requests.RequestException:
+            return False
+
+    def obtener(self, url_validacion):
+        """
+        Devuelve las cookies si están en caché y siguen siendo válidas (acierto);
+        si no, invalida el caché y devuelve None (fallo).
+        """
+        cookies = self.cargar()
+        if cookies and self.validar(cookies, url_validacion):
+            self._actualizar_estadisticas(acierto=True)
+            return cookies
+        self.invalidar()
+        self._actualizar_estadisticas(acierto=False)
+        return None
+
+    def estadisticas(self):
+        try:
+            with open(self.ruta_estadisticas, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"aciertos": 0, "fallos": 0, "logins": 0, "segundos_login": 0.0}
+
+    def _actualizar_estadisticas(self, acierto=None, segundos_login=None):
+        # Lectura y escritura bajo un candado de archivo para no perder los
+        # conteos de otro hilo o proceso que actualiza al mismo tiempo
+        try:
+            directorio = os.path.dirname(self.ruta_estadisticas)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            with FileLock(self.ruta_estadisticas + ".lock", timeout=10):
+                estadisticas = self.estadisticas()
+                if acierto is True:
+                    estadisticas["aciertos"] += 1
+                elif acierto is False:
+                    estadisticas["fallos"] += 1
+                if segundos_login is not None:
+                    estadisticas["logins"] += 1
+                    estadisticas["segundos_login"] += segundos_login
+                self._escribir(self.ruta_estadisticas, json.dumps(estadisticas).encode("utf-8"))
+        except OSError:
+            # Incluye filelock.Timeout: las estadísticas no deben detener la ejecución
+            pass
+
+    def resumen(self):
+        """
+        Devuelve una línea con aciertos, fallos y el tiempo de inicio de sesión ahorrado
+        (aciertos por la duración promedio de un inicio de sesión completo).
+        """
+        e = self.estadisticas()
+        promedio = e["segundos_login"] / e["logins"] if e["logins"] else 0.0
+        return (f"Caché de sesión: {e['aciertos']} aciertos, {e['fallos']} fallos, "
+                f"~{e['aciertos'] * promedio:.0f} s de inicio de sesión ahorrados "
+                f"(promedio {promedio:.1f} s por inicio de sesión)")
@@ -0,0 +1,74 @@
+"""
+Captura de lo que imprime una ejecución sin tocar la salida de las demás.
+
+contextlib.redirect_stdout reemplaza sys.stdout para todo el proceso: desde un
+trabajo en segundo plano se queda también con lo que imprimen los otros hilos
+(otro trabajo, el host de Azure) y, si dos capturas se cruzan, cada una
+restaura al salir el sys.stdout de la otra.
+
+Aquí sys.stdout se reemplaza una sola vez por un distribuidor que escribe en
+el búfer de la captura activa en el contexto actual (contextvars) o, si no hay
+ninguna, en la salida original. Los hilos que lanza una ejecución ejecutan su
+función envuelta con propagar() para heredar su captura.
+"""
+import contextlib
+import contextvars
+import io
+import sys
+import threading
+
+_captura = contextvars.ContextVar("captura", default=None)
+_lock = threading.Lock()
+
+class _Distribuidor:
+    """
+    Reemplazo de sys.stdout que escribe en la captura del contexto actual.
+    """
+
+    def __init__(self, original):
+        self.original = original
+
+    def write(self, texto):
+        bufer = _captura.get()
+        return (self.original if bufer is None else bufer).write(texto)
+
+    def flush(self):
+        if _captura.get() is None:
+            self.original.flush()
+
+    def __getattr__(self, nombre):
+        # encoding, fileno, isatty, ... de la salida original
+        return getattr(self.original, nombre)
+
+def _instalar():
+    with _lock:
+        if not isinstance(sys.stdout, _Distribuidor):
+            sys.stdout = _Distribuidor(sys.stdout)
+
+@contextlib.contextmanager
+def capturar():
+    """
+    Devuelve un StringIO con lo que se imprime dentro del bloque en este
+    contexto y en los hilos lanzados con propagar(). Lo que imprimen los
+    demás hilos sigue yendo a la salida original.
+    """
+    _instalar()
+    bufer = io.StringIO()
+    token = _captura.set(bufer)
+    try:
+        yield bufer
+    finally:
+        _captura.reset(token)
+
+def propagar(funcion):
+    """
+    Envuelve 'funcion' para ejecutarla en otro hilo con el contexto del hilo
+    que la envuelve (y por lo tanto con su captura). Cada llamada usa una copia
+    del contexto, así que la función envuelta se puede ejecutar en varios hilos
+    a la vez (p. ej. con ThreadPoolExecutor.map).
+    """
+    contexto = contextvars.copy_context()
+
+    def envuelta(*args, **kwargs):
+        return contexto.copy().run(funcion, *args, **kwargs)
+    return envuelta
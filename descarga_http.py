@@ -0,0 +1,202 @@
+"""
+Descarga de la exportación de chedlink por HTTP, sin mantener un navegador abierto.
+
+La sesión se obtiene enviando el formulario de inicio de sesión directamente
+o copiando las cookies de un navegador ya autenticado; después se pide el
+endpoint de exportación con una requests.Session (pool de conexiones) y el CSV
+se escribe a disco por trozos.
+
+La URL del endpoint de exportación es la solicitud que hace el portal al pulsar
+la celda de exportación del menú de Excel. Se configura en
+CONFIG['chedraui']['URL_EXPORTACION'] o en la variable de entorno
+URL_EXPORTACION_CHEDLINK ('{clave}' se reemplaza por la clave del reporte y
+'{parametros}' por sus parámetros codificados); si no está configurada, o si
+el reporte tiene parámetros y la URL no incluye '{parametros}', sólo se usa el
+navegador.
+"""
+import os
+import re
+import time
+from html.parser import HTMLParser
+from urllib.parse import urlencode, urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Tamaño de cada trozo escrito a disco y plazos (conexión, lectura) en segundos
+TAMANO_TROZO = 1024 * 1024
+TIMEOUT_HTTP = (10, 300)
+
+AGENTE = ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+          "(KHTML, like Gecko) Chrome/120.0 Safari/537.36")
+
+class SesionInvalida(Exception):
+    """
+    El portal respondió con la página de inicio de sesión en lugar del recurso pedido.
+    """
+
+class _FormularioLogin(HTMLParser):
+    """
+    Obtiene la acción del primer formulario y sus campos (incluidos los ocultos).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.accion = None
+        self.campos = {}
+        self._en_formulario = False
+        self._terminado = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if self._terminado:
+            return
+        if tag == "form":
+            self._en_formulario = True
+            self.accion = attrs.get("action") or ""
+        elif tag == "input" and self._en_formulario and attrs.get("name"):
+            self.campos[attrs["name"]] = attrs.get("value") or ""
+
+    def handle_endtag(self, tag):
+        if tag == "form" and self._en_formulario:
+            self._en_formulario = False
+            self._terminado = True
+
+def url_exportacion(config, clave=None, parametros=None):
+    """
+    Devuelve la URL configurada del endpoint de exportación o None.
+    La URL puede contener '{clave}', que se reemplaza por la clave del reporte,
+    y '{parametros}', que se reemplaza por 'parametros' codificados como consulta.
+    Si hay parámetros y la URL no tiene dónde ponerlos devuelve None: el
+    endpoint exportaría el reporte sin ellos.
+    """
+    url = config.get("URL_EXPORTACION") or os.environ.get("URL_EXPORTACION_CHEDLINK")
+    if not url:
+        return None
+    if parametros and "{parametros}" not in url:
+        return None
+    if clave is not None:
+        url = url.replace("{clave}", str(clave))
+    return url.replace("{parametros}", urlencode(parametros or {}))
+
+def crear_sesion_http(tamano_pool=4):
+    """
+    Crea una requests.Session con pool de conexiones y reintentos para GET.
+    """
+    sesion = requests.Session()
+    reintentos = Retry(total=2, backoff_factor=0.5, status_forcelist=(502, 503, 504),
+                       allowed_methods=["GET"])
+    adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=tamano_pool, max_retries=reintentos)
+    sesion.mount("http://", adaptador)
+    sesion.mount("https://", adaptador)
+    sesion.headers["User-Agent"] = AGENTE
+    return sesion
+
+def sesion_desde_cookies(cookies, sesion=None):
+    """
+    Crea una sesión HTTP con una lista de cookies en el formato de Selenium
+    (diccionarios con name, value, domain, path).
+    """
+    if sesion is None:
+        sesion = crear_sesion_http()
+    for cookie in cookies:
+        sesion.cookies.set(cookie["name"], cookie["value"],
+                           domain=cookie.get("domain"), path=cookie.get("path", "/"))
+    return sesion
+
+def cookies_de_sesion(sesion):
+    """
+    Devuelve las cookies de una sesión HTTP en el formato de Selenium.
+    """
+    cookies = []
+    for cookie in sesion.cookies:
+        datos = {"name": cookie.name, "value": cookie.value,
+                 "domain": cookie.domain, "path": cookie.path or "/"}
+        if cookie.expires:
+            datos["expiry"] = cookie.expires
+        cookies.append(datos)
+    return cookies
+
+def sesion_desde_driver(driver, sesion=None):
+    """
+    Copia las cookies y el user-agent de un navegador Selenium autenticado
+    a una sesión HTTP.
+    """
+    sesion = sesion_desde_cookies(driver.get_cookies(), sesion)
+    try:
+        sesion.headers["User-Agent"] = driver.execute_script("return navigator.userAgent")
+    except Exception:
+        pass
+    return sesion
+
+def es_pagina_login(response):
+    """
+    Indica si la respuesta es la página de inicio de sesión del portal.
+    """
+    if "login" in response.url.lower():
+        return True
+    if "text/html" in response.headers.get("Content-Type", ""):
+        return re.search(r'name=["\']?password', response.text, re.IGNORECASE) is not None
+    return False
+
+def iniciar_sesion_http(url_login, usuario, password, sesion=None):
+    """
+    Inicia sesión enviando el formulario del portal directamente.
+    Lanza SesionInvalida si el portal vuelve a mostrar el formulario.
+    """
+    if sesion is None:
+        sesion = crear_sesion_http()
+    respuesta = sesion.get(url_login, timeout=TIMEOUT_HTTP)
+    respuesta.raise_for_status()
+    formulario = _FormularioLogin()
+    formulario.feed(respuesta.text)
+    datos = dict(formulario.campos)
+    datos["username"] = usuario
+    datos["password"] = password
+    respuesta = sesion.post(urljoin(respuesta.url, formulario.accion or ""), data=datos,
+                            timeout=TIMEOUT_HTTP)
+    respuesta.raise_for_status()
+    if es_pagina_login(respuesta):
+        raise SesionInvalida("el portal rechazó el inicio de sesión por HTTP")
+    return sesion
+
+def _nombre_desde_encabezado(response):
+    disposicion = response.headers.get("Content-Disposition", "")
+    coincidencia = re.search(r"filename\*?=(?:UTF-8'')?\"?([^\";]+)\"?", disposicion, re.IGNORECASE)
+    if not coincidencia:
+        return None
+    nombre = os.path.basename(coincidencia.group(1).strip())
+    return nombre if nombre.lower().endswith(".csv") else nombre + ".csv"
+
+def descargar_exportacion(sesion, url, download_dir, tamano_trozo=TAMANO_TROZO):
+    """
+    Pide el endpoint de exportación y escribe el CSV en download_dir por trozos,
+    sin cargarlo completo en memoria. Mientras se escribe el archivo tiene la
+    extensión .crdownload. Devuelve (ruta, bytes_descargados).
+    """
+    os.makedirs(download_dir, exist_ok=True)
+    with sesion.get(url, stream=True, timeout=TIMEOUT_HTTP) as respuesta:
+        respuesta.raise_for_status()
+        if es_pagina_login(respuesta):
+            raise SesionInvalida("la sesión no es válida para descargar la exportación")
+        if "text/html" in respuesta.headers.get("Content-Type", ""):
+            raise SesionInvalida("el portal devolvió HTML en lugar del CSV")
+
+        nombre = _nombre_desde_encabezado(respuesta) or f"exportacion_{int(time.time())}.csv"
+        ruta = os.path.join(download_dir, nombre)
+        ruta_parcial = ruta + ".crdownload"
+        descargados = 0
+        try:
+            with open(ruta_parcial, "wb") as f:
+                for trozo in respuesta.iter_content(chunk_size=tamano_trozo):
+                    f.write(trozo)
+                    descargados += len(trozo)
+            os.replace(ruta_parcial, ruta)
+        finally:
+            if os.path.exists(ruta_parcial):
+                os.remove(ruta_parcial)
+    if descargados == 0:
+        os.remove(ruta)
+        raise SesionInvalida("la exportación llegó vacía")
+    return ruta, descargados
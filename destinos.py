@@ -0,0 +1,345 @@
+"""
+Destinos de carga para el almacén de datos.
+
+Cada destino implementa la misma interfaz (conectar, insertar, confirmar,
+revertir, cerrar) para que script2 pueda cargar los lotes en Snowflake o en
+una base local de prueba (SQLite) sin cambiar el flujo.
+
+Hay dos modos de inserción:
+- 'executemany': INSERT fila por fila con parámetros (adecuado para lotes chicos).
+- 'masiva': el lote se escribe en un CSV comprimido con gzip y se carga de una vez
+  (en Snowflake con PUT al stage de la tabla y COPY INTO).
+"""
+import copy
+import csv
+import gzip
+import os
+import sqlite3
+import tempfile
+import time
+
+import telemetria
+from esquema import COLUMNAS_ALMACEN, TIPOS, tipo_columna
+
+# Tabla de detalle (el orden de sus columnas está en esquema.COLUMNAS_ALMACEN)
+TABLA_DETALLE = "TESTING_2025"
+
+# A partir de este número de filas por lote se usa la carga masiva
+UMBRAL_CARGA_MASIVA = int(os.environ.get("UMBRAL_CARGA_MASIVA", "10000"))
+
+MODOS = ("auto", "executemany", "masiva")
+
+def escribir_archivo_preparado(filas, directorio=None):
+    """
+    Escribe las filas en un CSV comprimido con gzip (UTF-8, sin cabecera)
+    y devuelve la ruta del archivo. Los valores None se escriben vacíos.
+    """
+    fd, ruta = tempfile.mkstemp(suffix=".csv.gz", prefix="lote_", dir=directorio)
+    with os.fdopen(fd, "wb") as crudo, gzip.open(crudo, "wt", encoding="utf-8", newline="") as f:
+        escritor = csv.writer(f, dialect="excel")
+        escritor.writerows(filas)
+    return ruta
+
+class DestinoAlmacen:
+    """
+    Interfaz común de los destinos del almacén.
+    Las subclases implementan conectar() y, si lo soportan, carga_masiva().
+    """
+
+    # Marcador de parámetros de la consulta INSERT
+    marcador = "%s"
+    # Tipo SQL de cada tipo de esquema.py al crear una tabla
+    tipos_sql = {"fecha": "DATE", "numero": "FLOAT", "porcentaje": "FLOAT",
+                 "entero": "INTEGER", "texto": "VARCHAR"}
+
+    def __init__(self, tabla=TABLA_DETALLE, columnas=COLUMNAS_ALMACEN,
+                 modo="auto", umbral_carga_masiva=UMBRAL_CARGA_MASIVA):
+        if modo not in MODOS:
+            raise ValueError(f"Modo de carga no válido: {modo}")
+        self.tabla = tabla
+        self.columnas = list(columnas)
+        self.modo = modo
+        self.umbral_carga_masiva = umbral_carga_masiva
+        self.conn = None
+        # Tabla temporal de la fusión; se crea con crear_tabla_delta()
+        self.tabla_delta = None
+        # Filas y segundos acumulados por modo de inserción
+        self.estadisticas = {"executemany": [0, 0.0], "masiva": [0, 0.0]}
+
+    @property
+    def errores(self):
+        """
+        Excepciones de la base de datos que el llamador debe atrapar.
+        """
+        return (Exception,)
+
+    def conectar(self):
+        raise NotImplementedError
+
+    def cerrar(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            finally:
+                self.conn = None
+                self.tabla_delta = None
+
+    def confirmar(self):
+        self.conn.commit()
+
+    def revertir(self):
+        self.conn.rollback()
+
+    def __enter__(self):
+        self.conectar()
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def para_tabla(self, tabla, columnas):
+        """
+        Devuelve una copia del destino para otra tabla y otras columnas que usa
+        la misma conexión (y por lo tanto la misma transacción). La copia no se
+        cierra: la conexión sigue siendo de este destino.
+        """
+        otro = copy.copy(self)
+        otro.tabla = tabla
+        otro.columnas = list(columnas)
+        otro.tabla_delta = None
+        otro.estadisticas = {modo: [0, 0.0] for modo in self.estadisticas}
+        return otro
+
+    def crear_tabla(self, tipos=None):
+        """
+        Crea la tabla si no existe. 'tipos' indica el tipo de esquema.py de las
+        columnas que no están en el esquema del reporte.
+        """
+        tipos = tipos or {}
+        definicion = ", ".join(f"{col} {self.tipos_sql[tipos.get(col) or tipo_columna(col)]}"
+                               for col in self.columnas)
+        self.ejecutar(f"CREATE TABLE IF NOT EXISTS {self.tabla} ({definicion})")
+
+    def consulta_insert(self, tabla=None):
+        return (f"INSERT INTO {tabla or self.tabla} ({', '.join(self.columnas)}) "
+                f"VALUES ({', '.join([self.marcador] * len(self.columnas))})")
+
+    def ejecutar(self, consulta, parametros=None):
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(consulta, parametros or ())
+        finally:
+            cursor.close()
+
+    def insertar_filas(self, filas, tabla=None):
+        """
+        Inserta las filas con executemany().
+        """
+        cursor = self.conn.cursor()
+        try:
+            cursor.executemany(self.consulta_insert(tabla), filas)
+        finally:
+            cursor.close()
+
+    def carga_masiva(self, filas, tabla=None):
+        """
+        Carga las filas a través de un archivo preparado.
+        Por defecto recurre a executemany() si el destino no la soporta.
+        """
+        self.insertar_filas(filas, tabla)
+
+    def elegir_modo(self, numero_filas):
+        if self.modo != "auto":
+            return self.modo
+        return "masiva" if numero_filas >= self.umbral_carga_masiva else "executemany"
+
+    def insertar(self, filas, tabla=None):
+        """
+        Inserta una lista de tuplas (en el orden de self.columnas) con el modo
+        que corresponda y acumula filas y tiempo para el resumen.
+        Devuelve el modo utilizado.
+        """
+        modo = self.elegir_modo(len(filas))
+        inicio = time.perf_counter()
+        if modo == "masiva":
+            self.carga_masiva(filas, tabla)
+        else:
+            self.insertar_filas(filas, tabla)
+        segundos = time.perf_counter() - inicio
+        estadistica = self.estadisticas[modo]
+        estadistica[0] += len(filas)
+        estadistica[1] += segundos
+        telemetria.registrar("almacen.insertar", segundos, destino=type(self).__name__,
+                             tabla=tabla or self.tabla, modo=modo, filas=len(filas))
+        return modo
+
+    def crear_tabla_delta(self, claves):
+        """
+        Crea la tabla temporal donde se cargan las filas a fusionar por 'claves'
+        y devuelve su nombre. Es DDL, que en Snowflake confirma la transacción
+        abierta: se llama una vez después de conectar, antes del primer lote.
+        """
+        raise NotImplementedError
+
+    def preparar_tabla_delta(self):
+        """
+        Vacía la tabla delta y devuelve su nombre. DELETE (DML) en lugar de
+        TRUNCATE para no cerrar la transacción en curso.
+        """
+        if self.tabla_delta is None:
+            raise RuntimeError(f"Falta crear la tabla delta de {self.tabla} antes de la transacción")
+        self.ejecutar(f"DELETE FROM {self.tabla_delta}")
+        return self.tabla_delta
+
+    def ejecutar_fusion(self, tabla_delta, claves):
+        """
+        Aplica las filas de tabla_delta sobre la tabla: actualiza las que coinciden
+        por 'claves' e inserta las demás.
+        """
+        raise NotImplementedError
+
+    def fusionar(self, filas, claves):
+        """
+        Carga las filas en la tabla delta (con el modo que corresponda) y las
+        fusiona con la tabla por las columnas 'claves' (equivalente a MERGE).
+        La tabla delta debe estar creada con crear_tabla_delta().
+        """
+        tabla_delta = self.preparar_tabla_delta()
+        modo = self.insertar(filas, tabla_delta)
+        with telemetria.span("almacen.fusion", destino=type(self).__name__, filas=len(filas)):
+            self.ejecutar_fusion(tabla_delta, claves)
+        return modo
+
+    def resumen(self):
+        """
+        Devuelve una línea por modo usado con filas, segundos y filas por segundo.
+        """
+        lineas = []
+        for modo, (filas, segundos) in self.estadisticas.items():
+            if filas:
+                por_segundo = filas / segundos if segundos > 0 else float("inf")
+                lineas.append(f"{modo}: {filas} filas en {segundos:.2f} s ({por_segundo:,.0f} filas/s)")
+        return lineas
+
+class DestinoSnowflake(DestinoAlmacen):
+    """
+    Destino Snowflake. La carga masiva sube el lote comprimido al stage de la
+    tabla (@%TABLA) con PUT y lo carga con COPY INTO, que elimina el archivo al terminar.
+    """
+
+    def __init__(self, config=None, **kwargs):
+        super().__init__(**kwargs)
+        self.config = config
+
+    @property
+    def errores(self):
+        import snowflake.connector
+        return (snowflake.connector.errors.Error, OSError)
+
+    def conectar(self):
+        import snowflake.connector
+        if self.config is None:
+            from sk import CONFIG
+            self.config = CONFIG["snowflake"]
+        # Sin autocommit: los lotes quedan en una sola transacción que se
+        # confirma o se revierte al final (con autocommit cada lote se confirmaba solo)
+        self.conn = snowflake.connector.connect(**dict(self.config, autocommit=False))
+        return self.conn
+
+    def carga_masiva(self, filas, tabla=None):
+        tabla = tabla or self.tabla
+        ruta = escribir_archivo_preparado(filas)
+        nombre = os.path.basename(ruta)
+        cursor = self.conn.cursor()
+        try:
+            ruta_put = ruta.replace("\\", "/")
+            cursor.execute(f"PUT 'file://{ruta_put}' @%{tabla} AUTO_COMPRESS=FALSE OVERWRITE=TRUE")
+            cursor.execute(
+                f"COPY INTO {tabla} ({', '.join(self.columnas)}) "
+                f"FROM @%{tabla} FILES = ('{nombre}') "
+                "FILE_FORMAT = (TYPE = CSV COMPRESSION = GZIP FIELD_OPTIONALLY_ENCLOSED_BY = '\"' "
+                "EMPTY_FIELD_AS_NULL = TRUE) "
+                "ON_ERROR = ABORT_STATEMENT PURGE = TRUE"
+            )
+        finally:
+            cursor.close()
+            os.remove(ruta)
+
+    def crear_tabla_delta(self, claves):
+        self.tabla_delta = f"{self.tabla}_DELTA"
+        self.ejecutar(f"CREATE TEMPORARY TABLE IF NOT EXISTS {self.tabla_delta} LIKE {self.tabla}")
+        return self.tabla_delta
+
+    def ejecutar_fusion(self, tabla_delta, claves):
+        # EQUAL_NULL para que las claves con valores nulos también coincidan
+        condicion = " AND ".join(f"EQUAL_NULL(t.{col}, s.{col})" for col in claves)
+        actualizacion = ", ".join(f"t.{col} = s.{col}" for col in self.columnas if col not in claves)
+        self.ejecutar(
+            f"MERGE INTO {self.tabla} t USING {tabla_delta} s ON {condicion} "
+            f"WHEN MATCHED THEN UPDATE SET {actualizacion} "
+            f"WHEN NOT MATCHED THEN INSERT ({', '.join(self.columnas)}) "
+            f"VALUES ({', '.join('s.' + col for col in self.columnas)})"
+        )
+
+class DestinoSQLite(DestinoAlmacen):
+    """
+    Destino local para pruebas. Crea la tabla si no existe con afinidad NUMERIC
+    y emula la carga masiva leyendo el mismo archivo preparado que se sube a Snowflake.
+    """
+
+    marcador = "?"
+    # Todas las columnas con afinidad NUMERIC, como la tabla de detalle
+    tipos_sql = dict.fromkeys(TIPOS, "NUMERIC")
+
+    def __init__(self, ruta=":memory:", **kwargs):
+        super().__init__(**kwargs)
+        self.ruta = ruta
+
+    @property
+    def errores(self):
+        return (sqlite3.Error, OSError)
+
+    def conectar(self):
+        self.conn = sqlite3.connect(self.ruta)
+        self.crear_tabla()
+        return self.conn
+
+    def carga_masiva(self, filas, tabla=None):
+        ruta = escribir_archivo_preparado(filas)
+        try:
+            with gzip.open(ruta, "rt", encoding="utf-8", newline="") as f:
+                filas_preparadas = [
+                    tuple(valor if valor != "" else None for valor in fila)
+                    for fila in csv.reader(f, dialect="excel")
+                ]
+            self.insertar_filas(filas_preparadas, tabla)
+        finally:
+            os.remove(ruta)
+
+    def crear_tabla_delta(self, claves):
+        # SQLite no tiene MERGE: se emula con DELETE de las claves presentes e INSERT.
+        # Con el índice sobre las claves el DELETE recorre sólo el delta; sin él
+        # la subconsulta correlacionada recorre el delta por cada fila de la tabla
+        self.tabla_delta = f"{self.tabla}_DELTA"
+        definicion = ", ".join(f"{col} NUMERIC" for col in self.columnas)
+        self.ejecutar(f"CREATE TEMPORARY TABLE IF NOT EXISTS {self.tabla_delta} ({definicion})")
+        self.ejecutar(f"CREATE INDEX IF NOT EXISTS {self.tabla}_CLAVES "
+                      f"ON {self.tabla} ({', '.join(claves)})")
+        return self.tabla_delta
+
+    def ejecutar_fusion(self, tabla_delta, claves):
+        condicion = " AND ".join(f"t.{col} IS d.{col}" for col in claves)
+        self.ejecutar(f"DELETE FROM {self.tabla} WHERE rowid IN "
+                      f"(SELECT t.rowid FROM {tabla_delta} d JOIN {self.tabla} t ON {condicion})")
+        self.ejecutar(f"INSERT INTO {self.tabla} ({', '.join(self.columnas)}) "
+                      f"SELECT {', '.join(self.columnas)} FROM {tabla_delta}")
+
+def crear_destino(especificacion, **kwargs):
+    """
+    Crea un destino a partir de un texto: 'snowflake' o 'sqlite:<ruta>'.
+    """
+    if especificacion == "snowflake":
+        return DestinoSnowflake(**kwargs)
+    if especificacion.startswith("sqlite:"):
+        return DestinoSQLite(especificacion[len("sqlite:"):] or ":memory:", **kwargs)
+    raise ValueError(f"Destino no reconocido: {especificacion}")
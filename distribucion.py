@@ -0,0 +1,136 @@
+"""
+Distribución de lotes a varios destinos en paralelo.
+
+Cada destino corre en su propio hilo y hace su propia pasada por el archivo
+procesado (con Arrow IPC es un mapa de memoria, así que leerlo dos veces no
+copia los datos): no hay un productor compartido, de modo que un destino lento
+nunca frena al otro. Cada destino tiene su propio límite de tiempo y su propio
+resultado: si uno falla o se vence, los demás continúan.
+"""
+import threading
+import time
+from dataclasses import dataclass
+
+import captura
+
+@dataclass
+class ResultadoDestino:
+    nombre: str
+    estado: str = "pendiente"
+    lotes: int = 0
+    registros: int = 0
+    segundos: float = 0.0
+    error: str = None
+
+class EtapaDestino:
+    """
+    Destino alimentado por distribuir_lotes().
+    procesar() devuelve False si el lote no se pudo cargar; finalizar() recibe
+    si todos los lotes fueron exitosos y se llama siempre, aun tras un error.
+    """
+
+    nombre = "destino"
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+
+    def iniciar(self):
+        pass
+
+    def procesar(self, lote):
+        return True
+
+    def finalizar(self, exito):
+        pass
+
+class _Trabajador(threading.Thread):
+
+    def __init__(self, etapa, abrir_lotes, inicio):
+        super().__init__(name=f"destino-{etapa.nombre}", daemon=True)
+        self.etapa = etapa
+        self.abrir_lotes = abrir_lotes
+        self.cancelado = threading.Event()
+        self.resultado = ResultadoDestino(etapa.nombre)
+        self.limite = inicio + etapa.timeout if etapa.timeout else None
+        self.inicio = inicio
+        # El hilo hereda la captura de salida de quien crea el destino
+        self._atender = captura.propagar(self._atender)
+
+    def restante(self):
+        return None if self.limite is None else self.limite - time.perf_counter()
+
+    def run(self):
+        self._atender()
+
+    def _atender(self):
+        exito = True
+        try:
+            self.etapa.iniciar()
+            for lote in self.abrir_lotes(self.etapa):
+                restante = self.restante()
+                if restante is not None and restante <= 0:
+                    self.vencer()
+                if self.cancelado.is_set():
+                    break
+                if not self.etapa.procesar(lote):
+                    exito = False
+                self.resultado.lotes += 1
+                self.resultado.registros += len(lote)
+        except Exception as e:
+            exito = False
+            self.resultado.error = str(e)
+        finally:
+            if self.cancelado.is_set():
+                exito = False
+            try:
+                self.etapa.finalizar(exito)
+            except Exception as e:
+                exito = False
+                self.resultado.error = self.resultado.error or str(e)
+            self.resultado.segundos = time.perf_counter() - self.inicio
+            if self.resultado.estado == "pendiente":
+                self.resultado.estado = "ok" if exito else "error"
+
+    def vencer(self):
+        if self.resultado.estado != "pendiente":
+            return
+        self.resultado.estado = "timeout"
+        self.resultado.error = f"se superó el límite de {self.etapa.timeout} s"
+        self.resultado.segundos = time.perf_counter() - self.inicio
+        self.cancelado.set()
+
+def distribuir_lotes(abrir_lotes, etapas):
+    """
+    Entrega los lotes a todas las etapas en paralelo: abrir_lotes(etapa)
+    devuelve un iterador nuevo sobre los lotes para cada etapa, que los lee a su
+    propio ritmo. Devuelve (resultados, segundos_totales), con un
+    ResultadoDestino por etapa; un error de lectura queda en el resultado de la
+    etapa que leía.
+    """
+    inicio = time.perf_counter()
+    trabajadores = [_Trabajador(etapa, abrir_lotes, inicio) for etapa in etapas]
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        restante = t.restante()
+        t.join(timeout=None if restante is None else max(restante, 0))
+        if t.is_alive():
+            # El hilo sigue ocupado en un lote: se marca vencido y se le pide abortar
+            t.vencer()
+    return [t.resultado for t in trabajadores], time.perf_counter() - inicio
+
+def resumen_distribucion(resultados, segundos_totales):
+    """
+    Devuelve líneas con estado y duración por destino y la ruta crítica.
+    """
+    lineas = []
+    for r in resultados:
+        linea = f"{r.nombre}: {r.estado}, {r.registros} registros en {r.lotes} lotes, {r.segundos:.2f} s"
+        if r.error:
+            linea += f" ({r.error})"
+        lineas.append(linea)
+    if resultados:
+        critico = max(resultados, key=lambda r: r.segundos)
+        lineas.append(f"Ruta crítica: {critico.nombre} ({critico.segundos:.2f} s) "
+                      f"de {segundos_totales:.2f} s totales")
+    return lineas
@@ -0,0 +1,281 @@
+"""
+Esquema único de las columnas del reporte de chedlink.
+
+Define en un solo lugar el nombre, el tipo y el origen de cada columna, y de
+él se derivan las listas que antes se repetían en cada script: las columnas
+de la exportación (script1), las numéricas (carga) y el orden de la tabla del
+almacén (destinos).
+
+El esquema se compila en un ConvertidorRegistros que convierte lotes de
+Arrow columna por columna (pyarrow.compute/numpy) y arma tanto los registros de Ninox
+{"fields": {...}} como las tuplas para el almacén.
+
+Tipos:
+- 'fecha': DD/MM/YYYY o YYYY-MM-DD, se entrega como 'YYYY-MM-DD'.
+- 'numero' / 'porcentaje': se quitan separadores de miles, espacios y '%';
+  los valores enteros se entregan como int.
+- 'entero': número entero (puede faltar).
+- 'texto': se quitan espacios; el texto vacío se omite.
+"""
+import itertools
+import operator
+from dataclasses import dataclass
+from datetime import datetime
+
+TIPOS = ("fecha", "numero", "porcentaje", "entero", "texto")
+
+@dataclass(frozen=True)
+class Columna:
+    nombre: str
+    tipo: str = "texto"
+    # 'exportacion' si viene en el CSV de chedlink, 'derivada' si la calcula script1
+    origen: str = "exportacion"
+    # Texto con pocos valores distintos que se repiten (tienda, depto, comprador...)
+    dimension: bool = False
+
+# Columnas del reporte en el orden de la exportación, seguidas de las derivadas
+ESQUEMA = [
+    Columna("DiaFecha", "fecha"),
+    Columna("NP"),
+    Columna("Sku"),
+    Columna("Region", dimension=True),
+    Columna("Distrito", dimension=True),
+    Columna("NT", dimension=True),
+    Columna("Tienda", dimension=True),
+    Columna("SubDepto", dimension=True),
+    Columna("Depto", dimension=True),
+    Columna("Clase", dimension=True),
+    Columna("SubClase", dimension=True),
+    Columna("Capa", dimension=True),
+    Columna("Comprador", dimension=True),
+    Columna("DevolProvCto", "numero"),
+    Columna("DevolProvUni", "numero"),
+    Columna("DevolProvVta", "numero"),
+    Columna("InvFinCto", "numero"),
+    Columna("InvFinUni", "numero"),
+    Columna("InvFinVta", "numero"),
+    Columna("RebajaVta", "numero"),
+    Columna("RecibosCto", "numero"),
+    Columna("RecibosPzs", "numero"),
+    Columna("RecibosVta", "numero"),
+    Columna("VentaNetaaCosto", "numero"),
+    Columna("VentaNetaenPesos", "numero"),
+    Columna("VentaNetaenUnidades", "numero"),
+    Columna("TransfEntCto", "numero"),
+    Columna("TransfEntUni", "numero"),
+    Columna("TransfEntVta", "numero"),
+    Columna("TransfSalCto", "numero"),
+    Columna("TransfSalUni", "numero"),
+    Columna("TransfSalVta", "numero"),
+    # Se carga como texto, igual que siempre se envió a Ninox
+    Columna("DiasdeInventario"),
+    Columna("VentaNetaenPesosAnt", "numero"),
+    Columna("VentaNetaenUnidadesAnt", "numero"),
+    Columna("PVPCosto", "numero"),
+    Columna("PVPVenta", "numero"),
+    Columna("MargenObtenidoInv", "porcentaje"),
+    Columna("MargenObtenidoVenta", "porcentaje"),
+    Columna("DiferenciaMargen", "numero", "derivada"),
+    Columna("DifPesos", "numero", "derivada"),
+    Columna("dow", "entero", "derivada"),
+]
+
+TIPO_COLUMNA = {c.nombre: c.tipo for c in ESQUEMA}
+
+# Columnas del CSV exportado por chedlink (39) y del archivo procesado (42)
+COLUMNAS_EXPORTACION = [c.nombre for c in ESQUEMA if c.origen == "exportacion"]
+COLUMNAS_PROCESADAS = [c.nombre for c in ESQUEMA]
+
+# Columnas de texto que se guardan en memoria como categorías
+COLUMNAS_DIMENSION = [c.nombre for c in ESQUEMA if c.dimension]
+
+# Columnas que se cargan como número
+COLUMNAS_NUMERICAS = [c.nombre for c in ESQUEMA if c.tipo in ("numero", "porcentaje", "entero")]
+
+# Orden de las columnas en la tabla del almacén (el de su definición)
+COLUMNAS_ALMACEN = [
+    "DiaFecha", "NP", "Sku", "Region", "Distrito", "NT", "Tienda", "Depto", "SubDepto",
+    "Clase", "SubClase", "Comprador", "Capa", "DiasdeInventario", "VentaNetaaCosto",
+    "VentaNetaenUnidades", "VentaNetaenPesos", "RecibosCto", "RecibosPzs", "RecibosVta",
+    "RebajaVta", "DevolProvCto", "DevolProvUni", "DevolProvVta", "InvFinUni", "InvFinCto",
+    "InvFinVta", "TransfEntCto", "TransfEntUni", "TransfEntVta", "TransfSalCto",
+    "TransfSalUni", "TransfSalVta", "VentaNetaenPesosAnt", "VentaNetaenUnidadesAnt",
+    "MargenObtenidoInv", "MargenObtenidoVenta", "PVPCosto", "PVPVenta", "DifPesos",
+    "DiferenciaMargen", "dow"
+]
+
+def tipo_columna(nombre):
+    """
+    Tipo de la columna según el esquema; las columnas desconocidas son texto.
+    """
+    return TIPO_COLUMNA.get(nombre, "texto")
+
+def tipo_arrow(tipo):
+    """
+    Tipo de Arrow con el que se guarda una columna del esquema.
+    """
+    import pyarrow as pa
+    return {"fecha": pa.date32(), "numero": pa.float64(), "porcentaje": pa.float64(),
+            "entero": pa.int8(), "texto": pa.string()}[tipo]
+
+# Números que acepta float() después de quitar separadores, espacios y '%'
+PATRON_NUMERO = r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$"
+
+def valores_numericos(numeros):
+    """
+    Convierte un arreglo float64 en una lista de Python: los valores enteros
+    como int, los demás como float y NaN como None.
+    """
+    import numpy as np
+    numeros = np.asarray(numeros, dtype="float64")
+    valores = numeros.astype(object)
+    enteros = np.isfinite(numeros) & (numeros == np.floor(numeros))
+    valores[enteros] = numeros[enteros].astype(np.int64)
+    valores[np.isnan(numeros)] = None
+    return valores.tolist()
+
+def _texto_o_none(texto):
+    """
+    Lista de Python de una columna Arrow de texto con '' y nulos como None.
+    """
+    import pyarrow.compute as pc
+    return pc.if_else(pc.equal(texto, ""), None, texto).to_numpy(zero_copy_only=False).tolist()
+
+def _convertir_numero(texto):
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    limpio = pc.utf8_trim_whitespace(
+        pc.replace_substring(pc.replace_substring(texto, ",", ""), "%", ""))
+    vacio = pc.equal(limpio, "")
+    try:
+        # Caso común: todos los valores no vacíos son números
+        numeros = pc.cast(pc.if_else(vacio, None, limpio), pa.float64())
+        otros = None
+    except pa.ArrowInvalid:
+        valido = pc.fill_null(pc.match_substring_regex(limpio, PATRON_NUMERO), False)
+        numeros = pc.cast(pc.if_else(valido, limpio, None), pa.float64())
+        otros = pc.and_(pc.invert(valido), pc.invert(vacio))
+    valores = valores_numericos(numeros.to_numpy(zero_copy_only=False))
+    if otros is not None:
+        # Los valores no vacíos que no son números se conservan como texto
+        for i in np.flatnonzero(otros.to_numpy(zero_copy_only=False)):
+            valores[i] = limpio[int(i)].as_py()
+    return valores
+
+def _fecha_python(valor):
+    try:
+        return datetime.strptime(valor, "%d/%m/%Y").strftime("%Y-%m-%d")
+    except ValueError:
+        return valor
+
+def _convertir_fecha(texto):
+    import numpy as np
+    import pyarrow.compute as pc
+    limpio = pc.utf8_trim_whitespace(texto)
+    fechas = pc.strptime(limpio, format="%d/%m/%Y", unit="s", error_is_null=True)
+    iso = pc.strftime(fechas, format="%Y-%m-%d")
+    # Lo que no es DD/MM/YYYY (p. ej. ya en ISO) se conserva como está
+    valores = _texto_o_none(pc.coalesce(iso, limpio))
+    # Arrow acepta fechas que strptime de Python rechaza (31/02) o sin ceros a la
+    # izquierda; esas pocas se resuelven con datetime para dar el mismo resultado
+    dudosas = pc.and_(pc.is_valid(fechas),
+                      pc.not_equal(pc.strftime(fechas, format="%d/%m/%Y"), limpio))
+    for i in np.flatnonzero(pc.fill_null(dudosas, False).to_numpy(zero_copy_only=False)):
+        valores[i] = _fecha_python(limpio[int(i)].as_py())
+    return valores
+
+def _convertir_texto(texto):
+    import pyarrow.compute as pc
+    return _texto_o_none(pc.utf8_trim_whitespace(texto))
+
+CONVERTIDORES = {
+    "fecha": _convertir_fecha,
+    "numero": _convertir_numero,
+    "porcentaje": _convertir_numero,
+    "entero": _convertir_numero,
+    "texto": _convertir_texto,
+}
+
+def valores_columna(columna, tipo):
+    """
+    Convierte una columna Arrow en una lista de valores de Python para los
+    registros. Las columnas de texto (como se leen del CSV) se interpretan
+    según el tipo del esquema; las ya tipadas (archivo Arrow/Parquet) sólo se
+    convierten: fechas a ISO y números con la regla de valores_numericos.
+    """
+    import pyarrow as pa
+    if pa.types.is_string(columna.type) or pa.types.is_large_string(columna.type):
+        return CONVERTIDORES[tipo](columna)
+    if pa.types.is_date(columna.type) or pa.types.is_timestamp(columna.type):
+        return _texto_o_none(columna.cast(pa.date32()).cast(pa.string()))
+    return valores_numericos(columna.cast(pa.float64()).to_numpy(zero_copy_only=False))
+
+def armar_registros(nombres, columnas):
+    """
+    Arma los registros {"fields": {...}} a partir de listas de valores por
+    columna, omitiendo los None. Las filas completas (el caso común) se arman
+    con dict(zip()) y sólo las que tienen vacíos pasan por el filtro.
+    """
+    registros = []
+    agregar = registros.append
+    for fila in zip(*columnas):
+        if None in fila:
+            agregar({"fields": dict(itertools.compress(
+                zip(nombres, fila), map(operator.is_not, fila, itertools.repeat(None))))})
+        else:
+            agregar({"fields": dict(zip(nombres, fila))})
+    return registros
+
+def armar_tuplas(nombres, columnas, orden=COLUMNAS_ALMACEN):
+    """
+    Arma las tuplas para el almacén en el orden indicado; las columnas que no
+    están en 'nombres' quedan como None.
+    """
+    por_nombre = dict(zip(nombres, columnas))
+    vacia = [None] * (len(columnas[0]) if columnas else 0)
+    return list(zip(*[por_nombre.get(col, vacia) for col in orden]))
+
+class LoteRegistros(list):
+    """
+    Registros {"fields": {...}} de un lote que conservan los valores por
+    columna de los que se armaron, para que el almacén arme sus tuplas
+    columna por columna (armar_tuplas) sin recorrer los diccionarios.
+    """
+
+    def __init__(self, nombres, valores):
+        super().__init__(armar_registros(nombres, valores))
+        self.nombres = nombres
+        self.valores = valores
+
+    def tuplas(self, orden=COLUMNAS_ALMACEN):
+        return armar_tuplas(self.nombres, self.valores, orden)
+
+class ConvertidorRegistros:
+    """
+    Convierte lotes de Arrow (RecordBatch o Table) a registros de Ninox y a
+    tuplas del almacén, columna por columna según el tipo de cada una.
+    """
+
+    def __init__(self, columnas):
+        self.columnas = list(columnas)
+        self.tipos = [tipo_columna(col) for col in self.columnas]
+
+    def valores(self, lote):
+        """
+        Devuelve una lista de valores convertidos por columna (en el orden de self.columnas).
+        """
+        return [valores_columna(lote.column(col), tipo) for col, tipo in zip(self.columnas, self.tipos)]
+
+    def registros(self, lote):
+        return armar_registros(self.columnas, self.valores(lote))
+
+    def lote_registros(self, lote):
+        """
+        Convierte el lote una sola vez y devuelve un LoteRegistros con los
+        registros y las tuplas disponibles.
+        """
+        return LoteRegistros(self.columnas, self.valores(lote))
+
+    def tuplas(self, lote, orden=COLUMNAS_ALMACEN):
+        return armar_tuplas(self.columnas, self.valores(lote), orden)
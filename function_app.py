@@ -1,46 +1,140 @@
+import json
 import os
 import sys
 import subprocess
 import azure.functions as func
 import logging
+from datetime import datetime
 
-# Obtén la ruta absoluta a la carpeta de dependencias
-package_path = os.path.join(os.getcwd(), '.python_packages', 'lib', 'site-packages')
+import trabajos
 
-# Crea un entorno (copiando el actual) y añade PYTHONPATH
-env = os.environ.copy()
-env["PYTHONPATH"] = package_path + os.pathsep + env.get("PYTHONPATH", "")
+def entorno_subproceso():
+    """
+    Entorno para los subprocesos: una copia del actual con la carpeta de
+    dependencias en PYTHONPATH. Se arma sólo cuando se lanza un subproceso.
+    """
+    package_path = os.path.join(os.getcwd(), '.python_packages', 'lib', 'site-packages')
+    env = os.environ.copy()
+    env["PYTHONPATH"] = package_path + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+# Con MODO_SUBPROCESO=1 el bot se ejecuta en un intérprete aparte (aislamiento);
+# por defecto se ejecuta en este mismo proceso a través de pipeline.py
+MODO_SUBPROCESO = os.environ.get("MODO_SUBPROCESO", "0") == "1"
+
+# Con MULTIPLES_REPORTES=1 se ejecuta la lista de reportes de reportes.json
+MULTIPLES_REPORTES = os.environ.get("MULTIPLES_REPORTES", "0") == "1"
 
 app = func.FunctionApp()
 
+def ejecutar_bot(avance=None, completo=False):
+    """
+    Ejecuta el bot completo y devuelve (exito, salida). 'avance' recibe el
+    inicio y el resultado de cada etapa (sólo en proceso, ver pipeline.ejecutar).
+    """
+    if MODO_SUBPROCESO:
+        comando = [sys.executable, "lanzador.py"] + (["--reportes"] if MULTIPLES_REPORTES else [])
+        if completo:
+            comando.append("--full")
+        result = subprocess.run(comando, capture_output=True, text=True, env=entorno_subproceso())
+        if result.returncode != 0:
+            return False, result.stderr or result.stdout
+        return True, result.stdout
+
+    import captura
+    import pipeline
+    # captura y no redirect_stdout: el trabajo corre en un hilo en segundo plano
+    # y sólo debe quedarse con lo que imprime él (ver captura.py)
+    with captura.capturar() as salida:
+        if MULTIPLES_REPORTES:
+            ejecuciones = pipeline.ejecutar_reportes(avance=avance, completo=completo)
+            exito, resumen = all(e.ok for e in ejecuciones.values()), pipeline.resumen_reportes(ejecuciones)
+        else:
+            resultado = pipeline.ejecutar(avance=avance, completo=completo)
+            exito, resumen = resultado.ok, resultado.resumen()
+    return exito, salida.getvalue() + resumen
+
+def enviar_bot(completo=False):
+    """
+    Inicia el bot en segundo plano y devuelve (trabajo, nuevo). Si ya hay una
+    ejecución en curso del mismo reporte y fecha se devuelve esa (nuevo=False).
+    """
+    import pipeline
+    if MULTIPLES_REPORTES:
+        reporte, total = "reportes", pipeline.contar_etapas_reportes()
+    else:
+        import script1
+        reporte, total = script1.NOMBRE_REPORTE, len(pipeline.ETAPAS)
+    if MODO_SUBPROCESO:
+        # El subproceso no informa sus etapas
+        total = None
+    fecha = datetime.now().strftime("%Y-%m-%d")
+    return trabajos.enviar(lambda avance: ejecutar_bot(avance, completo), reporte, fecha, total)
+
+def respuesta_trabajo(trabajo, status_code=200, headers=None, **extra):
+    cuerpo = trabajo.como_dict()
+    cuerpo.update(extra)
+    return func.HttpResponse(json.dumps(cuerpo, ensure_ascii=False), status_code=status_code,
+                             headers=headers, mimetype="application/json")
+
 @app.function_name(name="RunBotFunction")
 @app.timer_trigger(schedule="0 10 13 * * *", arg_name="myTimer", run_on_startup=False, use_monitor=False)
 def RunBotFunction(myTimer: func.TimerRequest) -> None:
     logging.info("Timer trigger ejecutado.")
-    result = subprocess.run([sys.executable, "lanzador.py"], capture_output=True, text=True, env=env)
-    if result.returncode != 0:
-        logging.error("Error: %s", result.stderr)
+    try:
+        trabajo, nuevo = enviar_bot()
+    except trabajos.EjecucionEnCurso as e:
+        logging.warning("No se inició el bot: %s", e)
+        return
+    if not nuevo:
+        logging.info("Ya hay una ejecución en curso (%s); se espera a que termine.", trabajo.id)
+    trabajo = trabajos.esperar(trabajo.id)
+    if trabajo.estado != "ok":
+        logging.error("Error: %s", trabajo.error or trabajo.salida)
     else:
-        logging.info("Éxito: %s", result.stdout)
+        logging.info("Éxito: %s", trabajo.salida)
 
 @app.function_name(name="ManualRunBotFunction")
 @app.route(route="manual-run", methods=["GET"])
 def ManualRunBotFunction(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Inicia el bot en segundo plano y responde 202 con el id del trabajo.
+    Con ?full=1 se hace una recarga completa.
+    """
     logging.info("Ejecución manual del bot.")
-    result = subprocess.run([sys.executable, "lanzador.py"], capture_output=True, text=True, env=env)
-    if result.returncode != 0:
-        logging.error("Error: %s", result.stderr)
-        return func.HttpResponse(f"Error: {result.stderr}", status_code=500)
-    else:
-        logging.info("Éxito: %s", result.stdout)
-        return func.HttpResponse(f"Éxito: {result.stdout}", status_code=200)
+    try:
+        trabajo, nuevo = enviar_bot(completo=req.params.get("full") == "1")
+    except trabajos.EjecucionEnCurso as e:
+        logging.warning("No se inició el bot: %s", e)
+        if e.trabajo is None:
+            return func.HttpResponse(f"Error: {e}", status_code=409)
+        return respuesta_trabajo(e.trabajo, 409, nuevo=False, mensaje=str(e))
+    except Exception as e:
+        logging.error("Error al iniciar el bot: %s", e)
+        return func.HttpResponse(f"Error: {e}", status_code=500)
+    if not nuevo:
+        logging.info("Se une a la ejecución en curso %s.", trabajo.id)
+    url_estado = f"{req.url.split('?')[0].rstrip('/')}/{trabajo.id}"
+    return respuesta_trabajo(trabajo, 202, headers={"Location": url_estado},
+                             nuevo=nuevo, url_estado=url_estado)
+
+@app.function_name(name="ManualRunStatusFunction")
+@app.route(route="manual-run/{id}", methods=["GET"])
+def ManualRunStatusFunction(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Devuelve el estado de un trabajo: etapa actual, progreso y tiempos por etapa.
+    """
+    trabajo = trabajos.obtener(req.route_params.get("id"))
+    if trabajo is None:
+        return func.HttpResponse("Trabajo no encontrado", status_code=404)
+    return respuesta_trabajo(trabajo)
 
 @app.function_name(name="ListPackagesFunction")
 @app.route(route="list-packages", methods=["GET"])
 def ListPackagesFunction(req: func.HttpRequest) -> func.HttpResponse:
     logging.info("Ejecutando pip freeze para listar paquetes instalados...")
     try:
-        result = subprocess.run([sys.executable, "-m", "pip", "freeze"], capture_output=True, text=True, env=env)
+        result = subprocess.run([sys.executable, "-m", "pip", "freeze"], capture_output=True, text=True, env=entorno_subproceso())
         if result.returncode != 0:
             logging.error("Error al ejecutar pip freeze: %s", result.stderr)
             return func.HttpResponse(f"Error al ejecutar pip freeze:\n{result.stderr}", status_code=500)
@@ -57,7 +151,7 @@ def CheckChromiumFunction(req: func.HttpRequest) -> func.HttpResponse:
     """
     logging.info("Verificando la existencia de Chromium...")
     try:
-        result = subprocess.run(["which", "chromium-browser"], capture_output=True, text=True, env=env)
+        result = subprocess.run(["which", "chromium-browser"], capture_output=True, text=True, env=entorno_subproceso())
         path = result.stdout.strip()
         if path:
             message = f"Chromium está instalado en: {path}"
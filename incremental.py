@@ -0,0 +1,223 @@
+"""
+Estado local para la carga incremental.
+
+Para cada clave de negocio (por defecto DiaFecha, Sku, NT; configurable con
+CLAVE_NEGOCIO) se guarda en SQLite un hash del contenido del registro por
+destino (almacén y Ninox) y el id del registro en Ninox. En cada ejecución
+sólo se envían a cada destino las filas nuevas o cambiadas respecto a lo que
+ese destino ya confirmó, de modo que repetir una carga no duplica datos.
+
+El almacén confirma todo al final de la transacción, así que sus hashes se
+guardan primero como pendientes y se confirman sólo después del commit. En
+Ninox cada bloque aceptado queda guardado, así que se registra al momento.
+
+Si una clave se repite en la carga (en el mismo lote o en lotes distintos),
+la clave no identifica los registros del reporte: el MERGE dejaría sólo una
+de las filas donde el INSERT completo las guardaba todas. Por eso, por
+defecto (CLAVES_DUPLICADAS=error), la carga del destino se detiene y se
+revierte; con 'avisar' se cuentan aparte (no como sin cambios), se avisa y
+se conserva la última. Si el reporte no tiene una clave única, CLAVE_NEGOCIO
+debe cambiarse o la carga hacerse completa (CARGA_INCREMENTAL=0).
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+from esquema import COLUMNAS_ALMACEN
+
+RUTA_ESTADO_INCREMENTAL = os.environ.get(
+    "RUTA_ESTADO_INCREMENTAL", os.path.join("/tmp", "estado_incremental.sqlite"))
+
+# Columnas que identifican un registro, separadas por comas
+CLAVE_NEGOCIO = tuple(col.strip() for col in
+                      os.environ.get("CLAVE_NEGOCIO", "DiaFecha,Sku,NT").split(",") if col.strip())
+
+# Qué hacer si una clave se repite en la carga: 'error' (detiene el destino) o 'avisar'
+CLAVES_DUPLICADAS = os.environ.get("CLAVES_DUPLICADAS", "error")
+
+DESTINOS = ("almacen", "ninox")
+
+def clave_registro(campos, clave_negocio=CLAVE_NEGOCIO):
+    return "\x1f".join("" if campos.get(col) is None else str(campos[col]) for col in clave_negocio)
+
+def hash_registro(campos):
+    contenido = json.dumps(campos, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(contenido.encode("utf-8")).hexdigest()
+
+class ClaveDuplicada(ValueError):
+    """
+    Una clave de negocio se repite en la carga (con CLAVES_DUPLICADAS=error).
+    """
+
+def validar_clave_negocio(clave_negocio):
+    """
+    Verifica que la clave de negocio no esté vacía y que sus columnas existan
+    en la tabla del almacén (por donde se fusiona).
+    """
+    if not clave_negocio:
+        raise ValueError("La clave de negocio no tiene columnas")
+    desconocidas = [col for col in clave_negocio if col not in COLUMNAS_ALMACEN]
+    if desconocidas:
+        raise ValueError(f"Columnas de la clave de negocio que no están en el esquema: "
+                         f"{', '.join(desconocidas)}")
+
+class EstadoIncremental:
+    """
+    Almacén de hashes por clave de negocio. Con completo=True (recarga completa)
+    delta() devuelve todas las filas, pero el estado se actualiza igual.
+    Las claves ya vistas en la carga se recuerdan por destino desde iniciar()
+    hasta confirmar() o descartar(), para detectar las repetidas entre lotes.
+    Es seguro usarlo desde varios hilos (un hilo por destino).
+    """
+
+    def __init__(self, ruta=RUTA_ESTADO_INCREMENTAL, completo=False, clave_negocio=CLAVE_NEGOCIO,
+                 duplicadas=CLAVES_DUPLICADAS):
+        if duplicadas not in ("avisar", "error"):
+            raise ValueError(f"CLAVES_DUPLICADAS no válido: {duplicadas}")
+        validar_clave_negocio(clave_negocio)
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self.ruta = ruta
+        self.completo = completo
+        self.clave_negocio = tuple(clave_negocio)
+        self.duplicadas = duplicadas
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(ruta, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS filas (
+            clave TEXT PRIMARY KEY, hash_almacen TEXT, hash_ninox TEXT, ninox_id TEXT)""")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS pendientes (
+            destino TEXT, clave TEXT, hash TEXT, PRIMARY KEY (destino, clave))""")
+        # Lo pendiente de una ejecución anterior interrumpida nunca se confirmó
+        self.conn.execute("DELETE FROM pendientes")
+        self.conn.commit()
+        self.omitidas = {destino: 0 for destino in DESTINOS}
+        self.enviadas = {destino: 0 for destino in DESTINOS}
+        self.repetidas = {destino: 0 for destino in DESTINOS}
+        self.vistas = {destino: set() for destino in DESTINOS}
+
+    def cerrar(self):
+        with self._lock:
+            self.conn.close()
+
+    def iniciar(self, destino):
+        """
+        Empieza una carga del destino: olvida las claves vistas en la anterior.
+        """
+        self.vistas[destino] = set()
+
+    def delta(self, destino, registros):
+        """
+        Devuelve las filas de 'registros' nuevas o cambiadas para el destino como
+        tuplas (registro, clave, hash, ninox_id). Si una clave ya apareció en el
+        lote o en un lote anterior de la carga se lanza ClaveDuplicada; con
+        duplicadas='avisar' se cuenta como repetida y se conserva la última aparición.
+        """
+        columna = f"hash_{destino}"
+        vistas = self.vistas[destino]
+        por_clave = {}
+        repetidas, ejemplo = 0, None
+        # Claves que ya se enviaron en un lote anterior: se reenvían para que gane la última
+        reenviar = set()
+        for registro in registros:
+            campos = registro["fields"]
+            clave = clave_registro(campos, self.clave_negocio)
+            if clave in por_clave or clave in vistas:
+                repetidas += 1
+                ejemplo = ejemplo or clave
+                if clave in vistas:
+                    reenviar.add(clave)
+            por_clave[clave] = (registro, hash_registro(campos))
+        if repetidas:
+            self._avisar_repetidas(destino, repetidas, ejemplo)
+        vistas.update(por_clave)
+
+        guardados = {}
+        claves = list(por_clave)
+        with self._lock:
+            for i in range(0, len(claves), 500):
+                parte = claves[i:i + 500]
+                marcadores = ", ".join("?" * len(parte))
+                for clave, hash_guardado, ninox_id in self.conn.execute(
+                        f"SELECT clave, {columna}, ninox_id FROM filas WHERE clave IN ({marcadores})", parte):
+                    guardados[clave] = (hash_guardado, ninox_id)
+
+        delta = []
+        for clave, (registro, hash_actual) in por_clave.items():
+            hash_guardado, ninox_id = guardados.get(clave, (None, None))
+            if self.completo or hash_guardado != hash_actual or clave in reenviar:
+                delta.append((registro, clave, hash_actual, ninox_id))
+        with self._lock:
+            self.omitidas[destino] += len(por_clave) - len(delta)
+            self.enviadas[destino] += len(delta)
+            self.repetidas[destino] += repetidas
+        return delta
+
+    def _avisar_repetidas(self, destino, repetidas, ejemplo):
+        ejemplo = dict(zip(self.clave_negocio, ejemplo.split("\x1f")))
+        mensaje = (f"{repetidas} filas repiten la clave de negocio "
+                   f"({', '.join(self.clave_negocio)}) en {destino}; por ejemplo {ejemplo}")
+        if self.duplicadas == "error":
+            raise ClaveDuplicada(f"{mensaje}. Cambie CLAVE_NEGOCIO o cargue completo "
+                                 f"(CARGA_INCREMENTAL=0)")
+        print(f"Aviso: {mensaje}. Se conserva la última de cada clave.")
+
+    def marcar_pendiente(self, destino, filas):
+        """
+        Guarda como pendientes los hashes de filas enviadas pero aún no confirmadas.
+        """
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO pendientes (destino, clave, hash) VALUES (?, ?, ?)",
+                [(destino, clave, hash_actual) for _, clave, hash_actual, _ in filas])
+            self.conn.commit()
+
+    def confirmar(self, destino):
+        """
+        Pasa los pendientes del destino al estado (después del commit del destino).
+        """
+        columna = f"hash_{destino}"
+        with self._lock:
+            self.conn.execute(f"""
+                INSERT INTO filas (clave, {columna})
+                SELECT clave, hash FROM pendientes WHERE destino = ?
+                ON CONFLICT(clave) DO UPDATE SET {columna} = excluded.{columna}""", (destino,))
+            self.conn.execute("DELETE FROM pendientes WHERE destino = ?", (destino,))
+            self.conn.commit()
+        self.vistas[destino] = set()
+
+    def descartar(self, destino):
+        self.vistas[destino] = set()
+        with self._lock:
+            self.conn.execute("DELETE FROM pendientes WHERE destino = ?", (destino,))
+            self.conn.commit()
+
+    def registrar_ninox(self, filas, ids):
+        """
+        Registra como confirmadas en Ninox las filas aceptadas, con el id que
+        devolvió la API (o el que ya tenían si la respuesta no lo incluye).
+        """
+        valores = []
+        for (_, clave, hash_actual, ninox_id), nuevo_id in zip(filas, ids):
+            valores.append((clave, hash_actual, None if nuevo_id is None and ninox_id is None
+                            else str(nuevo_id if nuevo_id is not None else ninox_id)))
+        with self._lock:
+            self.conn.executemany("""
+                INSERT INTO filas (clave, hash_ninox, ninox_id) VALUES (?, ?, ?)
+                ON CONFLICT(clave) DO UPDATE SET
+                    hash_ninox = excluded.hash_ninox,
+                    ninox_id = COALESCE(excluded.ninox_id, filas.ninox_id)""", valores)
+            self.conn.commit()
+
+    def resumen(self):
+        lineas = []
+        for destino in DESTINOS:
+            linea = (f"{destino}: {self.enviadas[destino]} filas nuevas o cambiadas, "
+                     f"{self.omitidas[destino]} sin cambios omitidas")
+            if self.repetidas[destino]:
+                linea += f", {self.repetidas[destino]} con clave repetida descartadas"
+            lineas.append(linea)
+        return lineas
@@ -0,0 +1,231 @@
+"""
+Archivo tipado de intercambio entre la transformación y la carga.
+
+Además del CSV procesado, la transformación escribe los mismos datos en un
+archivo Arrow IPC (o Parquet) con tipos: fechas como date32, montos como
+float64, 'dow' como entero y el resto como texto. La carga lo abre con un
+mapa de memoria y arma los registros columna por columna, sin volver a
+interpretar texto. El CSV procesado se lee con el lector de pyarrow y se
+convierte con las mismas reglas (esquema.py).
+
+Arrow IPC se escribe sin compresión para que la lectura con memory_map no
+copie los datos; Parquet ocupa menos en disco pero hay que decodificarlo.
+
+Comparación de tamaño y tiempo contra el CSV:
+    python intercambio.py <exportacion_cruda.csv>
+"""
+import os
+import sys
+import time
+
+from esquema import ConvertidorRegistros, tipo_arrow, tipo_columna
+
+# Formato del archivo tipado: 'arrow', 'parquet' o 'csv' (sólo el CSV, como antes)
+FORMATO_INTERCAMBIO = os.environ.get("FORMATO_INTERCAMBIO", "arrow")
+# Si es "0" y hay archivo tipado ya no se escribe el CSV procesado
+GUARDAR_CSV_PROCESADO = os.environ.get("GUARDAR_CSV_PROCESADO", "1") == "1"
+
+FORMATOS = ("arrow", "parquet", "csv")
+EXTENSIONES = {"arrow": ".arrow", "parquet": ".parquet"}
+
+def esquema_procesado(columnas):
+    """
+    Devuelve el esquema Arrow para las columnas del archivo procesado (en su orden),
+    con los tipos de esquema.py.
+    """
+    import pyarrow as pa
+    return pa.schema([pa.field(col, tipo_arrow(tipo_columna(col))) for col in columnas])
+
+def formato_de_ruta(ruta):
+    """
+    Devuelve 'arrow', 'parquet' o 'csv' según la extensión del archivo.
+    """
+    extension = os.path.splitext(ruta)[1].lower()
+    for formato, ext in EXTENSIONES.items():
+        if extension == ext:
+            return formato
+    return "csv"
+
+def tabla_desde_bloque(df, esquema):
+    """
+    Convierte un bloque ya transformado (el que se escribe al CSV) en una tabla
+    Arrow con el esquema indicado. Los textos vacíos quedan como nulos y los
+    números con separadores de miles o '%' se limpian como en esquema.py.
+    """
+    import pandas as pd
+    import pyarrow as pa
+    arreglos = []
+    for campo in esquema:
+        serie = df[campo.name]
+        if pa.types.is_date(campo.type):
+            fechas = pd.to_datetime(serie, format="%Y-%m-%d", errors="coerce")
+            arreglo = pa.array(fechas, from_pandas=True).cast(campo.type)
+        elif pa.types.is_string(campo.type):
+            texto = serie.str.strip()
+            arreglo = pa.array(texto.mask(texto == ""), type=campo.type, from_pandas=True)
+        else:
+            if not pd.api.types.is_numeric_dtype(serie):
+                serie = pd.to_numeric(
+                    serie.str.replace(",", "", regex=False).str.replace("%", "", regex=False).str.strip(),
+                    errors="coerce")
+            arreglo = pa.array(serie, from_pandas=True).cast(campo.type)
+        arreglos.append(arreglo)
+    return pa.Table.from_arrays(arreglos, schema=esquema)
+
+class EscritorTipado:
+    """
+    Escribe bloques de DataFrame en un archivo Arrow IPC o Parquet.
+    """
+
+    def __init__(self, ruta, columnas, formato=FORMATO_INTERCAMBIO):
+        import pyarrow as pa
+        if formato not in EXTENSIONES:
+            raise ValueError(f"Formato tipado no válido: {formato}")
+        self.ruta = ruta
+        self.formato = formato
+        self.esquema = esquema_procesado(columnas)
+        if formato == "arrow":
+            self._sumidero = pa.OSFile(ruta, "wb")
+            self._escritor = pa.ipc.new_file(self._sumidero, self.esquema)
+        else:
+            import pyarrow.parquet as pq
+            self._sumidero = None
+            self._escritor = pq.ParquetWriter(ruta, self.esquema, compression="snappy")
+
+    def escribir(self, df):
+        self._escritor.write_table(tabla_desde_bloque(df, self.esquema))
+
+    def cerrar(self):
+        try:
+            self._escritor.close()
+        finally:
+            if self._sumidero is not None:
+                self._sumidero.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+def reagrupar(lotes, tamano_lote):
+    """
+    Reagrupa RecordBatch de cualquier tamaño en tablas de 'tamano_lote' filas
+    (la última puede tener menos). Las tablas son vistas sobre los lotes leídos.
+    """
+    import pyarrow as pa
+    pendientes, filas = [], 0
+    for lote in lotes:
+        if not lote.num_rows:
+            continue
+        pendientes.append(lote)
+        filas += lote.num_rows
+        if filas >= tamano_lote:
+            tabla = pa.Table.from_batches(pendientes)
+            inicio = 0
+            while filas - inicio >= tamano_lote:
+                yield tabla.slice(inicio, tamano_lote)
+                inicio += tamano_lote
+            resto = tabla.slice(inicio)
+            pendientes, filas = resto.to_batches(), resto.num_rows
+    if filas:
+        yield pa.Table.from_batches(pendientes)
+
+def _lotes_csv(ruta, encoding="latin1"):
+    """
+    Lee el CSV procesado en streaming con el lector de pyarrow, todas las
+    columnas como texto (sin interpretar vacíos como nulos).
+    """
+    import csv
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    with open(ruta, encoding=encoding, newline="") as f:
+        columnas = next(csv.reader(f, dialect="excel"), None)
+    if not columnas:
+        return
+    yield from pacsv.open_csv(
+        ruta,
+        read_options=pacsv.ReadOptions(encoding=encoding),
+        convert_options=pacsv.ConvertOptions(column_types={col: pa.string() for col in columnas}),
+    )
+
+def _lotes_de_archivo(ruta):
+    """
+    Devuelve los RecordBatch del archivo procesado. En Arrow IPC los lotes son
+    vistas sobre el archivo mapeado en memoria (sin copia).
+    """
+    import pyarrow as pa
+    formato = formato_de_ruta(ruta)
+    if formato == "csv":
+        yield from _lotes_csv(ruta)
+    elif formato == "parquet":
+        import pyarrow.parquet as pq
+        yield from pq.ParquetFile(ruta, memory_map=True).iter_batches()
+    else:
+        with pa.memory_map(ruta, "r") as fuente:
+            lector = pa.ipc.open_file(fuente)
+            for i in range(lector.num_record_batches):
+                yield lector.get_batch(i)
+
+def leer_registros_por_lotes(ruta, tamano_lote):
+    """
+    Devuelve los registros {"fields": {...}} del archivo procesado (CSV, Arrow
+    o Parquet) en listas de a lo más 'tamano_lote', convertidos con esquema.py.
+    Cada lista es un esquema.LoteRegistros, que además arma las tuplas del
+    almacén por columna.
+    """
+    convertidor = None
+    for tabla in reagrupar(_lotes_de_archivo(ruta), tamano_lote):
+        if convertidor is None:
+            convertidor = ConvertidorRegistros(tabla.schema.names)
+        yield convertidor.lote_registros(tabla)
+
+def comparar(archivo_exportacion, tamano_lote=5000):
+    """
+    Transforma la exportación a CSV, Arrow y Parquet y compara el tamaño en disco
+    y el tiempo de lectura hasta tener los registros listos para la carga.
+    """
+    import shutil
+    import tempfile
+    import script1
+    import script2
+
+    resultados = []
+    referencia = None
+    directorio = tempfile.mkdtemp(prefix="intercambio_")
+    try:
+        for formato in ("csv", "arrow", "parquet"):
+            entrada = os.path.join(directorio, formato, os.path.basename(archivo_exportacion))
+            os.makedirs(os.path.dirname(entrada))
+            shutil.copyfile(archivo_exportacion, entrada)
+            inicio = time.perf_counter()
+            ruta, filas = script1.transformar_archivo(entrada, formato=formato,
+                                                      guardar_csv=formato == "csv")
+            segundos_escritura = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            lotes = list(script2.leer_por_lotes(ruta, tamano_lote))
+            segundos_lectura = time.perf_counter() - inicio
+
+            registros = [r for lote in lotes for r in lote]
+            if referencia is None:
+                referencia = registros
+            diferentes = sum(a != b for a, b in zip(referencia, registros))
+            diferentes += abs(len(referencia) - len(registros))
+            resultados.append((formato, os.path.getsize(ruta), segundos_escritura,
+                               segundos_lectura, filas, diferentes))
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    print(f"{'formato':<8} {'MB':>9} {'escritura s':>12} {'lectura s':>10} {'filas/s':>12} {'distintos':>10}")
+    for formato, tamano, escritura, lectura, filas, diferentes in resultados:
+        por_segundo = filas / lectura if lectura > 0 else 0.0
+        print(f"{formato:<8} {tamano / (1024 * 1024):>9.2f} {escritura:>12.2f} "
+              f"{lectura:>10.2f} {por_segundo:>12,.0f} {diferentes:>10}")
+    return resultados
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Uso: python intercambio.py <exportacion_cruda.csv>")
+        sys.exit(2)
+    comparar(sys.argv[1])
@@ -1,8 +1,42 @@
+import argparse
 import subprocess
 import sys
 import re
 
-def main():
+def ejecutar_en_proceso(completo=False, reanudar=None):
+    """
+    Ejecuta extracción, transformación y carga en este mismo proceso.
+    Con completo=True se recargan todas las filas aunque no hayan cambiado.
+    Con reanudar=False se ignora la ejecución pendiente del día (por defecto REANUDAR).
+    Devuelve el ResultadoPipeline.
+    """
+    import pipeline
+    print("=== Ejecutando pipeline en proceso ===")
+    if reanudar is None:
+        reanudar = pipeline.REANUDAR
+    resultado = pipeline.ejecutar(completo=completo, reanudar=reanudar)
+    print(resultado.resumen())
+    return resultado
+
+def ejecutar_reportes_en_proceso(ruta_reportes=None, completo=False, reanudar=None):
+    """
+    Ejecuta la lista de reportes configurada (descarga concurrente) en este proceso.
+    Devuelve True si todos los reportes terminaron bien.
+    """
+    import pipeline
+    print("=== Ejecutando lista de reportes ===")
+    if reanudar is None:
+        reanudar = pipeline.REANUDAR
+    ejecuciones = pipeline.ejecutar_reportes(ruta_reportes, completo=completo, reanudar=reanudar)
+    print(pipeline.resumen_reportes(ejecuciones))
+    return all(e.ok for e in ejecuciones.values())
+
+def ejecutar_en_subprocesos(completo=False):
+    """
+    Modo de aislamiento: ejecuta script1.py y script2.py en intérpretes separados
+    y obtiene la ruta del CSV procesado desde la salida de script1.py.
+    Con completo=True script2.py recibe --full (recarga completa).
+    """
     # 1. Ejecutar script1.py y capturar su salida
     print("=== Ejecutando script1.py ===")
     proceso1 = subprocess.run(
@@ -33,8 +67,11 @@ def main():
 
     # 3. Ejecutar script2.py, pasándole la ruta CSV como argumento
     print("=== Ejecutando script2.py ===")
+    comando = [sys.executable, "script2.py", csv_path]
+    if completo:
+        comando.append("--full")
     proceso2 = subprocess.run(
-        [sys.executable, "script2.py", csv_path],
+        comando,
         capture_output=True,
         text=True
     )
@@ -47,5 +84,27 @@ def main():
         print("Script2 finalizó sin errores.")
         print("Salida de script2:\n", proceso2.stdout)
 
+def main():
+    parser = argparse.ArgumentParser(description="Ejecuta el bot de chedlink.")
+    parser.add_argument("--subproceso", action="store_true",
+                        help="Ejecuta cada script en un intérprete separado (modo de aislamiento).")
+    parser.add_argument("--reportes", nargs="?", const="", metavar="RUTA",
+                        help="Ejecuta la lista de reportes de RUTA (por defecto reportes.json).")
+    parser.add_argument("--full", action="store_true",
+                        help="Recarga completa: envía todas las filas aunque no hayan cambiado.")
+    parser.add_argument("--desde-cero", action="store_true",
+                        help="No reanuda la ejecución pendiente del día: vuelve a descargar y cargar todo.")
+    args = parser.parse_args()
+    reanudar = False if args.desde_cero else None
+    if args.subproceso:
+        ejecutar_en_subprocesos(args.full)
+    elif args.reportes is not None:
+        if not ejecutar_reportes_en_proceso(args.reportes or None, args.full, reanudar):
+            sys.exit(1)
+    else:
+        resultado = ejecutar_en_proceso(args.full, reanudar)
+        if not resultado.ok:
+            sys.exit(1)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,200 @@
+"""
+Manifiesto de ejecución para reanudar el pipeline.
+
+Por cada reporte y fecha de negocio se guarda un JSON con:
+- El archivo que dejó cada etapa terminada (CSV descargado, archivo
+  procesado) con su hash SHA-256 y el hash de la entrada de la que salió.
+- Los lotes que cada destino confirmó en la carga: Ninox guarda cada bloque
+  aceptado, así que se registran sus lotes uno por uno; el almacén confirma
+  todo en una sola transacción, así que queda completo o nada.
+
+Si una ejecución falla, la siguiente del mismo reporte y fecha reutiliza las
+etapas terminadas cuyo archivo sigue intacto (sin volver a entrar al portal
+ni a transformar) y en la carga omite los lotes y destinos ya confirmados.
+Cuando la ejecución termina completa, la siguiente empieza un manifiesto nuevo.
+
+Consulta de un manifiesto:
+    python manifiesto.py <reporte> [<fecha YYYY-MM-DD>]
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+from datetime import datetime
+
+RUTA_MANIFIESTOS = os.environ.get("RUTA_MANIFIESTOS", os.path.join("/tmp", "manifiestos"))
+# REANUDAR=0 hace que cada ejecución empiece desde cero
+REANUDAR = os.environ.get("REANUDAR", "1") == "1"
+
+def _ahora():
+    return datetime.now().isoformat(timespec="seconds")
+
+def fecha_de_negocio():
+    return datetime.now().strftime("%Y-%m-%d")
+
+def ruta_manifiesto(reporte, fecha, directorio=RUTA_MANIFIESTOS):
+    nombre = re.sub(r"[^\w.-]", "_", f"{reporte}_{fecha}")
+    return os.path.join(directorio, f"{nombre}.json")
+
+def hash_archivo(ruta, tamano_bloque=1024 * 1024):
+    """
+    SHA-256 del contenido del archivo, leído por bloques.
+    """
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(tamano_bloque), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+def etapa_vigente(etapa, entrada=None):
+    """
+    Indica si el registro de una etapa se puede reutilizar: salió de la misma
+    entrada y su archivo sigue igual (mismo hash). No usa el manifiesto, así
+    que sirve en un proceso que sólo recibió el registro.
+    """
+    if not etapa or etapa.get("entrada") != entrada:
+        return False
+    ruta = etapa.get("ruta")
+    return bool(ruta) and os.path.exists(ruta) and hash_archivo(ruta) == etapa.get("sha256")
+
+class Manifiesto:
+    """
+    Estado de una ejecución de un reporte en una fecha, guardado como JSON.
+    Es seguro usarlo desde varios hilos (los destinos confirman en paralelo).
+    """
+
+    def __init__(self, ruta, datos):
+        self.ruta = ruta
+        self.datos = datos
+        self._lock = threading.Lock()
+
+    @classmethod
+    def abrir(cls, reporte, fecha=None, directorio=RUTA_MANIFIESTOS):
+        """
+        Abre el manifiesto pendiente del reporte y la fecha, o crea uno nuevo si
+        no hay o si la ejecución anterior terminó completa.
+        """
+        fecha = fecha or fecha_de_negocio()
+        os.makedirs(directorio, exist_ok=True)
+        ruta = ruta_manifiesto(reporte, fecha, directorio)
+        datos = None
+        try:
+            with open(ruta, encoding="utf-8") as f:
+                datos = json.load(f)
+        except (OSError, ValueError):
+            pass
+        if datos is None or datos.get("completo"):
+            datos = {"reporte": str(reporte), "fecha": fecha, "creado": _ahora(), "completo": False,
+                     "etapas": {}, "carga": {}}
+        else:
+            print(f"Manifiesto pendiente de {reporte} {fecha}: se reanuda ({ruta})")
+        manifiesto = cls(ruta, datos)
+        manifiesto.guardar()
+        return manifiesto
+
+    @staticmethod
+    def leer(reporte, fecha, directorio=RUTA_MANIFIESTOS):
+        """
+        Devuelve el contenido del manifiesto sin abrirlo para escribir, o None si no existe.
+        """
+        try:
+            with open(ruta_manifiesto(reporte, fecha, directorio), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def guardar(self):
+        with self._lock:
+            self._guardar()
+
+    def _guardar(self):
+        self.datos["actualizado"] = _ahora()
+        temporal = f"{self.ruta}.{threading.get_ident()}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(self.datos, f, ensure_ascii=False, indent=2)
+        os.replace(temporal, self.ruta)
+
+    # --- Etapas ---
+
+    def etapa_terminada(self, nombre, entrada=None):
+        """
+        Devuelve el registro de la etapa si terminó, su archivo sigue igual (mismo
+        hash) y salió de la misma entrada; si no, None.
+        """
+        etapa = self.datos["etapas"].get(nombre)
+        return etapa if etapa_vigente(etapa, entrada) else None
+
+    def registrar_etapa(self, nombre, ruta=None, filas=None, entrada=None, sha256=None):
+        """
+        Registra una etapa terminada con el hash de su archivo. 'entrada' es el
+        hash del archivo del que salió, para no reutilizarla si éste cambia.
+        'sha256' es el hash del archivo si ya se calculó (por ejemplo en otro
+        proceso), para no volver a leerlo.
+        """
+        registro = {"ruta": ruta, "filas": filas, "entrada": entrada, "fin": _ahora()}
+        if ruta and os.path.exists(ruta):
+            registro["sha256"] = sha256 or hash_archivo(ruta)
+            registro["bytes"] = os.path.getsize(ruta)
+        with self._lock:
+            self.datos["etapas"][nombre] = registro
+            self._guardar()
+        return registro
+
+    def hash_etapa(self, nombre):
+        return self.datos["etapas"].get(nombre, {}).get("sha256")
+
+    def completar(self):
+        with self._lock:
+            self.datos["completo"] = True
+            self._guardar()
+
+    # --- Carga por lotes (punto de control de script2.cargar_por_lotes) ---
+
+    def iniciar_carga(self, sha256, tamano_lote):
+        """
+        Prepara el registro de la carga de un archivo procesado. Si el archivo o
+        el tamaño de lote cambiaron, los lotes confirmados ya no corresponden y
+        se descartan.
+        """
+        with self._lock:
+            carga = self.datos["carga"]
+            if carga.get("sha256") != sha256 or carga.get("tamano_lote") != tamano_lote:
+                self.datos["carga"] = {"sha256": sha256, "tamano_lote": tamano_lote, "destinos": {}}
+                self._guardar()
+
+    def _destino(self, nombre):
+        return self.datos["carga"].setdefault("destinos", {}).setdefault(
+            nombre, {"lotes": [], "completo": False})
+
+    def destino_completo(self, nombre):
+        with self._lock:
+            return self._destino(nombre)["completo"]
+
+    def lote_confirmado(self, nombre, numero):
+        with self._lock:
+            return numero in self._destino(nombre)["lotes"]
+
+    def confirmar_lote(self, nombre, numero):
+        with self._lock:
+            lotes = self._destino(nombre)["lotes"]
+            if numero not in lotes:
+                lotes.append(numero)
+                self._guardar()
+
+    def confirmar_destino(self, nombre):
+        with self._lock:
+            self._destino(nombre)["completo"] = True
+            self._guardar()
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print("Uso: python manifiesto.py <reporte> [<fecha YYYY-MM-DD>]")
+        sys.exit(2)
+    fecha = sys.argv[2] if len(sys.argv) == 3 else fecha_de_negocio()
+    datos = Manifiesto.leer(sys.argv[1], fecha)
+    if datos is None:
+        print(f"No hay manifiesto en {ruta_manifiesto(sys.argv[1], fecha)}")
+        sys.exit(1)
+    print(json.dumps(datos, ensure_ascii=False, indent=2))
@@ -0,0 +1,153 @@
+"""
+Plan de tipos en memoria para los bloques de la transformación.
+
+La exportación se lee con todas las columnas como texto: cada valor es un str
+de Python (unos 50-60 bytes) aunque se repita en millones de filas. A partir
+de esquema.py, cada bloque se convierte al leerlo:
+
+- Dimensiones (Region, Distrito, NT, Tienda, SubDepto, Depto, Clase, SubClase,
+  Capa, Comprador): categorías, un código entero por fila.
+- Fechas: datetime64 (8 bytes por fila).
+- Números que la transformación no toca: el entero más chico que los contiene
+  (int8/16/32) si todos los valores del bloque son enteros escritos sin ceros
+  a la izquierda; si no, texto de Arrow (un solo búfer, sin objetos por fila).
+  No se pasan a float: el CSV procesado debe conservar el texto original
+  ('7143.20') y float32 perdería centavos en los montos grandes.
+- El resto del texto (NP, Sku, DiasdeInventario): texto de Arrow.
+
+Las columnas que transformar_bloque convierte por su cuenta (ventas y
+márgenes) se dejan como están. El CSV procesado queda idéntico.
+
+Con REPORTE_MEMORIA=1 la transformación imprime la memoria de cada columna
+antes y después del plan (memory_usage(deep=True), sumada sobre los bloques).
+PLAN_TIPOS=0 desactiva el plan.
+
+Medición sobre una exportación:
+    python memoria.py <exportacion_cruda.csv>
+"""
+import os
+import sys
+import time
+from collections import defaultdict
+
+from esquema import COLUMNAS_DIMENSION, tipo_columna
+
+PLAN_TIPOS = os.environ.get("PLAN_TIPOS", "1") == "1"
+REPORTE_MEMORIA = os.environ.get("REPORTE_MEMORIA", "0") == "1"
+
+# Columnas que transformar_bloque convierte a número con sus propias reglas
+COLUMNAS_CALCULADAS = ("VentaNetaenUnidades", "VentaNetaenPesos", "MargenObtenidoInv", "MargenObtenidoVenta")
+
+# Enteros que se vuelven a escribir igual: sin ceros a la izquierda, sin '-0'
+# y de hasta 9 dígitos (caben en int32)
+PATRON_ENTERO = r"^(0|-?[1-9][0-9]{0,8})$"
+
+def plan_tipos(columnas):
+    """
+    Devuelve {columna: 'categoria' | 'fecha' | 'entero' | 'texto'} para las
+    columnas de la exportación según su tipo en esquema.py.
+    """
+    plan = {}
+    for col in columnas:
+        if col in COLUMNAS_CALCULADAS:
+            continue
+        tipo = tipo_columna(col)
+        if col in COLUMNAS_DIMENSION:
+            plan[col] = "categoria"
+        elif tipo == "fecha":
+            plan[col] = "fecha"
+        elif tipo in ("numero", "entero"):
+            plan[col] = "entero"
+        else:
+            plan[col] = "texto"
+    return plan
+
+def _entero_o_texto(texto):
+    """
+    Convierte una serie de texto de Arrow al entero más chico si todos sus
+    valores son enteros; si no, la devuelve como está.
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    arreglo = pa.array(texto)
+    if not pc.all(pc.match_substring_regex(arreglo, PATRON_ENTERO)).as_py():
+        return texto
+    numeros = pc.cast(arreglo, pa.int32()).to_numpy(zero_copy_only=False)
+    return pd.to_numeric(pd.Series(numeros, index=texto.index), downcast="integer")
+
+def aplicar_plan(df, plan):
+    """
+    Convierte las columnas del bloque según el plan (ver plan_tipos) y lo devuelve.
+    """
+    import pandas as pd
+    for col, destino in plan.items():
+        if col not in df.columns:
+            continue
+        if destino == "categoria":
+            df[col] = df[col].astype("category")
+        elif destino == "fecha":
+            df[col] = pd.to_datetime(df[col], format="%d/%m/%Y", errors="coerce")
+        else:
+            texto = df[col].astype("string[pyarrow]")
+            df[col] = _entero_o_texto(texto) if destino == "entero" else texto
+    return df
+
+class ReporteMemoria:
+    """
+    Suma la memoria de cada columna sobre los bloques, antes y después del plan.
+    """
+
+    def __init__(self):
+        self.antes = defaultdict(int)
+        self.despues = defaultdict(int)
+        self.tipos = {}
+
+    def medir(self, df, despues=False):
+        destino = self.despues if despues else self.antes
+        for col, bytes_col in df.memory_usage(deep=True, index=False).items():
+            destino[col] += int(bytes_col)
+            if despues:
+                self.tipos[col] = str(df[col].dtype)
+
+    def lineas(self):
+        lineas = [f"{'columna':<24} {'antes MB':>9} {'después MB':>11} {'factor':>7}  tipo"]
+        for col, antes in self.antes.items():
+            despues = self.despues.get(col, antes)
+            factor = antes / despues if despues else 0.0
+            lineas.append(f"{col:<24} {antes / 1e6:>9.2f} {despues / 1e6:>11.2f} "
+                          f"{factor:>6.1f}x  {self.tipos.get(col, '')}")
+        antes, despues = sum(self.antes.values()), sum(self.despues.values())
+        factor = antes / despues if despues else 0.0
+        lineas.append(f"{'total':<24} {antes / 1e6:>9.2f} {despues / 1e6:>11.2f} {factor:>6.1f}x")
+        return lineas
+
+def comparar(archivo_exportacion, tamano_bloque=None):
+    """
+    Lee la exportación por bloques, aplica el plan y muestra la memoria por
+    columna antes y después y el tiempo que toma aplicarlo.
+    """
+    import script1
+    from esquema import COLUMNAS_EXPORTACION
+    plan = plan_tipos(COLUMNAS_EXPORTACION)
+    reporte = ReporteMemoria()
+    segundos = 0.0
+    filas = 0
+    for bloque in script1.leer_csv_por_bloques(archivo_exportacion,
+                                               tamano_bloque or script1.TAMANO_BLOQUE_CSV):
+        reporte.medir(bloque)
+        inicio = time.perf_counter()
+        bloque = aplicar_plan(bloque, plan)
+        segundos += time.perf_counter() - inicio
+        reporte.medir(bloque, despues=True)
+        filas += len(bloque)
+    for linea in reporte.lineas():
+        print(linea)
+    print(f"{filas} filas, plan aplicado en {segundos:.2f} s")
+    return reporte
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Uso: python memoria.py <exportacion_cruda.csv>")
+        sys.exit(2)
+    comparar(sys.argv[1])
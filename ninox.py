@@ -0,0 +1,377 @@
+"""
+Cliente para subir registros a la API de Ninox.
+
+Los registros se dividen en bloques que se envían en paralelo (con un límite de
+concurrencia) sobre una sola requests.Session con pool de conexiones. Si un
+bloque falla por error de red, timeout, 429 o 5xx se reintenta sólo ese bloque
+con espera exponencial.
+
+Con COMPRESION_NINOX=gzip el cuerpo de cada bloque se codifica registro por
+registro y se comprime con gzip al vuelo (CuerpoJSON): requests lo envía por
+partes (chunked) y el documento JSON completo nunca existe en memoria. Por
+defecto se envía el JSON sin comprimir, como antes, porque no está confirmado
+que la API acepte Content-Encoding: gzip. Si orjson está instalado se usa
+para codificar. Si el servidor rechaza el cuerpo comprimido o por partes
+(411/415, o 400 antes de que haya aceptado algún bloque comprimido) se vuelve
+al cuerpo JSON sin comprimir para el resto de la carga.
+
+Comparación de bytes enviados y tiempo de codificación contra el envío anterior:
+    python ninox.py <archivo_procesado>
+"""
+import json
+import os
+import random
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import captura
+import telemetria
+
+# Valores por defecto (configurables por entorno)
+TAMANO_BLOQUE_NINOX = int(os.environ.get("TAMANO_BLOQUE_NINOX", "1000"))
+CONCURRENCIA_NINOX = int(os.environ.get("CONCURRENCIA_NINOX", "4"))
+REINTENTOS_NINOX = int(os.environ.get("REINTENTOS_NINOX", "3"))
+# Compresión del cuerpo: 'ninguna' (JSON completo sin comprimir, como antes) o 'gzip'
+COMPRESION_NINOX = os.environ.get("COMPRESION_NINOX", "ninguna")
+NIVEL_GZIP_NINOX = int(os.environ.get("NIVEL_GZIP_NINOX", "1"))
+# Codificador JSON: 'auto' (orjson si está instalado), 'orjson' o 'json'
+JSON_NINOX = os.environ.get("JSON_NINOX", "auto")
+
+# Bytes de JSON que se juntan antes de comprimir y entregar una parte del cuerpo
+TAMANO_FRAGMENTO = 64 * 1024
+
+# Códigos de estado que justifican reintentar el bloque
+ESTADOS_REINTENTABLES = {408, 429, 500, 502, 503, 504}
+# Códigos con los que el servidor rechaza el cuerpo por partes (411) o comprimido (415)
+ESTADOS_SIN_COMPRESION = {411, 415}
+# Mientras ningún bloque comprimido haya sido aceptado, un 400 también se
+# toma como rechazo de la compresión (hay servidores que no la distinguen)
+ESTADOS_SIN_COMPRESION_SIN_VERIFICAR = ESTADOS_SIN_COMPRESION | {400}
+
+def codificador_json(nombre=JSON_NINOX):
+    """
+    Devuelve una función registro -> bytes UTF-8 (sin escapar caracteres no ASCII).
+    """
+    if nombre in ("auto", "orjson"):
+        try:
+            import orjson
+            return orjson.dumps
+        except ImportError:
+            if nombre == "orjson":
+                raise
+    codificar = json.JSONEncoder(ensure_ascii=False).encode
+    return lambda registro: codificar(registro).encode("utf-8")
+
+class CuerpoJSON:
+    """
+    Cuerpo de la solicitud como iterable de partes: un array JSON que se
+    codifica registro por registro y, con gzip, se comprime al vuelo. Se puede
+    recorrer varias veces (una por intento). Al recorrerlo deja en
+    bytes_json, bytes_enviados y segundos el tamaño sin comprimir, el tamaño
+    enviado y el tiempo de codificación y compresión.
+    """
+
+    def __init__(self, registros, codificar=None, compresion=COMPRESION_NINOX,
+                 nivel=NIVEL_GZIP_NINOX):
+        if compresion not in ("gzip", "ninguna"):
+            raise ValueError(f"Compresión no válida: {compresion}")
+        self.registros = registros
+        self.codificar = codificar or codificador_json()
+        self.compresion = compresion
+        self.nivel = nivel
+        self.bytes_json = 0
+        self.bytes_enviados = 0
+        self.segundos = 0.0
+
+    def _parte(self, partes, compresor, final=False):
+        datos = b"".join(partes)
+        self.bytes_json += len(datos)
+        if compresor is not None:
+            datos = compresor.compress(datos) + (compresor.flush() if final else b"")
+        self.bytes_enviados += len(datos)
+        return datos
+
+    def __iter__(self):
+        self.bytes_json = self.bytes_enviados = 0
+        self.segundos = 0.0
+        # wbits=31: formato gzip (encabezado y CRC), el que indica Content-Encoding: gzip
+        compresor = zlib.compressobj(self.nivel, zlib.DEFLATED, 31) if self.compresion == "gzip" else None
+        codificar = self.codificar
+        partes, tamano, separador = [b"["], 1, b""
+        inicio = time.perf_counter()
+        for registro in self.registros:
+            parte = codificar(registro)
+            partes.append(separador)
+            partes.append(parte)
+            separador = b","
+            tamano += len(parte) + 1
+            if tamano >= TAMANO_FRAGMENTO:
+                datos = self._parte(partes, compresor)
+                partes, tamano = [], 0
+                self.segundos += time.perf_counter() - inicio
+                if datos:
+                    yield datos
+                inicio = time.perf_counter()
+        partes.append(b"]")
+        datos = self._parte(partes, compresor, final=True)
+        self.segundos += time.perf_counter() - inicio
+        yield datos
+
+    @property
+    def encabezados(self):
+        return {"Content-Encoding": "gzip"} if self.compresion == "gzip" else {}
+
+@dataclass
+class ResultadoBloque:
+    indice: int
+    registros: int
+    bytes_enviados: int
+    intentos: int
+    segundos: float
+    codigo_estado: int = None
+    error: str = None
+    # Tamaño del JSON antes de comprimir y tiempo de codificación del último intento
+    bytes_json: int = 0
+    segundos_codificacion: float = 0.0
+    # Ids de los registros creados o actualizados, en el orden enviado (si la API los devuelve)
+    ids: list = None
+
+    @property
+    def ok(self):
+        return self.codigo_estado in (200, 201)
+
+def _ids_de_respuesta(response, cantidad):
+    """
+    Devuelve los ids de la respuesta de Ninox (una lista de registros) o None.
+    """
+    try:
+        datos = response.json()
+    except ValueError:
+        return None
+    if not isinstance(datos, list) or len(datos) != cantidad:
+        return None
+    return [d.get("id") if isinstance(d, dict) else None for d in datos]
+
+class SubidorNinox:
+    """
+    Envía registros a Ninox en bloques concurrentes con reintentos por bloque.
+    """
+
+    def __init__(self, url, headers, tamano_bloque=TAMANO_BLOQUE_NINOX,
+                 concurrencia=CONCURRENCIA_NINOX, reintentos=REINTENTOS_NINOX,
+                 espera_base=1.0, timeout=120, compresion=COMPRESION_NINOX,
+                 codificador=JSON_NINOX):
+        self.url = url
+        self.headers = headers
+        self.compresion = compresion
+        # True cuando el servidor ya aceptó un bloque comprimido
+        self.compresion_verificada = False
+        self.codificar = codificador_json(codificador)
+        self.tamano_bloque = max(1, tamano_bloque)
+        self.concurrencia = max(1, concurrencia)
+        self.reintentos = reintentos
+        self.espera_base = espera_base
+        self.timeout = timeout
+        self.resultados = []
+        self.segundos_totales = 0.0
+        self._lock = threading.Lock()
+        self._indice = 0
+
+        self.sesion = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrencia)
+        self.sesion.mount("http://", adaptador)
+        self.sesion.mount("https://", adaptador)
+
+    def cerrar(self):
+        self.sesion.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def serializar(self, registros):
+        """
+        Cuerpo JSON completo sin comprimir (el envío anterior al cuerpo por partes).
+        """
+        return json.dumps(registros, ensure_ascii=False).encode("utf-8")
+
+    def cuerpo(self, registros):
+        return CuerpoJSON(registros, self.codificar, self.compresion)
+
+    def enviar_bloque(self, indice, registros):
+        """
+        Envía un bloque y lo reintenta con espera exponencial si falla.
+        Devuelve un ResultadoBloque con la latencia total del bloque.
+        """
+        inicio = time.perf_counter()
+        resultado = ResultadoBloque(indice, len(registros), 0, 0, 0.0)
+        intento = 0
+        while intento <= self.reintentos:
+            resultado.intentos += 1
+            cuerpo = self.cuerpo(registros)
+            # Con compresion 'ninguna' se manda el JSON completo con Content-Length
+            datos = cuerpo if cuerpo.compresion == "gzip" else b"".join(cuerpo)
+            try:
+                response = self.sesion.post(self.url, headers={**self.headers, **cuerpo.encabezados},
+                                            data=datos, timeout=self.timeout)
+                resultado.codigo_estado = response.status_code
+                resultado.error = None if resultado.ok else response.text[:200]
+                if resultado.ok:
+                    resultado.ids = _ids_de_respuesta(response, len(registros))
+                if cuerpo.compresion == "gzip" and self._rechaza_compresion(response.status_code):
+                    # Se repite sin comprimir (sin contar como reintento)
+                    continue
+                if resultado.ok or response.status_code not in ESTADOS_REINTENTABLES:
+                    break
+            except requests.RequestException as e:
+                resultado.codigo_estado = None
+                resultado.error = str(e)
+            finally:
+                resultado.bytes_enviados = cuerpo.bytes_enviados
+                resultado.bytes_json = cuerpo.bytes_json
+                resultado.segundos_codificacion = cuerpo.segundos
+            if intento < self.reintentos:
+                time.sleep(self.espera_base * (2 ** intento) * (1 + random.random()))
+            intento += 1
+        resultado.segundos = time.perf_counter() - inicio
+        telemetria.registrar("ninox.bloque", resultado.segundos, bloque=indice,
+                             registros=resultado.registros, bytes=resultado.bytes_enviados,
+                             bytes_json=resultado.bytes_json,
+                             segundos_codificacion=round(resultado.segundos_codificacion, 4),
+                             estado_http=resultado.codigo_estado, intentos=resultado.intentos,
+                             ok=resultado.ok)
+        return resultado
+
+    def _rechaza_compresion(self, codigo_estado):
+        """
+        Registra la respuesta a un bloque comprimido. Si indica que el servidor
+        no acepta gzip, desactiva la compresión para el resto de los bloques
+        (de todos los hilos) y devuelve True.
+        """
+        with self._lock:
+            if codigo_estado in (200, 201):
+                self.compresion_verificada = True
+                return False
+            rechazos = (ESTADOS_SIN_COMPRESION if self.compresion_verificada
+                        else ESTADOS_SIN_COMPRESION_SIN_VERIFICAR)
+            if codigo_estado not in rechazos:
+                return False
+            if self.compresion == "gzip":
+                print(f"API Ninox -> estado {codigo_estado} con gzip; se envía sin comprimir")
+                self.compresion = "ninguna"
+            return True
+
+    def enviar(self, registros):
+        """
+        Divide los registros en bloques y los envía con a lo más 'concurrencia'
+        solicitudes simultáneas. Devuelve la lista de ResultadoBloque en orden.
+        """
+        bloques = []
+        for i in range(0, len(registros), self.tamano_bloque):
+            with self._lock:
+                self._indice += 1
+                bloques.append((self._indice, registros[i:i + self.tamano_bloque]))
+
+        inicio = time.perf_counter()
+        if len(bloques) == 1 or self.concurrencia == 1:
+            resultados = [self.enviar_bloque(indice, bloque) for indice, bloque in bloques]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.concurrencia, len(bloques))) as ejecutor:
+                resultados = list(ejecutor.map(captura.propagar(lambda b: self.enviar_bloque(*b)), bloques))
+
+        with self._lock:
+            self.segundos_totales += time.perf_counter() - inicio
+            self.resultados.extend(resultados)
+        for r in resultados:
+            estado = r.codigo_estado if r.codigo_estado is not None else "sin respuesta"
+            print(f"API Ninox -> Bloque {r.indice}: {r.registros} registros, estado {estado}, "
+                  f"{r.segundos:.2f} s, {r.intentos} intento(s)")
+            if r.error:
+                print(f"API Ninox -> Bloque {r.indice} error: {r.error}")
+        return resultados
+
+    def resumen(self):
+        """
+        Devuelve líneas con el total enviado, el rendimiento y la latencia por bloque.
+        """
+        if not self.resultados:
+            return []
+        registros = sum(r.registros for r in self.resultados if r.ok)
+        fallidos = [r.indice for r in self.resultados if not r.ok]
+        megabytes = sum(r.bytes_enviados for r in self.resultados) / (1024 * 1024)
+        megabytes_json = sum(r.bytes_json for r in self.resultados) / (1024 * 1024)
+        codificacion = sum(r.segundos_codificacion for r in self.resultados)
+        latencias = sorted(r.segundos for r in self.resultados)
+        mediana = latencias[len(latencias) // 2]
+        por_segundo = registros / self.segundos_totales if self.segundos_totales > 0 else 0.0
+        lineas = [
+            f"{len(self.resultados)} bloques, {registros} registros aceptados, {megabytes:.2f} MB "
+            f"en {self.segundos_totales:.2f} s ({por_segundo:,.0f} registros/s)",
+            f"latencia por bloque: mediana {mediana:.2f} s, máxima {latencias[-1]:.2f} s",
+            f"cuerpo: {megabytes:.2f} MB enviados de {megabytes_json:.2f} MB de JSON, "
+            f"codificación {codificacion:.2f} s",
+        ]
+        if fallidos:
+            lineas.append(f"bloques fallidos: {fallidos}")
+        return lineas
+
+def comparar(ruta_procesado, tamano_bloque=TAMANO_BLOQUE_NINOX):
+    """
+    Codifica los registros del archivo procesado en bloques como se envían a
+    Ninox, con el cuerpo anterior (json.dumps del bloque completo) y con el
+    cuerpo por partes, y compara los bytes enviados y el tiempo de codificación.
+    """
+    import script2
+    variantes = [("json.dumps (anterior)", None, None)]
+    for nombre in ("json", "orjson"):
+        try:
+            codificar = codificador_json(nombre)
+        except ImportError:
+            print(f"{nombre} no está instalado; se omite")
+            continue
+        variantes.append((f"{nombre} por partes", codificar, "ninguna"))
+        variantes.append((f"{nombre} + gzip", codificar, "gzip"))
+
+    totales = {nombre: [0, 0.0, 0] for nombre, _, _ in variantes}
+    registros_totales = 0
+    for lote in script2.leer_por_lotes(ruta_procesado):
+        registros_totales += len(lote)
+        for i in range(0, len(lote), tamano_bloque):
+            bloque = lote[i:i + tamano_bloque]
+            for nombre, codificar, compresion in variantes:
+                total = totales[nombre]
+                if codificar is None:
+                    inicio = time.perf_counter()
+                    cuerpo = json.dumps(bloque, ensure_ascii=False).encode("utf-8")
+                    total[1] += time.perf_counter() - inicio
+                    total[0] += len(cuerpo)
+                    total[2] = max(total[2], len(cuerpo))
+                else:
+                    cuerpo = CuerpoJSON(bloque, codificar, compresion)
+                    total[2] = max(total[2], max(len(parte) for parte in cuerpo))
+                    total[0] += cuerpo.bytes_enviados
+                    total[1] += cuerpo.segundos
+
+    referencia_bytes, referencia_segundos, _ = totales[variantes[0][0]]
+    print(f"{registros_totales} registros en bloques de {tamano_bloque}")
+    print(f"{'cuerpo':<22} {'MB enviados':>12} {'vs anterior':>12} {'codificación s':>15} "
+          f"{'vs anterior':>12} {'parte máx. KB':>14}")
+    for nombre, (enviados, segundos, parte_maxima) in totales.items():
+        print(f"{nombre:<22} {enviados / (1024 * 1024):>12.2f} {enviados / referencia_bytes:>11.1%} "
+              f"{segundos:>15.2f} {segundos / referencia_segundos:>11.1%} {parte_maxima / 1024:>14.1f}")
+    return totales
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Uso: python ninox.py <archivo_procesado>")
+        sys.exit(2)
+    comparar(sys.argv[1])
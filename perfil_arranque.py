@@ -0,0 +1,145 @@
+"""
+Perfil de arranque en frío del bot.
+
+Importa cada módulo en un intérprete nuevo con 'python -X importtime' y
+muestra cuánto tarda el proceso completo, cuánto el import del módulo, sus
+dependencias directas más pesadas y el tiempo propio agrupado por paquete.
+Con --navegador mide además cuánto tarda en arrancar Chromium.
+
+Sirve para seguir el tiempo hasta la primera solicitud (importar
+function_app) y detectar imports pesados que se cuelan al nivel de módulo.
+
+Uso:
+    python perfil_arranque.py                       # function_app, pipeline, script1, script2
+    python perfil_arranque.py script1 --top 20
+    python perfil_arranque.py --json perfil.json    # guarda los resultados
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+MODULOS = ("function_app", "pipeline", "script1", "script2")
+
+def _ejecutar(codigo):
+    """
+    Corre 'codigo' en un intérprete nuevo con -X importtime en el directorio del
+    bot. Devuelve (segundos_de_reloj, codigo_de_salida, stderr).
+    """
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    inicio = time.perf_counter()
+    proceso = subprocess.run([sys.executable, "-X", "importtime", "-c", codigo],
+                             capture_output=True, text=True, cwd=directorio)
+    return time.perf_counter() - inicio, proceso.returncode, proceso.stderr
+
+def leer_importtime(texto):
+    """
+    Convierte la salida de -X importtime en una lista de
+    (modulo, profundidad, propio_us, acumulado_us) en el orden impreso
+    (cada módulo aparece después de sus dependencias).
+    """
+    lineas = []
+    for linea in texto.splitlines():
+        if not linea.startswith("import time:") or "self [us]" in linea:
+            continue
+        propio, acumulado, nombre = linea[len("import time:"):].split("|", 2)
+        profundidad = (len(nombre) - len(nombre.lstrip())) // 2
+        lineas.append((nombre.strip(), profundidad, int(propio), int(acumulado)))
+    return lineas
+
+def perfil_modulo(modulo, top=10):
+    """
+    Mide el import de 'modulo' y devuelve un diccionario con los tiempos en segundos.
+    """
+    segundos, codigo, stderr = _ejecutar(f"import {modulo}")
+    lineas = leer_importtime(stderr)
+    perfil = {"modulo": modulo, "proceso_s": round(segundos, 3)}
+    if codigo != 0:
+        ultima = [l for l in stderr.splitlines() if l and not l.startswith("import time:")]
+        perfil["error"] = ultima[-1] if ultima else f"código de salida {codigo}"
+
+    # Las líneas del módulo son las que van desde el anterior módulo de nivel 0 hasta él
+    fin = next((i for i in range(len(lineas) - 1, -1, -1)
+                if lineas[i][0] == modulo and lineas[i][1] == 0), None)
+    if fin is None:
+        return perfil
+    inicio = fin
+    while inicio > 0 and lineas[inicio - 1][1] > 0:
+        inicio -= 1
+    propias = lineas[inicio:fin + 1]
+
+    perfil["import_s"] = round(lineas[fin][3] / 1e6, 3)
+    directas = sorted((l for l in propias if l[1] == 1), key=lambda l: l[3], reverse=True)
+    perfil["dependencias"] = [{"modulo": l[0], "s": round(l[3] / 1e6, 3)} for l in directas[:top]]
+    por_paquete = defaultdict(int)
+    for nombre, _, propio, _ in propias:
+        por_paquete[nombre.split(".")[0]] += propio
+    paquetes = sorted(por_paquete.items(), key=lambda p: p[1], reverse=True)
+    perfil["paquetes"] = [{"paquete": p, "s": round(us / 1e6, 3)} for p, us in paquetes[:top]]
+    return perfil
+
+def perfil_navegador():
+    """
+    Mide en un proceso nuevo el import de selenium y el arranque de Chromium.
+    """
+    codigo = ("import time, script1\n"
+              "inicio = time.perf_counter()\n"
+              "driver = script1.crear_driver()\n"
+              "print(time.perf_counter() - inicio)\n"
+              "driver.quit()\n")
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    proceso = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True,
+                             cwd=directorio)
+    if proceso.returncode != 0:
+        ultima = [l for l in proceso.stderr.splitlines() if l]
+        return {"error": ultima[-1] if ultima else f"código de salida {proceso.returncode}"}
+    return {"navegador_s": round(float(proceso.stdout.strip().splitlines()[-1]), 3)}
+
+def imprimir(perfil):
+    print(f"== {perfil['modulo']} ==")
+    linea = f"proceso {perfil['proceso_s']:.3f} s"
+    if "import_s" in perfil:
+        linea += f", import {perfil['import_s']:.3f} s"
+    print(linea)
+    if "error" in perfil:
+        print(f"error: {perfil['error']}")
+    if perfil.get("dependencias"):
+        print("  dependencias directas:")
+        for d in perfil["dependencias"]:
+            print(f"    {d['s']:>8.3f} s  {d['modulo']}")
+    if perfil.get("paquetes"):
+        print("  tiempo propio por paquete:")
+        for p in perfil["paquetes"]:
+            print(f"    {p['s']:>8.3f} s  {p['paquete']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide el arranque en frío de los módulos del bot.")
+    parser.add_argument("modulos", nargs="*", default=list(MODULOS),
+                        help="Módulos a importar (por defecto %(default)s).")
+    parser.add_argument("--top", type=int, default=10,
+                        help="Dependencias y paquetes a mostrar (por defecto %(default)s).")
+    parser.add_argument("--navegador", action="store_true",
+                        help="Mide también el arranque de Chromium.")
+    parser.add_argument("--json", help="Guarda los resultados en este archivo JSON.")
+    args = parser.parse_args()
+
+    interprete, _, _ = _ejecutar("pass")
+    print(f"Intérprete vacío: {interprete:.3f} s")
+    resultados = {"interprete_s": round(interprete, 3), "modulos": []}
+    for modulo in args.modulos:
+        perfil = perfil_modulo(modulo, args.top)
+        resultados["modulos"].append(perfil)
+        imprimir(perfil)
+    if args.navegador:
+        resultados["navegador"] = perfil_navegador()
+        print("Navegador:", resultados["navegador"])
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f"Resultados guardados en {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+Pipeline del bot en un solo proceso: extracción (chedlink), transformación
+(procesar la exportación) y carga (Ninox y Snowflake).
+
+Cada etapa es una función que devuelve un ResultadoEtapa con la ruta del
+archivo generado, el número de filas y la duración, de modo que las etapas se
+encadenan sin lanzar intérpretes nuevos ni leer la salida impresa.
+
+Con reanudar=True (REANUDAR, activo por defecto) cada reporte lleva un
+manifiesto por fecha (ver manifiesto.py): si la ejecución anterior del día
+falló, se reutilizan las etapas terminadas cuyo archivo sigue intacto y la
+carga omite los lotes y destinos ya confirmados.
+"""
+import importlib
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+import telemetria
+from manifiesto import REANUDAR, Manifiesto
+
+# Etapas de ejecutar() en orden
+ETAPAS = ("extraccion", "transformacion", "carga")
+
+# Bibliotecas de la transformación y la carga que se importan en segundo plano
+# mientras la extracción espera al portal (PRECARGA_BIBLIOTECAS=0 lo desactiva)
+PRECARGA_BIBLIOTECAS = os.environ.get("PRECARGA_BIBLIOTECAS", "1") == "1"
+BIBLIOTECAS_PESADAS = ("numpy", "pandas", "pyarrow", "pyarrow.compute", "pyarrow.csv", "pyarrow.parquet")
+
+@dataclass
+class ResultadoEtapa:
+    etapa: str
+    ok: bool = False
+    segundos: float = 0.0
+    ruta: str = None
+    filas: int = None
+    error: str = None
+    detalle: dict = field(default_factory=dict)
+
+    def __str__(self):
+        texto = f"{self.etapa}: {'ok' if self.ok else 'error'} en {self.segundos:.2f} s"
+        if self.filas is not None:
+            texto += f", {self.filas} filas"
+        if self.ruta:
+            texto += f", {self.ruta}"
+        if self.error:
+            texto += f" ({self.error})"
+        return texto
+
+@dataclass
+class ResultadoPipeline:
+    etapas: list = field(default_factory=list)
+
+    @property
+    def ok(self):
+        return bool(self.etapas) and all(e.ok for e in self.etapas)
+
+    @property
+    def segundos(self):
+        return sum(e.segundos for e in self.etapas)
+
+    def resumen(self):
+        lineas = [str(e) for e in self.etapas]
+        lineas.append(f"Total: {'ok' if self.ok else 'error'} en {self.segundos:.2f} s")
+        return "\n".join(lineas)
+
+def _ejecutar_etapa(nombre, funcion):
+    """
+    Ejecuta funcion(resultado) midiendo el tiempo y registrando cualquier excepción
+    en el resultado en lugar de propagarla.
+    """
+    resultado = ResultadoEtapa(nombre)
+    inicio = time.perf_counter()
+    with telemetria.span(f"etapa.{nombre}") as s:
+        try:
+            funcion(resultado)
+        except Exception as e:
+            resultado.ok = False
+            resultado.error = str(e)
+        resultado.segundos = time.perf_counter() - inicio
+        existe = resultado.ruta is not None and os.path.exists(resultado.ruta)
+        s.agregar(ok=resultado.ok, filas=resultado.filas, error=resultado.error,
+                  bytes=os.path.getsize(resultado.ruta) if existe else None)
+    print(resultado)
+    return resultado
+
+def precargar_bibliotecas(modulos=BIBLIOTECAS_PESADAS):
+    """
+    Importa los módulos en un hilo aparte y devuelve el hilo. Si la etapa que
+    los usa llega antes, el import de esa etapa espera al que ya está en curso.
+    """
+    def importar():
+        with telemetria.span("arranque.precarga", modulos=len(modulos)):
+            for modulo in modulos:
+                try:
+                    importlib.import_module(modulo)
+                except ImportError:
+                    pass
+    hilo = threading.Thread(target=importar, name="precarga", daemon=True)
+    hilo.start()
+    return hilo
+
+def extraer(download_dir=None):
+    """
+    Descarga la exportación del reporte desde chedlink.
+    """
+    def etapa(resultado):
+        import script1
+        ruta = script1.descargar_reporte(download_dir or script1.DOWNLOAD_DIR)
+        if not ruta:
+            raise RuntimeError("no se obtuvo el CSV del reporte")
+        resultado.ruta = ruta
+        resultado.ok = True
+    return _ejecutar_etapa("extraccion", etapa)
+
+def transformar(ruta_csv):
+    """
+    Procesa la exportación descargada y genera el CSV para la carga.
+    """
+    def etapa(resultado):
+        import script1
+        resultado.ruta, resultado.filas = script1.transformar_archivo(ruta_csv)
+        resultado.ok = True
+    return _ejecutar_etapa("transformacion", etapa)
+
+def cargar(ruta_procesado, manifiesto=None, **opciones):
+    """
+    Carga el CSV procesado en Ninox y Snowflake. Las opciones se pasan a
+    script2.cargar_por_lotes (tamano_lote, destino, subidor, timeouts).
+    Con 'manifiesto' se omite lo que ya confirmó una ejecución anterior.
+    """
+    def etapa(resultado):
+        import script2
+        resultado.ruta = ruta_procesado
+        if manifiesto is not None:
+            sha256 = manifiesto.hash_etapa("transformacion")
+            manifiesto.iniciar_carga(sha256, opciones.get("tamano_lote", script2.TAMANO_LOTE))
+            opciones["punto_control"] = manifiesto
+        resultado.filas, destinos = script2.cargar_por_lotes(ruta_procesado, **opciones)
+        resultado.detalle["destinos"] = {d.nombre: d.estado for d in destinos}
+        resultado.ok = all(d.estado == "ok" for d in destinos)
+        if not resultado.ok:
+            resultado.error = "; ".join(f"{d.nombre}: {d.error or d.estado}"
+                                        for d in destinos if d.estado != "ok")
+    return _ejecutar_etapa("carga", etapa)
+
+def _avisar(avance, etapa, resultado=None):
+    if avance is not None:
+        avance(etapa, resultado)
+
+def _etapa_con_avance(avance, nombre, funcion, *args, **kwargs):
+    """
+    Ejecuta una etapa avisando a 'avance' cuando empieza y cuando termina.
+    """
+    _avisar(avance, nombre)
+    resultado = funcion(*args, **kwargs)
+    _avisar(avance, nombre, resultado)
+    return resultado
+
+def _etapa_reanudada(manifiesto, nombre, entrada=None):
+    """
+    Devuelve un ResultadoEtapa con lo que el manifiesto guardó de la etapa si se
+    puede reutilizar (ver Manifiesto.etapa_terminada), o None.
+    """
+    if manifiesto is None:
+        return None
+    registro = manifiesto.etapa_terminada(nombre, entrada)
+    if registro is None:
+        return None
+    resultado = ResultadoEtapa(nombre, ok=True, ruta=registro["ruta"], filas=registro.get("filas"),
+                               detalle={"reanudada": True})
+    telemetria.registrar(f"etapa.{nombre}", 0.0, ok=True, filas=resultado.filas, reanudada=True)
+    print(f"{nombre}: se reutiliza {resultado.ruta} del manifiesto")
+    return resultado
+
+def _etapa_reanudable(manifiesto, avance, nombre, funcion, *args, entrada=None, **kwargs):
+    """
+    Como _etapa_con_avance, pero si el manifiesto tiene la etapa terminada a
+    partir de la misma entrada no la ejecuta; si la ejecuta y sale bien, registra
+    su archivo en el manifiesto.
+    """
+    resultado = _etapa_reanudada(manifiesto, nombre.split(":")[0], entrada)
+    if resultado is not None:
+        _avisar(avance, nombre)
+        _avisar(avance, nombre, resultado)
+        return resultado
+    resultado = _etapa_con_avance(avance, nombre, funcion, *args, **kwargs)
+    if manifiesto is not None and resultado.ok:
+        manifiesto.registrar_etapa(resultado.etapa, resultado.ruta, resultado.filas, entrada)
+    return resultado
+
+def _transformar_y_cargar(pipeline, manifiesto, avance, ruta_csv, sufijo="", **opciones_carga):
+    """
+    Transformación y carga de un CSV ya extraído, reanudables con el manifiesto.
+    """
+    entrada = manifiesto.hash_etapa("extraccion") if manifiesto is not None else None
+    transformacion = _etapa_reanudable(manifiesto, avance, f"transformacion{sufijo}", transformar,
+                                       ruta_csv, entrada=entrada)
+    pipeline.etapas.append(transformacion)
+    if not transformacion.ok:
+        return pipeline
+    carga = _etapa_con_avance(avance, f"carga{sufijo}", cargar, transformacion.ruta,
+                              manifiesto=manifiesto, **opciones_carga)
+    pipeline.etapas.append(carga)
+    if manifiesto is not None and carga.ok:
+        manifiesto.completar()
+    return pipeline
+
+def ejecutar(download_dir=None, avance=None, reanudar=REANUDAR, **opciones_carga):
+    """
+    Ejecuta extracción, transformación y carga en este proceso.
+    Se detiene en la primera etapa que falle. Si se indica, avance(etapa) se
+    llama al empezar cada etapa y avance(etapa, resultado) al terminarla.
+    Con reanudar, continúa la ejecución pendiente del día desde la primera
+    etapa o lote sin terminar. El manifiesto es el del nombre del reporte,
+    como en ejecutar_reportes().
+    """
+    telemetria.nueva_ejecucion()
+    if PRECARGA_BIBLIOTECAS:
+        precargar_bibliotecas()
+    manifiesto = None
+    if reanudar:
+        import script1
+        manifiesto = Manifiesto.abrir(script1.NOMBRE_REPORTE)
+    pipeline = ResultadoPipeline()
+    extraccion = _etapa_reanudable(manifiesto, avance, "extraccion", extraer, download_dir)
+    pipeline.etapas.append(extraccion)
+    if not extraccion.ok:
+        return pipeline
+    return _transformar_y_cargar(pipeline, manifiesto, avance, extraccion.ruta, **opciones_carga)
+
+def contar_etapas_reportes(ruta_reportes=None):
+    """
+    Número de etapas que ejecuta ejecutar_reportes() si todo sale bien: la
+    extracción de cada reporte y la transformación y carga de los que se procesan.
+    """
+    import reportes
+    trabajos, _, _ = reportes.cargar_configuracion(ruta_reportes or reportes.RUTA_REPORTES)
+    return sum(3 if t.procesar else 1 for t in trabajos)
+
+def ejecutar_reportes(ruta_reportes=None, download_dir=None, avance=None, reanudar=REANUDAR,
+                      **opciones_carga):
+    """
+    Descarga en paralelo los reportes de la lista configurada (ver reportes.py)
+    y luego transforma y carga cada uno que tenga 'procesar' activado.
+    Devuelve un diccionario {nombre_del_reporte: ResultadoPipeline}.
+    Las etapas se informan a 'avance' como '<etapa>:<reporte>'.
+    Con reanudar, cada reporte continúa su ejecución pendiente del día y sólo
+    se descargan los que no tienen la extracción guardada.
+    """
+    import reportes
+    telemetria.nueva_ejecucion()
+    if PRECARGA_BIBLIOTECAS:
+        precargar_bibliotecas()
+    trabajos, concurrencia, intervalo = reportes.cargar_configuracion(
+        ruta_reportes or reportes.RUTA_REPORTES)
+    manifiestos = {t.nombre: Manifiesto.abrir(t.nombre) if reanudar else None for t in trabajos}
+    extracciones = {t.nombre: _etapa_reanudada(manifiestos[t.nombre], "extraccion") for t in trabajos}
+    pendientes = [t for t in trabajos if extracciones[t.nombre] is None]
+    _avisar(avance, "extraccion")
+    if pendientes:
+        extraidos = reportes.extraer_reportes(pendientes, concurrencia, intervalo, download_dir)
+        for trabajo, extraido in zip(pendientes, extraidos):
+            extracciones[trabajo.nombre] = ResultadoEtapa(
+                "extraccion", ok=extraido.ok, segundos=extraido.segundos,
+                ruta=extraido.ruta, error=extraido.error, detalle={"clave": trabajo.clave})
+            if extraido.ok and manifiestos[trabajo.nombre] is not None:
+                manifiestos[trabajo.nombre].registrar_etapa("extraccion", extraido.ruta)
+
+    ejecuciones = {}
+    for trabajo in trabajos:
+        extraccion = extracciones[trabajo.nombre]
+        manifiesto = manifiestos[trabajo.nombre]
+        _avisar(avance, f"extraccion:{trabajo.nombre}", extraccion)
+        pipeline = ResultadoPipeline([extraccion])
+        if extraccion.ok and trabajo.procesar:
+            _transformar_y_cargar(pipeline, manifiesto, avance, extraccion.ruta,
+                                  sufijo=f":{trabajo.nombre}", **opciones_carga)
+        elif extraccion.ok and manifiesto is not None:
+            manifiesto.completar()
+        ejecuciones[trabajo.nombre] = pipeline
+    return ejecuciones
+
+def resumen_reportes(ejecuciones):
+    """
+    Devuelve el resumen de ejecutar_reportes() con los tiempos de cada reporte.
+    """
+    bloques = []
+    for nombre, pipeline in ejecuciones.items():
+        bloques.append(f"== {nombre} ==\n{pipeline.resumen()}")
+    return "\n".join(bloques)
@@ -0,0 +1,125 @@
+"""
+Extracción de varios reportes de chedlink en paralelo.
+
+La lista de reportes se lee de un archivo JSON (reportes.json por defecto o la
+ruta en RUTA_REPORTES) con la clave y los parámetros de cada reporte. Los
+reportes se descargan con un grupo acotado de navegadores: a lo más
+'concurrencia' a la vez y con 'intervalo_inicio' segundos entre el arranque de
+uno y otro para no saturar el portal. Cada reporte usa su propio directorio de
+descargas, nombrado por el nombre del reporte (único en la lista), para que los
+archivos no se mezclen aunque dos reportes compartan la clave.
+"""
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import captura
+
+RUTA_REPORTES = os.environ.get(
+    "RUTA_REPORTES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "reportes.json"))
+
+@dataclass
+class TrabajoReporte:
+    nombre: str
+    clave: str
+    parametros: dict = field(default_factory=dict)
+    procesar: bool = True
+
+@dataclass
+class ResultadoReporte:
+    nombre: str
+    clave: str
+    ruta: str = None
+    segundos: float = 0.0
+    error: str = None
+
+    @property
+    def ok(self):
+        return self.ruta is not None
+
+    def __str__(self):
+        estado = self.ruta if self.ok else f"error ({self.error})"
+        return f"{self.nombre} [{self.clave}]: {self.segundos:.1f} s, {estado}"
+
+def cargar_configuracion(ruta=RUTA_REPORTES):
+    """
+    Lee el archivo de reportes y devuelve (trabajos, concurrencia, intervalo_inicio).
+    """
+    with open(ruta, encoding="utf-8") as f:
+        datos = json.load(f)
+    trabajos = [
+        TrabajoReporte(
+            nombre=r.get("nombre") or str(r["clave"]),
+            clave=str(r["clave"]),
+            parametros={k: str(v) for k, v in r.get("parametros", {}).items()},
+            procesar=r.get("procesar", True),
+        )
+        for r in datos["reportes"]
+    ]
+    vistos = {}
+    for trabajo in trabajos:
+        directorio = nombre_directorio(trabajo.nombre)
+        if directorio in vistos:
+            raise ValueError(f"Los reportes '{vistos[directorio]}' y '{trabajo.nombre}' "
+                             "usarían el mismo directorio de descargas; sus nombres deben ser distintos")
+        vistos[directorio] = trabajo.nombre
+    return trabajos, int(datos.get("concurrencia", 1)), float(datos.get("intervalo_inicio", 0))
+
+def nombre_directorio(nombre):
+    """
+    Nombre del directorio de descargas de un reporte: su nombre sin caracteres
+    que no sean válidos en una ruta.
+    """
+    return re.sub(r"[^\w.-]", "_", nombre)
+
+class _Escalonador:
+    """
+    Garantiza un intervalo mínimo entre el arranque de dos reportes.
+    """
+
+    def __init__(self, intervalo):
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._siguiente = 0.0
+
+    def esperar_turno(self):
+        with self._lock:
+            ahora = time.monotonic()
+            turno = max(ahora, self._siguiente)
+            self._siguiente = turno + self.intervalo
+        if turno > ahora:
+            time.sleep(turno - ahora)
+
+def extraer_reportes(trabajos, concurrencia=1, intervalo_inicio=0.0, download_dir=None, modo=None):
+    """
+    Descarga los reportes con a lo más 'concurrencia' navegadores simultáneos.
+    Devuelve un ResultadoReporte por trabajo, en el mismo orden.
+    """
+    import script1
+    download_dir = download_dir or script1.DOWNLOAD_DIR
+    escalonador = _Escalonador(intervalo_inicio)
+
+    def extraer(trabajo):
+        resultado = ResultadoReporte(trabajo.nombre, trabajo.clave)
+        escalonador.esperar_turno()
+        inicio = time.perf_counter()
+        try:
+            # Por nombre y no por clave: dos reportes con la misma clave y distintos
+            # parámetros descargarían en el mismo directorio
+            directorio = os.path.join(download_dir, nombre_directorio(trabajo.nombre))
+            resultado.ruta = script1.descargar_reporte(
+                directorio, modo=modo, clave=trabajo.clave, parametros=trabajo.parametros)
+            if resultado.ruta is None:
+                resultado.error = "no se obtuvo el CSV del reporte"
+        except Exception as e:
+            resultado.error = str(e)
+        resultado.segundos = time.perf_counter() - inicio
+        print(f"Reporte {resultado}")
+        return resultado
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrencia), thread_name_prefix="reporte") as ejecutor:
+        return list(ejecutor.map(captura.propagar(extraer), trabajos))
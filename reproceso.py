@@ -0,0 +1,243 @@
+"""
+Reproceso masivo de exportaciones archivadas, sin navegador.
+
+Cuando cambian las reglas de la transformación (umbral de Depto, exclusión
+del NP) hay que volver a procesar y cargar meses de exportaciones. Este
+comando toma un directorio o un patrón glob de exportaciones y:
+
+- Transforma los archivos en paralelo en un grupo de procesos (uno por núcleo
+  por defecto), cada uno con script1.transformar_archivo. El hash de cada
+  archivo para el manifiesto también se calcula en esos procesos.
+- Carga los archivos procesados en orden (el de las entradas ordenadas por
+  nombre) y por lotes con script2.cargar_por_lotes, mientras los procesos
+  siguen transformando los siguientes. Un archivo no se carga antes que el
+  anterior, así que el almacén tiene a lo más una transacción abierta y Ninox
+  a lo más --concurrencia-ninox solicitudes a la vez, sin importar cuántos
+  procesos transformen.
+- Lleva un manifiesto por archivo y corrida (ver manifiesto.py): si el
+  reproceso se interrumpe, al repetirlo con la misma corrida se omiten los
+  archivos ya cargados, se reutilizan los ya transformados y la carga sigue
+  desde el primer destino o lote sin confirmar.
+- Muestra el avance de cada archivo y el rendimiento acumulado (filas/s).
+
+Si la carga de un archivo falla el reproceso se detiene, para no cargar los
+siguientes antes que él.
+
+Uso:
+    python reproceso.py /datos/exportaciones --salida /tmp/reproceso
+    python reproceso.py "/datos/2025-0[1-3]*/*.csv" --procesos 4 --destino sqlite:/tmp/prueba.db
+    python reproceso.py /datos/exportaciones --corrida margen35    # reanuda la corrida 'margen35'
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import captura
+import telemetria
+from manifiesto import RUTA_MANIFIESTOS, Manifiesto, etapa_vigente, fecha_de_negocio, hash_archivo
+
+RUTA_REPROCESO = os.environ.get("RUTA_REPROCESO", os.path.join("/tmp", "reproceso"))
+EXTENSIONES_EXPORTACION = (".csv",)
+
+def buscar_exportaciones(entradas):
+    """
+    Devuelve las rutas de las exportaciones de los directorios o patrones glob
+    indicados, sin repetir y ordenadas por nombre.
+    """
+    rutas = set()
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            candidatos = [os.path.join(entrada, nombre) for nombre in os.listdir(entrada)]
+        else:
+            candidatos = glob.glob(entrada)
+        rutas.update(os.path.abspath(c) for c in candidatos
+                     if os.path.isfile(c) and c.lower().endswith(EXTENSIONES_EXPORTACION))
+    return sorted(rutas, key=lambda r: (os.path.basename(r), r))
+
+def _clave_archivo(ruta):
+    """
+    Clave del manifiesto de una exportación: su nombre más el directorio que la
+    contiene, para que dos meses con archivos del mismo nombre no se mezclen.
+    """
+    directorio = os.path.basename(os.path.dirname(ruta))
+    return f"reproceso_{directorio}_{os.path.basename(ruta)}"
+
+def _transformar(ruta, directorio_salida):
+    """
+    Transforma una exportación en un proceso del grupo. La salida impresa se
+    descarta para no mezclarla con el avance. Devuelve (ruta_procesado, filas, segundos).
+    """
+    import script1
+    os.makedirs(directorio_salida, exist_ok=True)
+    inicio = time.perf_counter()
+    with captura.capturar():
+        procesado, filas = script1.transformar_archivo(ruta, directorio_salida=directorio_salida)
+    return procesado, filas, time.perf_counter() - inicio
+
+def _preparar(ruta, directorio_salida, etapas):
+    """
+    Tarea de un proceso del grupo: calcula el hash de la exportación y la
+    transforma, salvo que 'etapas' (lo que el manifiesto guardó de una
+    ejecución anterior) tenga su transformación de esa misma exportación con el
+    archivo intacto. Devuelve un diccionario con los hashes, para que el
+    proceso principal registre las etapas sin volver a leer los archivos.
+    """
+    entrada = hash_archivo(ruta)
+    anterior = etapas.get("transformacion")
+    if etapa_vigente(anterior, entrada):
+        return {"entrada": entrada, "procesado": anterior["ruta"], "filas": anterior.get("filas"),
+                "sha256": anterior["sha256"], "segundos": None}
+    procesado, filas, segundos = _transformar(ruta, directorio_salida)
+    return {"entrada": entrada, "procesado": procesado, "filas": filas,
+            "sha256": hash_archivo(procesado), "segundos": segundos}
+
+def _duracion(segundos):
+    minutos, segundos = divmod(int(segundos), 60)
+    horas, minutos = divmod(minutos, 60)
+    return f"{horas}:{minutos:02d}:{segundos:02d}"
+
+class Avance:
+    """
+    Cuenta los archivos y filas terminados e imprime el rendimiento acumulado.
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.terminados = 0
+        self.filas = 0
+        self.bytes = 0
+        self.inicio = time.perf_counter()
+
+    def registrar(self, ruta, filas, detalle):
+        self.terminados += 1
+        self.filas += filas or 0
+        self.bytes += os.path.getsize(ruta)
+        transcurrido = time.perf_counter() - self.inicio
+        filas_s = self.filas / transcurrido if transcurrido else 0.0
+        mb_s = self.bytes / 1e6 / transcurrido if transcurrido else 0.0
+        restante = transcurrido / self.terminados * (self.total - self.terminados)
+        print(f"[{self.terminados}/{self.total}] {os.path.basename(ruta)}: {detalle} | "
+              f"{self.filas} filas en {_duracion(transcurrido)}, {filas_s:,.0f} filas/s, "
+              f"{mb_s:.1f} MB/s, faltan ~{_duracion(restante)}")
+
+def reprocesar(rutas, directorio_salida=RUTA_REPROCESO, procesos=None, corrida=None,
+               cargar=True, directorio_manifiestos=None, **opciones_carga):
+    """
+    Transforma las exportaciones en paralelo y las carga en orden. Las opciones
+    se pasan a script2.cargar_por_lotes (tamano_lote, destino, subidor, ...);
+    'destino' y 'subidor' pueden ser funciones sin argumentos que crean uno
+    nuevo por archivo. Devuelve True si todos los archivos terminaron bien.
+    """
+    import pipeline
+    telemetria.nueva_ejecucion()
+    corrida = corrida or fecha_de_negocio()
+    directorio_manifiestos = directorio_manifiestos or os.path.join(RUTA_MANIFIESTOS, "reproceso")
+    procesos = procesos or os.cpu_count() or 1
+
+    # Manifiesto de cada archivo: los que ya terminaron en esta corrida se omiten
+    manifiestos = {}
+    for ruta in rutas:
+        datos = Manifiesto.leer(_clave_archivo(ruta), corrida, directorio_manifiestos)
+        if not (datos and datos.get("completo")):
+            manifiestos[ruta] = Manifiesto.abrir(_clave_archivo(ruta), corrida, directorio_manifiestos)
+    if len(manifiestos) < len(rutas):
+        print(f"{len(rutas) - len(manifiestos)} archivos ya reprocesados en la corrida '{corrida}', se omiten.")
+    if not manifiestos:
+        print("No hay archivos pendientes.")
+        return True
+    print(f"{len(manifiestos)} archivos pendientes, {procesos} procesos, corrida '{corrida}'")
+    avance = Avance(len(manifiestos))
+
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as ejecutor:
+        # Se envían todos los archivos (hash y transformación en los procesos del
+        # grupo, no en éste) y se recogen en el orden de las entradas
+        pendientes = {}
+        for indice, (ruta, manifiesto) in enumerate(manifiestos.items()):
+            nombre = os.path.splitext(os.path.basename(ruta))[0]
+            salida = os.path.join(directorio_salida, f"{indice:05d}_{nombre}")
+            pendientes[ruta] = ejecutor.submit(_preparar, ruta, salida, manifiesto.datos["etapas"])
+
+        for ruta, manifiesto in manifiestos.items():
+            try:
+                preparado = pendientes[ruta].result()
+            except Exception as e:
+                print(f"Error al transformar {ruta}: {e}")
+                for futuro in pendientes.values():
+                    futuro.cancel()
+                return False
+            entrada = preparado["entrada"]
+            if manifiesto.hash_etapa("extraccion") != entrada:
+                manifiesto.registrar_etapa("extraccion", ruta, sha256=entrada)
+            procesado, filas, segundos = preparado["procesado"], preparado["filas"], preparado["segundos"]
+            if segundos is None:
+                detalle = f"{filas} filas, transformación reutilizada"
+            else:
+                manifiesto.registrar_etapa("transformacion", procesado, filas, entrada,
+                                           sha256=preparado["sha256"])
+                detalle = f"{filas} filas, transformación {segundos:.1f} s"
+                telemetria.registrar("reproceso.transformacion", segundos,
+                                     archivo=os.path.basename(ruta), filas=filas)
+
+            if cargar:
+                opciones = {clave: valor() if clave in ("destino", "subidor") and callable(valor) else valor
+                            for clave, valor in opciones_carga.items()}
+                with captura.capturar() as salida:
+                    carga = pipeline.cargar(procesado, manifiesto=manifiesto, **opciones)
+                if not carga.ok:
+                    print(salida.getvalue(), end="")
+                    print(f"Error al cargar {ruta}: {carga.error}")
+                    for futuro in pendientes.values():
+                        futuro.cancel()
+                    return False
+                detalle += f", carga {carga.segundos:.1f} s"
+                manifiesto.completar()
+            avance.registrar(ruta, filas, detalle)
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Reprocesa y carga exportaciones archivadas en paralelo.")
+    parser.add_argument("entradas", nargs="+",
+                        help="Directorios o patrones glob de exportaciones (.csv).")
+    parser.add_argument("--salida", default=RUTA_REPROCESO,
+                        help="Directorio de los archivos procesados (por defecto %(default)s).")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count(),
+                        help="Procesos que transforman a la vez (por defecto %(default)s).")
+    parser.add_argument("--corrida",
+                        help="Nombre de la corrida para reanudarla (por defecto la fecha de hoy).")
+    parser.add_argument("--solo-transformar", action="store_true",
+                        help="Sólo transforma, sin cargar en los destinos.")
+    parser.add_argument("--lote", type=int,
+                        help="Registros por lote de la carga (por defecto TAMANO_LOTE).")
+    parser.add_argument("--destino", default="snowflake",
+                        help="'snowflake' o 'sqlite:<ruta>' para probar contra una base local.")
+    parser.add_argument("--concurrencia-ninox", type=int,
+                        help="Solicitudes simultáneas a Ninox (por defecto CONCURRENCIA_NINOX).")
+    parser.add_argument("--full", action="store_true",
+                        help="Recarga completa: reenvía todas las filas aunque no hayan cambiado.")
+    args = parser.parse_args()
+
+    rutas = buscar_exportaciones(args.entradas)
+    if not rutas:
+        print("No se encontraron exportaciones en:", ", ".join(args.entradas))
+        sys.exit(2)
+    opciones = {"completo": args.full}
+    if not args.solo_transformar:
+        import script2
+        from destinos import crear_destino
+        opciones["destino"] = lambda: crear_destino(args.destino)
+        if args.concurrencia_ninox:
+            opciones["subidor"] = lambda: script2.crear_subidor_ninox(concurrencia=args.concurrencia_ninox)
+        if args.lote:
+            opciones["tamano_lote"] = args.lote
+    exito = reprocesar(rutas, args.salida, args.procesos, args.corrida,
+                       cargar=not args.solo_transformar, **opciones)
+    if not exito:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
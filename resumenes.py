@@ -0,0 +1,189 @@
+"""
+Resúmenes precalculados del reporte para los tableros.
+
+Los tableros suman DifPesos, VentaNetaenPesos, VentaNetaenUnidades y los
+márgenes por día, tienda, departamento y comprador. En lugar de hacerlo sobre
+la tabla de detalle en cada actualización, la transformación puede calcular
+esas agregaciones y la carga las fusiona (MERGE) en tablas de resumen chicas
+en el mismo almacén y en la misma transacción que el detalle.
+
+Cada resumen agrupa por DiaFecha más las columnas de 'por' y tiene:
+- Filas: número de filas de detalle.
+- Las sumas de COLUMNAS_SUMA.
+- Los márgenes de PONDERADOS como promedio ponderado (p. ej. MargenObtenidoVenta
+  ponderado por VentaNetaenPesos); si la suma de pesos es 0 quedan vacíos.
+
+Los resúmenes se acumulan bloque por bloque con sumas parciales (groupby de
+pandas), así que la memoria depende del número de grupos y no de filas. Se
+escriben junto al archivo procesado como <archivo>.<nombre>.parquet.
+
+Se activan con RESUMENES=1; la lista de resúmenes está en resumenes.json (o
+en la ruta de RUTA_RESUMENES):
+    {"resumenes": [{"nombre": "dia_tienda", "tabla": "TESTING_2025_DIA_TIENDA",
+                    "por": ["NT", "Tienda"]}, ...]}
+"""
+import glob
+import json
+import os
+from dataclasses import dataclass, field
+
+RESUMENES = os.environ.get("RESUMENES", "0") == "1"
+RUTA_RESUMENES = os.environ.get(
+    "RUTA_RESUMENES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "resumenes.json"))
+
+COLUMNA_DIA = "DiaFecha"
+COLUMNAS_SUMA = ["VentaNetaenPesos", "VentaNetaenUnidades", "VentaNetaaCosto", "DifPesos", "InvFinVta"]
+# Columna promediada -> columna con la que se pondera
+PONDERADOS = {
+    "MargenObtenidoVenta": "VentaNetaenPesos",
+    "MargenObtenidoInv": "InvFinVta",
+    "DiferenciaMargen": "VentaNetaenPesos",
+}
+
+@dataclass
+class Resumen:
+    nombre: str
+    tabla: str
+    por: list = field(default_factory=list)
+
+    @property
+    def claves(self):
+        return [COLUMNA_DIA] + [col for col in self.por if col != COLUMNA_DIA]
+
+    @property
+    def columnas(self):
+        return self.claves + ["Filas"] + COLUMNAS_SUMA + list(PONDERADOS)
+
+    @property
+    def tipos(self):
+        """
+        Tipo del esquema de cada columna que no está en esquema.py.
+        """
+        tipos = {"Filas": "entero"}
+        tipos.update({col: "numero" for col in COLUMNAS_SUMA + list(PONDERADOS)})
+        return tipos
+
+def cargar_configuracion(ruta=RUTA_RESUMENES):
+    """
+    Lee la lista de resúmenes del archivo JSON.
+    """
+    with open(ruta, encoding="utf-8") as f:
+        datos = json.load(f)
+    return [Resumen(nombre=r["nombre"], tabla=r["tabla"], por=list(r.get("por", [])))
+            for r in datos["resumenes"]]
+
+def _columnas_numericas(bloque, columnas):
+    """
+    DataFrame con las columnas indicadas como float64 (las que siguen como texto
+    se convierten quitando separadores de miles).
+    """
+    import pandas as pd
+    numericas = {}
+    for col in columnas:
+        serie = bloque[col]
+        if not pd.api.types.is_numeric_dtype(serie):
+            serie = pd.to_numeric(serie.str.replace(",", "", regex=False).str.strip(), errors="coerce")
+        numericas[col] = serie.astype("float64")
+    return pd.DataFrame(numericas, index=bloque.index)
+
+class AcumuladorResumenes:
+    """
+    Acumula las sumas parciales de cada resumen sobre los bloques transformados.
+    """
+
+    def __init__(self, resumenes):
+        self.resumenes = list(resumenes)
+        self._parciales = {r.nombre: [] for r in self.resumenes}
+
+    def agregar(self, bloque):
+        """
+        Agrega un bloque ya transformado (con DiferenciaMargen y DifPesos).
+        """
+        import pandas as pd
+        pesos = sorted(set(PONDERADOS.values()))
+        numeros = _columnas_numericas(bloque, sorted(set(COLUMNAS_SUMA) | set(pesos) | set(PONDERADOS)))
+        medidas = {"Filas": 1}
+        medidas.update({col: numeros[col] for col in COLUMNAS_SUMA})
+        for col, peso in PONDERADOS.items():
+            # Numerador y denominador del promedio ponderado; los pesos sólo
+            # cuentan donde hay valor para que un margen vacío no baje el promedio
+            con_valor = numeros[col].notna() & numeros[peso].notna()
+            medidas[f"_producto_{col}"] = (numeros[col] * numeros[peso]).where(con_valor, 0.0)
+            medidas[f"_peso_{col}"] = numeros[peso].where(con_valor, 0.0)
+        medidas = pd.DataFrame(medidas, index=bloque.index)
+        for resumen in self.resumenes:
+            claves = bloque[resumen.claves]
+            # observed=True: con claves categóricas sólo los grupos que aparecen
+            parcial = pd.concat([claves, medidas], axis=1).groupby(
+                resumen.claves, sort=False, dropna=False, observed=True).sum()
+            self._parciales[resumen.nombre].append(parcial)
+
+    def resultados(self):
+        """
+        Devuelve {nombre: DataFrame} con una fila por grupo y las columnas de Resumen.columnas.
+        """
+        import numpy as np
+        import pandas as pd
+        tablas = {}
+        for resumen in self.resumenes:
+            parciales = self._parciales[resumen.nombre]
+            if not parciales:
+                tablas[resumen.nombre] = pd.DataFrame(columns=resumen.columnas)
+                continue
+            total = pd.concat(parciales).groupby(level=list(range(len(resumen.claves))),
+                                                 sort=True, dropna=False, observed=True).sum()
+            for col in PONDERADOS:
+                peso = total.pop(f"_peso_{col}")
+                producto = total.pop(f"_producto_{col}")
+                total[col] = (producto / peso.where(peso != 0, np.nan)).round(4)
+            total[COLUMNAS_SUMA] = total[COLUMNAS_SUMA].round(4)
+            total["Filas"] = total["Filas"].astype("int64")
+            tabla = total.reset_index()[resumen.columnas]
+            # Las claves vuelven a texto (las categorías y fechas del plan de tipos)
+            for col in resumen.claves:
+                if pd.api.types.is_datetime64_any_dtype(tabla[col]):
+                    tabla[col] = tabla[col].dt.strftime("%Y-%m-%d")
+                elif isinstance(tabla[col].dtype, pd.CategoricalDtype):
+                    tabla[col] = tabla[col].astype(object)
+            tablas[resumen.nombre] = tabla
+        return tablas
+
+    def escribir(self, nombre_base):
+        """
+        Escribe cada resumen en '<nombre_base>.<nombre>.parquet' y devuelve {nombre: ruta}.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        rutas = {}
+        for nombre, tabla in self.resultados().items():
+            ruta = f"{nombre_base}.{nombre}.parquet"
+            pq.write_table(pa.Table.from_pandas(tabla, preserve_index=False), ruta)
+            rutas[nombre] = ruta
+            print(f"Resumen {nombre} guardado como: {ruta} ({len(tabla)} filas)")
+        return rutas
+
+def rutas_resumenes(ruta_procesado, resumenes):
+    """
+    Devuelve [(Resumen, ruta)] de los resúmenes escritos junto al archivo procesado.
+    """
+    nombre_base = os.path.splitext(ruta_procesado)[0]
+    existentes = set(glob.glob(glob.escape(nombre_base) + ".*.parquet"))
+    return [(r, f"{nombre_base}.{r.nombre}.parquet") for r in resumenes
+            if f"{nombre_base}.{r.nombre}.parquet" in existentes]
+
+def leer_resumenes(ruta_procesado, resumenes=None):
+    """
+    Lee los resúmenes del archivo procesado y devuelve [(Resumen, filas)], con
+    las filas como tuplas en el orden de Resumen.columnas (fechas ISO, vacíos como None).
+    """
+    import pyarrow.parquet as pq
+    from esquema import ConvertidorRegistros
+    if resumenes is None:
+        resumenes = cargar_configuracion()
+    leidos = []
+    for resumen, ruta in rutas_resumenes(ruta_procesado, resumenes):
+        tabla = pq.read_table(ruta, columns=resumen.columnas)
+        convertidor = ConvertidorRegistros(resumen.columnas)
+        filas = convertidor.tuplas(tabla, resumen.columnas) if tabla.num_rows else []
+        leidos.append((resumen, filas))
+    return leidos
@@ -1,39 +1,101 @@
 import time
 import os
 import csv
-import numpy as np
-import pandas as pd
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+import shutil
+import tempfile
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor
+import requests
 from sk import CONFIG
+import cache_sesion
+import captura
+import descarga_http
+import intercambio
+import memoria
+import resumenes
+import telemetria
+from esquema import COLUMNAS_EXPORTACION
+
+# pandas, numpy y selenium se importan dentro de las funciones que los usan:
+# la descarga no necesita pandas y la transformación no necesita selenium, y
+# así importar el módulo (arranque en frío) no paga por ninguno de los dos.
+
+# Plazos máximos (segundos) de las esperas por condición del flujo de Selenium
+TIMEOUT_PAGINA = 30
+TIMEOUT_REPORTE = 60
+TIMEOUT_DESCARGA = 70
+
+# Intervalo de sondeo del directorio de descargas y tiempo que el tamaño del
+# archivo debe mantenerse sin cambios para darlo por terminado
+INTERVALO_SONDEO = 0.2
+ESTABILIDAD_DESCARGA = 0.6
 
 def wait_for_window(driver, old_handles, timeout=2):
     """
-    Espera 'timeout' segundos y verifica si se abrió una nueva ventana
+    Espera hasta 'timeout' segundos a que se abra una nueva ventana
     comparando con old_handles. Devuelve el handle de la nueva ventana o None.
     """
-    time.sleep(timeout)
-    new_handles = driver.window_handles
-    if len(new_handles) > len(old_handles):
-        return list(set(new_handles) - set(old_handles))[0]
-    return None
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.support.ui import WebDriverWait
+    try:
+        WebDriverWait(driver, timeout).until(lambda d: len(d.window_handles) > len(old_handles))
+    except TimeoutException:
+        return None
+    return list(set(driver.window_handles) - set(old_handles))[0]
 
-def wait_for_csv_file(download_dir, timeout=60):
+def esperar_pagina_lista(driver, timeout=TIMEOUT_PAGINA):
     """
-    Espera hasta que se encuentre un archivo CSV en el directorio de descargas,
-    ignorando archivos incompletos (por ejemplo, con extensión .crdownload).
+    Espera a que el documento actual termine de cargar (document.readyState == 'complete').
     """
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        files = [f for f in os.listdir(download_dir)
-                 if f.lower().endswith(".csv") and not f.lower().endswith(".crdownload")]
-        if files:
-            return os.path.join(download_dir, files[0])
-        time.sleep(1)
+    from selenium.webdriver.support.ui import WebDriverWait
+    WebDriverWait(driver, timeout).until(
+        lambda d: d.execute_script("return document.readyState") == "complete"
+    )
+
+def _es_descarga_incompleta(nombre):
+    nombre = nombre.lower()
+    return nombre.endswith(".crdownload") or nombre.endswith(".tmp")
+
+def wait_for_csv_file(download_dir, timeout=60, creado_despues_de=None, ignorar=()):
+    """
+    Espera hasta que se encuentre un archivo CSV completo en el directorio de descargas.
+    Se ignoran los archivos incompletos (.crdownload), los nombres en 'ignorar'
+    (archivos que ya existían antes del clic) y los modificados antes de
+    'creado_despues_de'. El archivo se da por completo cuando no hay descargas en
+    curso y su tamaño no cambia durante ESTABILIDAD_DESCARGA segundos.
+    """
+    ignorar = set(ignorar)
+    limite = time.time() + timeout
+    candidato, tamano, estable_desde = None, None, None
+    while time.time() < limite:
+        nombres = os.listdir(download_dir)
+        en_curso = any(_es_descarga_incompleta(f) for f in nombres)
+        nuevos = []
+        for f in nombres:
+            if not f.lower().endswith(".csv") or f in ignorar:
+                continue
+            ruta = os.path.join(download_dir, f)
+            try:
+                mtime = os.path.getmtime(ruta)
+            except OSError:
+                continue
+            # Tolerancia de 2 s para sistemas de archivos con mtime de baja resolución
+            if creado_despues_de is None or mtime >= creado_despues_de - 2:
+                nuevos.append((mtime, ruta))
+        if nuevos and not en_curso:
+            ruta = max(nuevos)[1]
+            try:
+                tamano_actual = os.path.getsize(ruta)
+            except OSError:
+                tamano_actual = None
+            ahora = time.time()
+            if ruta != candidato or tamano_actual != tamano or not tamano_actual:
+                candidato, tamano, estable_desde = ruta, tamano_actual, ahora
+            elif ahora - estable_desde >= ESTABILIDAD_DESCARGA:
+                return ruta
+        else:
+            candidato, tamano, estable_desde = None, None, None
+        time.sleep(INTERVALO_SONDEO)
     return None
 
 def importar_csv_excel(archivo_entrada):
@@ -66,11 +128,20 @@ def modificar_header(header):
         header[5] = "NT"
     return header
 
-def limpiar_valores_dataframe(df):
+def limpiar_valores_arrow(tabla):
     """
-    Elimina el signo '=' y las comillas al inicio y final de cada valor string.
+    Elimina el signo '=' y las comillas al inicio y final de cada valor de texto
+    de una tabla de Arrow. Se aplica columna por columna con pyarrow.compute, sin
+    pasar por Python valor por valor.
     """
-    return df.applymap(lambda x: x.strip('"').lstrip('="') if isinstance(x, str) else x)
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    columnas = []
+    for columna in tabla.columns:
+        if pa.types.is_string(columna.type) or pa.types.is_large_string(columna.type):
+            columna = pc.utf8_ltrim(pc.utf8_trim(columna, characters='"'), characters='="')
+        columnas.append(columna)
+    return pa.Table.from_arrays(columnas, names=tabla.column_names)
 
 def limpiar_nombres_columnas(columnas):
     """
@@ -79,186 +150,551 @@ def limpiar_nombres_columnas(columnas):
     """
     return [str(col).strip('"').lstrip('="') for col in columnas]
 
-def procesar_csv(archivo_entrada):
+# Número de filas que se leen y procesan por bloque
+TAMANO_BLOQUE_CSV = 100_000
+
+# Columnas numéricas cuyo tipo final (entero o flotante) depende de todo el archivo:
+# si algún bloque resulta flotante, la columna completa debe escribirse como flotante.
+COLUMNAS_TIPO_VARIABLE = [
+    "VentaNetaenUnidades", "VentaNetaenPesos", "MargenObtenidoInv",
+    "MargenObtenidoVenta", "dow"
+]
+
+def leer_csv_por_bloques(archivo_entrada, tamano_bloque=TAMANO_BLOQUE_CSV):
+    """
+    Lee el archivo CSV en una sola pasada y devuelve bloques de DataFrame con
+    los nombres de esquema.COLUMNAS_EXPORTACION y los valores ya limpios ('=' y comillas).
+    La cabecera original se descarta y todos los valores se leen como texto.
+    El archivo se lee con el lector de CSV de Arrow y la limpieza se hace sobre
+    las columnas de Arrow (limpiar_valores_arrow); cada bloque se entrega como
+    DataFrame de pandas con columnas de texto (object), igual que read_csv con dtype=str.
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    lector = pacsv.open_csv(
+        archivo_entrada,
+        read_options=pacsv.ReadOptions(encoding='latin1', skip_rows=1,
+                                        column_names=COLUMNAS_EXPORTACION),
+        convert_options=pacsv.ConvertOptions(
+            column_types={c: pa.string() for c in COLUMNAS_EXPORTACION},
+            strings_can_be_null=False),
+    )
+    inicio = 0
+    # Los lotes del lector se cortan por bytes; se reagrupan en tamano_bloque filas
+    for tabla in intercambio.reagrupar(lector, tamano_bloque):
+        bloque = limpiar_valores_arrow(tabla).to_pandas()
+        # Índice continuo entre bloques, como el de read_csv con chunksize
+        bloque.index = pd.RangeIndex(inicio, inicio + len(bloque))
+        inicio += len(bloque)
+        yield bloque
+
+# Formato de DiaFecha en el CSV procesado
+FORMATO_FECHA_PROCESADA = '%Y-%m-%d'
+
+def transformar_bloque(df):
+    """
+    Calcula las columnas numéricas y derivadas (DiferenciaMargen, DifPesos, dow)
+    sobre un bloque ya filtrado.
+    """
+    import numpy as np
+    import pandas as pd
+    # Convertir columnas que se usarán en cálculos a numérico
+    df['VentaNetaenUnidades'] = pd.to_numeric(df['VentaNetaenUnidades'], errors='coerce')
+    df['VentaNetaenPesos'] = pd.to_numeric(df['VentaNetaenPesos'], errors='coerce')
+
+    # Limpiar y convertir MargenObtenidoVenta: quitar '%' y asignar 0 si hay NaN
+    df['MargenObtenidoVenta'] = df['MargenObtenidoVenta'].str.replace('%', '', regex=False)
+    df['MargenObtenidoVenta'] = pd.to_numeric(df['MargenObtenidoVenta'], errors='coerce').fillna(0)
+
+    # Limpiar y convertir MargenObtenidoInv: quitar '%' y asignar 0 si hay NaN
+    df['MargenObtenidoInv'] = df['MargenObtenidoInv'].str.replace('%', '', regex=False)
+    df['MargenObtenidoInv'] = pd.to_numeric(df['MargenObtenidoInv'], errors='coerce').fillna(0)
+
+    # Convertir la columna "DiaFecha" a formato datetime (dd/mm/yyyy); con el
+    # plan de tipos (memoria.py) ya viene como datetime64 y queda igual
+    df['DiaFecha'] = pd.to_datetime(df['DiaFecha'], format='%d/%m/%Y', errors='coerce')
+
+    # Calcular la columna "DiferenciaMargen":
+    df['DiferenciaMargen'] = np.where(
+        df['VentaNetaenUnidades'] >= 1,
+        np.where(
+            df['Depto'] == "Ropa, Zapatería y Te (4)",
+            df['MargenObtenidoVenta'] - 30,
+            df['MargenObtenidoVenta'] - 35
+        ),
+        np.nan
+    )
+    # Asignar 0 a los valores NaN en DiferenciaMargen
+    df['DiferenciaMargen'] = df['DiferenciaMargen'].fillna(0)
+
+    # Calcular la columna "DifPesos":
+    df['DifPesos'] = (df['DiferenciaMargen'] * df['VentaNetaenPesos']) / 100
+
+    # Calcular la columna "dow":
+    df['dow'] = (df['DiaFecha'].dt.weekday + 1) % 7
+
+    # Limitar a 4 decimales las columnas indicadas
+    df['MargenObtenidoInv'] = df['MargenObtenidoInv'].round(4)
+    df['MargenObtenidoVenta'] = df['MargenObtenidoVenta'].round(4)
+    df['DiferenciaMargen'] = df['DiferenciaMargen'].round(4)
+    df['DifPesos'] = df['DifPesos'].round(4)
+
+    # "DiaFecha" se queda como datetime64; se escribe en formato ISO (YYYY-MM-DD)
+    # con FORMATO_FECHA_PROCESADA
+    return df
+
+def promover_columnas_flotantes(archivo, columnas, tamano_bloque=TAMANO_BLOQUE_CSV):
+    """
+    Reescribe como flotantes las columnas indicadas del archivo procesado.
+    Se usa cuando una columna quedó entera en algunos bloques y flotante en otros,
+    para que el resultado sea idéntico al de procesar todo el archivo de una vez.
+    """
+    import pandas as pd
+    # Junto al archivo (en transformar_archivo, su directorio temporal privado);
+    # se crea con open() y no con mkstemp para conservar los permisos habituales
+    archivo_temporal = f"{archivo}.{os.getpid()}.promovido.tmp"
     try:
-        # Obtener la cabecera del archivo considerando la codificación Latin1
-        header = obtener_header_csv(archivo_entrada, encoding='latin1')
-        # Modificar nombres de columnas (índices 0, 1 y 5)
-        header = modificar_header(header)
-        
-        # Importar todos los datos y descartar la cabecera original
-        data = importar_csv_excel(archivo_entrada)
-        data = data[1:]
-        
-        # Definir nombres de columnas para el DataFrame
-        new_names_col = [
-            "DiaFecha", "NP", "Sku", "Region", "Distrito", "NT", "Tienda",
-            "SubDepto", "Depto", "Clase", "SubClase", "Capa", "Comprador",
-            "DevolProvCto", "DevolProvUni", "DevolProvVta", "InvFinCto",
-            "InvFinUni", "InvFinVta", "RebajaVta", "RecibosCto", "RecibosPzs",
-            "RecibosVta", "VentaNetaaCosto", "VentaNetaenPesos", "VentaNetaenUnidades",
-            "TransfEntCto", "TransfEntUni", "TransfEntVta", "TransfSalCto",
-            "TransfSalUni", "TransfSalVta", "DiasdeInventario",
-            "VentaNetaenPesosAnt", "VentaNetaenUnidadesAnt", "PVPCosto", "PVPVenta",
-            "MargenObtenidoInv", "MargenObtenidoVenta"
-        ]
-        df = pd.DataFrame(data, columns=new_names_col)
-        
-        # Limpiar los valores del DataFrame (quitar '=' y comillas)
-        df = limpiar_valores_dataframe(df)
-        
-        # Eliminar filas en las que NP sea igual a 3285317
-        df = df[df['NP'].astype(str) != "3285317"]
-        
-        # Ejemplo: procesar valor en la segunda fila, primera columna
-        if not df.empty:
-            valor_segunda_fila = df.iloc[1, 0].strip('"').lstrip('="').replace('/','')
-            print("Valor segunda fila:", valor_segunda_fila)
-        else:
+        primer_bloque = True
+        with pd.read_csv(archivo, encoding='latin1', dtype=str, keep_default_na=False,
+                         na_filter=False, chunksize=tamano_bloque) as lector:
+            for bloque in lector:
+                for col in columnas:
+                    bloque[col] = pd.to_numeric(bloque[col], errors='coerce').astype('float64')
+                bloque.to_csv(archivo_temporal, mode='w' if primer_bloque else 'a',
+                              header=primer_bloque, index=False, encoding='latin1')
+                primer_bloque = False
+        os.replace(archivo_temporal, archivo)
+    finally:
+        if os.path.exists(archivo_temporal):
+            os.remove(archivo_temporal)
+
+def transformar_archivo(archivo_entrada, tamano_bloque=TAMANO_BLOQUE_CSV,
+                        formato=intercambio.FORMATO_INTERCAMBIO,
+                        guardar_csv=intercambio.GUARDAR_CSV_PROCESADO,
+                        con_resumenes=resumenes.RESUMENES, directorio_salida=None,
+                        con_plan=memoria.PLAN_TIPOS, reporte_memoria=memoria.REPORTE_MEMORIA):
+    """
+    Procesa la exportación por bloques en una sola lectura del archivo.
+    La memoria usada depende de tamano_bloque y no del tamaño del archivo.
+    El CSV resultante es idéntico al que se obtiene procesando todo en memoria.
+    Con formato 'arrow' o 'parquet' se escribe además el archivo tipado para la
+    carga (ver intercambio.py); con guardar_csv=False sólo se escribe ese.
+    Con con_resumenes se escriben además los resúmenes de resumenes.json.
+    Los archivos se escriben en directorio_salida (por defecto junto a la exportación).
+    Con con_plan cada bloque se convierte al leerlo a los tipos compactos de
+    memoria.py; con reporte_memoria se imprime la memoria por columna antes y después.
+    Devuelve (ruta_del_archivo_para_la_carga, numero_de_filas); los errores se propagan.
+    """
+    import pandas as pd
+    if formato not in intercambio.FORMATOS:
+        raise ValueError(f"Formato de intercambio no válido: {formato}")
+    tipado = formato != "csv"
+    guardar_csv = guardar_csv or not tipado
+    output_dir = directorio_salida or os.path.dirname(archivo_entrada)
+    # Los archivos a medio escribir van en un subdirectorio oculto propio de esta
+    # llamada: wait_for_csv_file no lo recorre (un .tmp en el directorio de descargas
+    # se toma como descarga en curso), está en el mismo sistema de archivos para que
+    # os.replace sea atómico y, a diferencia de mkstemp (0600), los archivos se crean
+    # con los permisos habituales (0644 con umask 022)
+    directorio_temporal = tempfile.mkdtemp(prefix='.procesando_', dir=output_dir or None)
+    archivo_temporal = os.path.join(directorio_temporal, 'procesado.csv')
+    archivo_tipado_temporal = (os.path.join(directorio_temporal, 'procesado' + intercambio.EXTENSIONES[formato])
+                               if tipado else None)
+    escritor = None
+    acumulador = resumenes.AcumuladorResumenes(resumenes.cargar_configuracion()) if con_resumenes else None
+    plan = memoria.plan_tipos(COLUMNAS_EXPORTACION) if con_plan else None
+    reporte = memoria.ReporteMemoria() if reporte_memoria and plan else None
+    try:
+        numero_filas = 0
+        valor_segunda_fila = None
+        columnas_enteras = set()
+        columnas_flotantes = set()
+
+        for bloque in leer_csv_por_bloques(archivo_entrada, tamano_bloque):
+            # Eliminar filas en las que NP sea igual a 3285317
+            # (copy() evita SettingWithCopyWarning al agregar columnas al bloque filtrado)
+            bloque = bloque[bloque['NP'].astype(str) != "3285317"].copy()
+            if bloque.empty:
+                continue
+
+            # Ejemplo: procesar valor en la segunda fila, primera columna
+            if valor_segunda_fila is None and numero_filas + len(bloque) > 1:
+                valor_segunda_fila = bloque.iloc[1 - numero_filas, 0].strip('"').lstrip('="').replace('/','')
+                print("Valor segunda fila:", valor_segunda_fila)
+
+            if plan is not None:
+                if reporte is not None:
+                    reporte.medir(bloque)
+                bloque = memoria.aplicar_plan(bloque, plan)
+                if reporte is not None:
+                    reporte.medir(bloque, despues=True)
+
+            bloque = transformar_bloque(bloque)
+            if acumulador is not None:
+                acumulador.agregar(bloque)
+            for col in COLUMNAS_TIPO_VARIABLE:
+                if pd.api.types.is_float_dtype(bloque[col]):
+                    columnas_flotantes.add(col)
+                else:
+                    columnas_enteras.add(col)
+
+            if tipado:
+                if escritor is None:
+                    escritor = intercambio.EscritorTipado(archivo_tipado_temporal, bloque.columns, formato)
+                escritor.escribir(bloque)
+
+            # Guardar con encoding Latin1 (para que se procese correctamente)
+            if guardar_csv:
+                bloque.to_csv(archivo_temporal, mode='w' if numero_filas == 0 else 'a',
+                              header=numero_filas == 0, index=False, encoding='latin1',
+                              date_format=FORMATO_FECHA_PROCESADA)
+            numero_filas += len(bloque)
+
+        if numero_filas == 0:
             print("DataFrame vacío después del filtrado.")
-        
-        # --- Inicio de la integración de las nuevas columnas ---
-        
-        # Convertir columnas que se usarán en cálculos a numérico
-        df['VentaNetaenUnidades'] = pd.to_numeric(df['VentaNetaenUnidades'], errors='coerce')
-        df['VentaNetaenPesos'] = pd.to_numeric(df['VentaNetaenPesos'], errors='coerce')
-        
-        # Limpiar y convertir MargenObtenidoVenta: quitar '%' y asignar 0 si hay NaN
-        df['MargenObtenidoVenta'] = df['MargenObtenidoVenta'].str.replace('%', '', regex=False)
-        df['MargenObtenidoVenta'] = pd.to_numeric(df['MargenObtenidoVenta'], errors='coerce').fillna(0)
-        
-        # Limpiar y convertir MargenObtenidoInv: quitar '%' y asignar 0 si hay NaN
-        df['MargenObtenidoInv'] = df['MargenObtenidoInv'].str.replace('%', '', regex=False)
-        df['MargenObtenidoInv'] = pd.to_numeric(df['MargenObtenidoInv'], errors='coerce').fillna(0)
-        
-        # Convertir la columna "DiaFecha" a formato datetime (dd/mm/yyyy)
-        df['DiaFecha'] = pd.to_datetime(df['DiaFecha'], format='%d/%m/%Y', errors='coerce')
-        
-        # Calcular la columna "DiferenciaMargen":
-        df['DiferenciaMargen'] = np.where(
-            df['VentaNetaenUnidades'] >= 1,
-            np.where(
-                df['Depto'] == "Ropa, Zapatería y Te (4)",
-                df['MargenObtenidoVenta'] - 30,
-                df['MargenObtenidoVenta'] - 35
-            ),
-            np.nan
-        )
-        # Asignar 0 a los valores NaN en DiferenciaMargen
-        df['DiferenciaMargen'] = df['DiferenciaMargen'].fillna(0)
-        
-        # Calcular la columna "DifPesos":
-        df['DifPesos'] = (df['DiferenciaMargen'] * df['VentaNetaenPesos']) / 100
-        
-        # Calcular la columna "dow":
-        df['dow'] = (df['DiaFecha'].dt.weekday + 1) % 7
-        
-        # Limitar a 4 decimales las columnas indicadas
-        df['MargenObtenidoInv'] = df['MargenObtenidoInv'].round(4)
-        df['MargenObtenidoVenta'] = df['MargenObtenidoVenta'].round(4)
-        df['DiferenciaMargen'] = df['DiferenciaMargen'].round(4)
-        df['DifPesos'] = df['DifPesos'].round(4)
-        
-        # Convertir la columna "DiaFecha" a formato ISO (YYYY-MM-DD)
-        df['DiaFecha'] = df['DiaFecha'].dt.strftime('%Y-%m-%d')
-        
-        # --- Fin de la integración de las nuevas columnas ---
-        
+        if valor_segunda_fila is None:
+            raise ValueError(f"se requieren al menos 2 filas y el archivo tiene {numero_filas}")
+
         # Generar nombre del archivo procesado
-        numero_filas = df.shape[0]
-        output_dir = os.path.dirname(archivo_entrada)
-        archivo_procesado = os.path.join(output_dir, f'e_{valor_segunda_fila}_{numero_filas}.csv')
-        
-        # Guardar DataFrame con encoding Latin1 (para que se procese correctamente)
-        df.to_csv(archivo_procesado, index=False, encoding='latin1')
+        nombre_base = os.path.join(output_dir, f'e_{valor_segunda_fila}_{numero_filas}')
+        archivo_procesado = None
+        if guardar_csv:
+            columnas_a_promover = columnas_enteras & columnas_flotantes
+            if columnas_a_promover:
+                promover_columnas_flotantes(archivo_temporal, sorted(columnas_a_promover), tamano_bloque)
+            archivo_procesado = nombre_base + '.csv'
+            os.replace(archivo_temporal, archivo_procesado)
+        if tipado:
+            escritor.cerrar()
+            escritor = None
+            archivo_procesado = nombre_base + intercambio.EXTENSIONES[formato]
+            os.replace(archivo_tipado_temporal, archivo_procesado)
+            if guardar_csv:
+                print(f"CSV procesado guardado como: {nombre_base}.csv")
+        if acumulador is not None:
+            acumulador.escribir(nombre_base)
+        if reporte is not None:
+            for linea in reporte.lineas():
+                print("Memoria ->", linea)
         print(f"Archivo procesado guardado como: {archivo_procesado}")
-        
+        return archivo_procesado, numero_filas
+    finally:
+        if escritor is not None:
+            escritor.cerrar()
+        shutil.rmtree(directorio_temporal, ignore_errors=True)
+
+def procesar_csv(archivo_entrada, tamano_bloque=TAMANO_BLOQUE_CSV):
+    """
+    Procesa la exportación y devuelve la ruta del archivo procesado,
+    o None si ocurrió un error (el error se imprime).
+    """
+    try:
+        archivo_procesado, _ = transformar_archivo(archivo_entrada, tamano_bloque)
+        return archivo_procesado
     except Exception as e:
         print(f'Error al procesar el archivo: {e}')
+        return None
 
 # =================== CONFIGURACIÓN DE SELENIUM ===================
-from selenium.webdriver.chrome.options import Options
+URL_CHEDLINK = "https://chedlink.chedraui.com.mx/Artus/g940/projects/main.php"
+URL_OPENFAV = "https://chedlink.chedraui.com.mx/Artus/g940/openfav.php"
+CLAVE_REPORTE = "67795"
+# Nombre del reporte (el mismo que en reportes.json): identifica su manifiesto
+# y su trabajo tanto en la ejecución de un reporte como en la de la lista
+NOMBRE_REPORTE = os.environ.get("NOMBRE_REPORTE", "ventas_diarias")
+PARAMETROS_REPORTE = {"bRep": "0", "bPDF": "0", "bPPT": "0", "bExcel": "0", "bEditMode": "0", "ckid": ""}
 
-options = webdriver.ChromeOptions()
-options.add_argument('--headless')
-options.add_argument('--disable-gpu')
-options.add_argument('--window-size=1920,1080')
-# options.add_argument('--incognito')  # Modo incógnito deshabilitado para permitir apertura de ventana
-options.add_argument('--no-sandbox')             # Recomendado en Docker/Azure Functions
-options.add_argument('--disable-dev-shm-usage')  # Evita problemas de memoria compartida
+def url_reporte(clave=CLAVE_REPORTE, parametros=None):
+    """
+    Arma la URL openfav.php del reporte con su clave y parámetros adicionales.
+    """
+    consulta = {"bRep": PARAMETROS_REPORTE["bRep"], "key": clave}
+    consulta.update({k: v for k, v in PARAMETROS_REPORTE.items() if k != "bRep"})
+    consulta.update(parametros or {})
+    return f"{URL_OPENFAV}?{urlencode(consulta)}"
 
-# Indicar la ubicación del binario de Chromium
-options.binary_location = "/usr/bin/chromium"
+URL_REPORTE = url_reporte()
 
 # Configurar el directorio de descargas (usando /tmp, adecuado para Azure Functions)
 DOWNLOAD_DIR = os.path.join("/tmp", "descargas")
-os.makedirs(DOWNLOAD_DIR, exist_ok=True)
-prefs = {"download.default_directory": DOWNLOAD_DIR}
-options.add_experimental_option("prefs", prefs)
 
-# Usar el chromedriver copiado en el contenedor
-service = Service('/usr/local/bin/chromedriver')
-driver = webdriver.Chrome(service=service, options=options)
+# Modo de descarga: 'auto' (HTTP si el endpoint está configurado, con el navegador
+# como respaldo) o 'navegador' (siempre el flujo completo en Chromium)
+MODO_DESCARGA = os.environ.get("MODO_DESCARGA", "auto")
+
+def crear_driver(download_dir=DOWNLOAD_DIR):
+    """
+    Crea el navegador Chromium headless configurado para descargar en download_dir.
+    """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--window-size=1920,1080')
+    # options.add_argument('--incognito')  # Modo incógnito deshabilitado para permitir apertura de ventana
+    options.add_argument('--no-sandbox')             # Recomendado en Docker/Azure Functions
+    options.add_argument('--disable-dev-shm-usage')  # Evita problemas de memoria compartida
+
+    # Indicar la ubicación del binario de Chromium
+    options.binary_location = "/usr/bin/chromium"
+
+    os.makedirs(download_dir, exist_ok=True)
+    prefs = {"download.default_directory": download_dir}
+    options.add_experimental_option("prefs", prefs)
+
+    # Usar el chromedriver copiado en el contenedor
+    service = Service('/usr/local/bin/chromedriver')
+    with telemetria.span("portal.navegador_inicio"):
+        return webdriver.Chrome(service=service, options=options)
+
+def crear_driver_en_segundo_plano(download_dir=DOWNLOAD_DIR):
+    """
+    Lanza Chromium en un hilo aparte y devuelve un Future con el driver, para
+    que el navegador arranque mientras se carga lo demás (caché de sesión,
+    configuración y bibliotecas).
+    """
+    ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="navegador")
+    futuro = ejecutor.submit(captura.propagar(crear_driver), download_dir)
+    ejecutor.shutdown(wait=False)
+    return futuro
+
+def descartar_driver(futuro):
+    """
+    Cierra el navegador de un Future que no se usó, en cuanto termine de arrancar.
+    """
+    def cerrar(f):
+        if f.exception() is None:
+            f.result().quit()
+    futuro.add_done_callback(cerrar)
+
+def iniciar_sesion_navegador(driver):
+    """
+    Abre chedlink en el navegador e inicia sesión con las credenciales de sk.CONFIG.
+    Devuelve True si la sesión se inició.
+    """
+    with telemetria.span("portal.login", medio="navegador") as s:
+        exito = _iniciar_sesion_navegador(driver)
+        s.agregar(ok=exito)
+    return exito
+
+def _iniciar_sesion_navegador(driver):
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.common.keys import Keys
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
 
-try:
     # 1. ABRIR CHEDLINK
-    url = "https://chedlink.chedraui.com.mx/Artus/g940/projects/main.php"
+    url = URL_CHEDLINK
     print(f"Abriendo URL: {url}")
     driver.get(url)
-    time.sleep(3)  # Espera a que cargue la página
+    esperar_pagina_lista(driver)  # Espera a que cargue la página
 
     # 2. INICIAR SESIÓN
     print("Buscando campos de usuario y contraseña...")
-    usuario_input = driver.find_element(By.NAME, "username")
-    password_input = driver.find_element(By.NAME, "password")
+    wait = WebDriverWait(driver, TIMEOUT_PAGINA)
+    usuario_input = wait.until(EC.presence_of_element_located((By.NAME, "username")))
+    password_input = wait.until(EC.presence_of_element_located((By.NAME, "password")))
 
     print("Ingresando credenciales...")
     usuario_input.send_keys(CONFIG['chedraui']['USUARIO'])
     password_input.send_keys(CONFIG['chedraui']['PASSWORD'])
     password_input.send_keys(Keys.RETURN)  # Inicia sesión
 
-    time.sleep(5)  # Espera a que la siguiente página cargue
+    # Espera a que el formulario sea reemplazado por la siguiente página
+    try:
+        wait.until(EC.staleness_of(password_input))
+        esperar_pagina_lista(driver)
+    except TimeoutException:
+        pass
 
     # 3. VERIFICAR SI LA SESIÓN SE INICIÓ
     if "login" in driver.current_url.lower():
         print("Parece que no se inició sesión. Verifica credenciales o selectores.")
-    else:
-        print("¡Sesión iniciada correctamente!")
-        # 4. ABRIR REPORTE
-        reporte_url = ("https://chedlink.chedraui.com.mx/Artus/g940/openfav.php?"
-                       "bRep=0&key=67795&bPDF=0&bPPT=0&bExcel=0&bEditMode=0&ckid=")
-        print(f"Abriendo reporte: {reporte_url}")
+        return False
+    print("¡Sesión iniciada correctamente!")
+    return True
+
+def exportar_con_navegador(driver, download_dir=DOWNLOAD_DIR, clave=CLAVE_REPORTE, parametros=None):
+    """
+    Abre el reporte en el navegador autenticado y descarga la exportación CSV
+    con el menú de Excel. Devuelve la ruta del CSV o None.
+    """
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    # 4. ABRIR REPORTE
+    reporte_url = url_reporte(clave, parametros)
+    print(f"Abriendo reporte: {reporte_url}")
+    with telemetria.span("portal.reporte", clave=clave):
         driver.get(reporte_url)
-        time.sleep(7)  # Espera a que cargue el reporte
+        esperar_pagina_lista(driver, TIMEOUT_REPORTE)  # Espera a que cargue el reporte
 
         # 5. Cambiar a frame(0) y hacer clic en "botExcel"
-        driver.switch_to.frame(0)
-        driver.find_element(By.ID, "botExcel").click()
+        wait = WebDriverWait(driver, TIMEOUT_REPORTE)
+        wait.until(EC.frame_to_be_available_and_switch_to_it(0))
+        wait.until(EC.element_to_be_clickable((By.ID, "botExcel"))).click()
 
         # 6. Regresar al contenido principal y cambiar a frame(2)
         driver.switch_to.default_content()
-        driver.switch_to.frame(2)
+        wait.until(EC.frame_to_be_available_and_switch_to_it(2))
 
         # 7. Esperar y hacer clic en el elemento que inicia la descarga
-        wait = WebDriverWait(driver, 20)
         element = wait.until(EC.element_to_be_clickable(
              (By.CSS_SELECTOR, "#menu_0_row_1 > .cellStyle:nth-child(2)")
         ))
+    # Sólo se aceptan archivos que aparezcan después del clic
+    existentes = set(os.listdir(download_dir))
+    inicio_descarga = time.time()
+    with telemetria.span("portal.descarga", medio="navegador", clave=clave) as s:
         element.click()
 
         # En este flujo, en lugar de esperar una nueva ventana, esperamos directamente que se descargue el CSV.
-        time.sleep(10)  # Ajusta este tiempo si es necesario
-        csv_file_path = wait_for_csv_file(DOWNLOAD_DIR, timeout=60)
-        if csv_file_path:
-            print("Archivo CSV detectado:", csv_file_path)
-        else:
-            print("No se detectó el archivo CSV en el directorio de descargas.")
+        csv_file_path = wait_for_csv_file(download_dir, timeout=TIMEOUT_DESCARGA,
+                                          creado_despues_de=inicio_descarga, ignorar=existentes)
+        s.agregar(ok=csv_file_path is not None,
+                  bytes=os.path.getsize(csv_file_path) if csv_file_path else None)
+    if csv_file_path:
+        print("Archivo CSV detectado:", csv_file_path)
+    else:
+        print("No se detectó el archivo CSV en el directorio de descargas.")
+
+    # 9. Guardar el HTML de la página actual en el directorio de descarga del reporte,
+    # que es propio de cada reporte (dos reportes con la misma clave no se pisan)
+    page_source = driver.page_source
+    nombre_html = "reporte_chedlink.html" if clave == CLAVE_REPORTE else f"reporte_chedlink_{clave}.html"
+    archivo_html = os.path.join(download_dir, nombre_html)
+    with open(archivo_html, "w", encoding="utf-8") as f:
+        f.write(page_source)
+    print(f"Reporte guardado como {archivo_html}.")
+    return csv_file_path
+
+def exportar_por_http(sesion, download_dir=DOWNLOAD_DIR, clave=CLAVE_REPORTE, parametros=None):
+    """
+    Descarga la exportación con una sesión HTTP ya autenticada.
+    Devuelve la ruta del CSV o None si la descarga directa falla o si el
+    endpoint configurado no acepta los parámetros del reporte.
+    """
+    url = descarga_http.url_exportacion(CONFIG['chedraui'], clave, parametros)
+    if url is None:
+        return None
+    with telemetria.span("portal.descarga", medio="http", clave=clave) as s:
+        try:
+            inicio = time.perf_counter()
+            ruta, descargados = descarga_http.descargar_exportacion(sesion, url, download_dir)
+            segundos = time.perf_counter() - inicio
+            s.agregar(bytes=descargados)
+            print(f"Archivo CSV descargado por HTTP: {ruta} "
+                  f"({descargados / (1024 * 1024):.1f} MB en {segundos:.1f} s)")
+            return ruta
+        except (requests.RequestException, descarga_http.SesionInvalida, OSError) as e:
+            s.agregar(ok=False, error=str(e))
+            print(f"La descarga directa falló: {e}")
+            return None
 
-        # 9. Guardar el HTML de la página actual
-        page_source = driver.page_source
-        with open("reporte_chedlink.html", "w", encoding="utf-8") as f:
-            f.write(page_source)
-        print("Reporte guardado como reporte_chedlink.html.")
+def restaurar_sesion_navegador(driver, cookies):
+    """
+    Carga en el navegador las cookies de una sesión guardada.
+    Devuelve True si con ellas el portal ya no pide iniciar sesión.
+    """
+    from selenium.webdriver.common.by import By
+    driver.get(URL_CHEDLINK)
+    esperar_pagina_lista(driver)
+    for cookie in cookies:
+        cookie = {k: v for k, v in cookie.items()
+                  if k in ("name", "value", "domain", "path", "expiry", "secure", "httpOnly")}
+        if "expiry" in cookie:
+            cookie["expiry"] = int(cookie["expiry"])
+        try:
+            driver.add_cookie(cookie)
+        except Exception:
+            pass
+    driver.get(URL_CHEDLINK)
+    esperar_pagina_lista(driver)
+    return "login" not in driver.current_url.lower() and not driver.find_elements(By.NAME, "password")
+
+def descargar_reporte(download_dir=DOWNLOAD_DIR, modo=None, cache=None,
+                      clave=CLAVE_REPORTE, parametros=None):
+    """
+    Obtiene la exportación CSV del reporte y devuelve su ruta, o None.
+    Modos: 'navegador' (flujo completo en Chromium) o 'auto' (por defecto).
+    Si hay una sesión válida en el caché se omite el inicio de sesión; si no,
+    se inicia sesión y se guarda la nueva sesión en el caché.
+    En 'auto', si el endpoint de exportación está configurado, se descarga sin
+    navegador (con la sesión del caché o enviando el formulario); si eso falla
+    se abre el navegador, y tras iniciar sesión se vuelve a intentar la
+    descarga directa con sus cookies antes de recurrir al menú de Excel.
+    Un reporte con 'parametros' sólo se descarga sin navegador si la URL del
+    endpoint los acepta ('{parametros}', ver descarga_http.url_exportacion).
+    """
+    modo = modo or MODO_DESCARGA
+    os.makedirs(download_dir, exist_ok=True)
+    directa = modo != "navegador" and descarga_http.url_exportacion(CONFIG['chedraui'], clave, parametros)
+    # Si el navegador se va a usar de todos modos, arranca mientras se lee el caché
+    navegador = None if directa else crear_driver_en_segundo_plano(download_dir)
+    try:
+        if cache is None and cache_sesion.USAR_CACHE_SESION:
+            cache = cache_sesion.CacheSesion()
+        with telemetria.span("portal.sesion_cache") as s:
+            cookies = cache.obtener(URL_CHEDLINK) if cache else None
+            s.agregar(acierto=bool(cookies), cache=bool(cache))
+        if cache:
+            print("Sesión recuperada del caché." if cookies else "No hay una sesión válida en caché.")
+
+        if directa:
+            if cookies:
+                with descarga_http.sesion_desde_cookies(cookies) as sesion:
+                    csv_file_path = exportar_por_http(sesion, download_dir, clave, parametros)
+                if csv_file_path:
+                    return csv_file_path
+            else:
+                try:
+                    print("Iniciando sesión por HTTP...")
+                    inicio = time.perf_counter()
+                    with telemetria.span("portal.login", medio="http"):
+                        sesion = descarga_http.iniciar_sesion_http(
+                            URL_CHEDLINK, CONFIG['chedraui']['USUARIO'], CONFIG['chedraui']['PASSWORD'])
+                    if cache:
+                        cache.guardar(descarga_http.cookies_de_sesion(sesion),
+                                      time.perf_counter() - inicio)
+                    with sesion:
+                        csv_file_path = exportar_por_http(sesion, download_dir, clave, parametros)
+                    if csv_file_path:
+                        return csv_file_path
+                except (requests.RequestException, descarga_http.SesionInvalida) as e:
+                    print(f"No se pudo iniciar sesión por HTTP: {e}")
+            print("Se usará el navegador.")
+
+        driver = navegador.result() if navegador is not None else crear_driver(download_dir)
+        navegador = None
+        try:
+            if not (cookies and restaurar_sesion_navegador(driver, cookies)):
+                inicio = time.perf_counter()
+                if not iniciar_sesion_navegador(driver):
+                    return None
+                if cache:
+                    cache.guardar(driver.get_cookies(), time.perf_counter() - inicio)
+            if directa:
+                # Reutilizar las cookies del navegador para descargar sin el menú de Excel
+                with descarga_http.sesion_desde_driver(driver) as sesion:
+                    csv_file_path = exportar_por_http(sesion, download_dir, clave, parametros)
+                if csv_file_path:
+                    return csv_file_path
+            return exportar_con_navegador(driver, download_dir, clave, parametros)
+        finally:
+            driver.quit()
+    finally:
+        if navegador is not None:
+            descartar_driver(navegador)
+        if cache:
+            print(cache.resumen())
+
+def main():
+    try:
+        csv_file_path = descargar_reporte(DOWNLOAD_DIR)
 
         # 10. Procesar el archivo CSV descargado
         if csv_file_path:
@@ -267,8 +703,8 @@ try:
         else:
             print("No se pudo procesar el CSV porque no se encontró en el directorio de descargas.")
 
-except Exception as e:
-    print(f"Ocurrió un error: {e}")
+    except Exception as e:
+        print(f"Ocurrió un error: {e}")
 
-finally:
-    driver.quit()
+if __name__ == "__main__":
+    main()
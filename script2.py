@@ -1,166 +1,395 @@
-import csv
-import json
-import requests
-from datetime import datetime
-import sys
-import snowflake.connector
+import argparse
+import os
 from sk import CONFIG
+from ninox import SubidorNinox, TAMANO_BLOQUE_NINOX, CONCURRENCIA_NINOX
+from distribucion import EtapaDestino, distribuir_lotes, resumen_distribucion
+from incremental import CLAVE_NEGOCIO, EstadoIncremental
+from destinos import DestinoSnowflake, crear_destino, MODOS
+from esquema import COLUMNAS_ALMACEN, LoteRegistros
+import intercambio
+import resumenes
+import telemetria
 
 # Configuración de la API Ninox
 ninox_url = CONFIG["ninox"]["url"]
 ninox_headers = CONFIG["ninox"]["headers"]
 
-# Lista de campos que deben ser numéricos (si es necesario convertirlos)
-numeric_fields = [
-    "DevolProvCto", "DevolProvUni", "DevolProvVta", "InvFinCto", "InvFinUni", "InvFinVta",
-    "RebajaVta", "RecibosCto", "RecibosPzs", "RecibosVta", "VentaNetaaCosto",
-    "VentaNetaenPesos", "VentaNetaenUnidades", "TransfEntCto", "TransfEntUni", "TransfEntVta",
-    "TransfSalCto", "TransfSalUni", "TransfSalVta", "VentaNetaenPesosAnt", "VentaNetaenUnidadesAnt",
-    "PVPCosto", "PVPVenta", "MargenObtenidoInv", "MargenObtenidoVenta", "dow", "DiferenciaMargen", "DifPesos"
-]
+# Número de registros por lote que se envía a cada destino (configurable por entorno)
+TAMANO_LOTE = int(os.environ.get("TAMANO_LOTE", "5000"))
 
-def parse_numeric(value):
+# Límite de tiempo en segundos de cada destino (0 = sin límite)
+TIMEOUT_NINOX = float(os.environ.get("TIMEOUT_NINOX", "1800")) or None
+TIMEOUT_ALMACEN = float(os.environ.get("TIMEOUT_ALMACEN", "1800")) or None
+
+# Carga incremental (sólo filas nuevas o cambiadas); CARGA_INCREMENTAL=0 vuelve al INSERT completo
+CARGA_INCREMENTAL = os.environ.get("CARGA_INCREMENTAL", "1") == "1"
+
+def leer_por_lotes(ruta_archivo, tamano_lote=TAMANO_LOTE):
     """
-    Convierte el valor de texto a número.
-    Se eliminan separadores de miles, espacios y el signo de porcentaje.
-    Si el valor está vacío se retorna None.
+    Devuelve los registros { "fields": { ... } } del archivo procesado en listas
+    de a lo más 'tamano_lote' elementos. Acepta el CSV (encoding 'latin1') o el
+    archivo tipado (.arrow / .parquet) que escribe la transformación.
+    La conversión es por columna con los tipos de esquema.py (fechas ISO,
+    números y texto; se omiten los vacíos) y sólo un lote vive en memoria a la vez.
     """
-    if value is None or value.strip() == "":
-        return None
-    value = value.replace(",", "").replace("%", "").strip()
-    try:
-        num = float(value)
-        return int(num) if num.is_integer() else num
-    except ValueError:
-        return value
+    return intercambio.leer_registros_por_lotes(ruta_archivo, tamano_lote)
 
-def formatear_fecha(fecha_str):
+def leer_csv_por_lotes(ruta_archivo, tamano_lote=TAMANO_LOTE):
     """
-    Convierte una cadena de fecha a formato ISO 8601 (YYYY-MM-DD).
-    Se asume que en el CSV la fecha está en formato DD/MM/YYYY.
+    Devuelve los registros del CSV en listas de a lo más 'tamano_lote' elementos.
     """
-    if not fecha_str or fecha_str.strip() == "":
-        return None
-    try:
-        fecha = datetime.strptime(fecha_str.strip(), "%d/%m/%Y")
-        return fecha.strftime("%Y-%m-%d")
-    except ValueError:
-        # Si falla la conversión, se retorna el valor original
-        return fecha_str.strip()
-
-def convertir_fila(row):
-    """
-    Convierte cada fila del CSV a un registro con la estructura que espera la API o la inserción en Snowflake:
-    { "fields": { ... } }.
-    Se convierte el campo "DiaFecha", los campos numéricos y se omiten aquellos con valor None.
-    """
-    nuevos_campos = {}
-    for key, value in row.items():
-        if key == "DiaFecha":
-            nuevo_valor = formatear_fecha(value)
-        elif key in numeric_fields:
-            nuevo_valor = parse_numeric(value)
-        else:
-            nuevo_valor = value.strip() if value and value.strip() != "" else None
-        
-        if nuevo_valor is not None:
-            nuevos_campos[key] = nuevo_valor
-
-    return {"fields": nuevos_campos}
+    return leer_por_lotes(ruta_archivo, tamano_lote)
+
+def iterar_registros(ruta_archivo):
+    """
+    Devuelve los registros del CSV uno por uno sin cargar el archivo completo en memoria.
+    """
+    for lote in leer_por_lotes(ruta_archivo):
+        yield from lote
 
 def leer_csv(ruta_archivo):
     """
     Lee el archivo CSV (con encoding 'latin1') y devuelve una lista de registros convertidos.
     Se asume que la primera columna es "DiaFecha".
     """
-    registros = []
-    with open(ruta_archivo, mode='r', encoding='latin1', newline='') as csvfile:
-        lector = csv.DictReader(csvfile)
-        for row in lector:
-            registros.append(convertir_fila(row))
-    return registros
+    return list(iterar_registros(ruta_archivo))
 
-def enviar_a_api(registros):
+def crear_subidor_ninox(**kwargs):
+    """
+    Crea el cliente de Ninox con la URL y encabezados de sk.CONFIG.
+    """
+    return SubidorNinox(ninox_url, ninox_headers, **kwargs)
+
+def enviar_a_api(registros, subidor=None):
     """
     Envía los registros a la API de Ninox.
-    La API espera un array de registros.
-    Se imprime el código de estado y la respuesta en la terminal.
-    """
-    payload = json.dumps(registros, ensure_ascii=False)
-    response = requests.post(ninox_url, headers=ninox_headers, data=payload)
-    print("API Ninox -> Código de estado:", response.status_code)
-    #print("API Ninox -> Respuesta:", response.text)
-    if response.status_code in (200, 201):
+    La API espera un array de registros; se envían en bloques concurrentes y
+    sólo se reintentan los bloques que fallan.
+    Devuelve True si todos los bloques fueron aceptados.
+    """
+    subidor_propio = subidor is None
+    if subidor_propio:
+        subidor = crear_subidor_ninox()
+    try:
+        resultados = subidor.enviar(registros)
+    finally:
+        if subidor_propio:
+            subidor.cerrar()
+    if all(r.ok for r in resultados):
         print("Datos importados exitosamente a Ninox.")
-    else:
-        print("Error al importar datos a Ninox.")
-
-def insertar_en_snowflake(registros):
-    """
-    Inserta los registros en la tabla TESTING_2025 de Snowflake.
-    Se arma una lista de tuplas con los valores en el orden definido por las columnas.
-    Se usa executemany() para realizar la inserción en lote.
-    """
-    columnas = [
-        "DiaFecha", "NP", "Sku", "Region", "Distrito", "NT", "Tienda", "Depto", "SubDepto", 
-        "Clase", "SubClase", "Comprador", "Capa", "DiasdeInventario", "VentaNetaaCosto", 
-        "VentaNetaenUnidades", "VentaNetaenPesos", "RecibosCto", "RecibosPzs", "RecibosVta", 
-        "RebajaVta", "DevolProvCto", "DevolProvUni", "DevolProvVta", "InvFinUni", "InvFinCto", 
-        "InvFinVta", "TransfEntCto", "TransfEntUni", "TransfEntVta", "TransfSalCto", 
-        "TransfSalUni", "TransfSalVta", "VentaNetaenPesosAnt", "VentaNetaenUnidadesAnt", 
-        "MargenObtenidoInv", "MargenObtenidoVenta", "PVPCosto", "PVPVenta", "DifPesos", 
-        "DiferenciaMargen", "dow"
-    ]
-    
-    insert_query = f"""
-    INSERT INTO TESTING_2025 (
-        {', '.join(columnas)}
-    ) VALUES (
-        {', '.join(['%s'] * len(columnas))}
-    )
+        return True
+    print("Error al importar datos a Ninox.")
+    return False
+
+def construir_tuplas(registros, columnas=COLUMNAS_ALMACEN):
     """
-    
-    valores_a_insertar = []
-    for registro in registros:
-        campos = registro["fields"]
-        fila = tuple(campos.get(col) for col in columnas)
-        valores_a_insertar.append(fila)
-    
+    Arma una lista de tuplas con los valores en el orden definido por las columnas.
+    Un lote leído del archivo (esquema.LoteRegistros) se arma columna por columna
+    desde los valores convertidos; otra lista, registro por registro.
+    """
+    if isinstance(registros, LoteRegistros):
+        return registros.tuplas(columnas)
+    return [tuple(registro["fields"].get(col) for col in columnas) for registro in registros]
+
+def insertar_en_snowflake(registros, destino=None):
+    """
+    Inserta los registros en la tabla TESTING_2025 de Snowflake (o en el destino indicado).
+    El destino elige entre executemany() y la carga masiva según el tamaño del lote.
+    Si se recibe 'destino' se reutiliza su conexión y el commit queda a cargo de quien llama;
+    en caso contrario se abre una conexión propia y se hace commit al terminar.
+    Devuelve True si la inserción fue exitosa.
+    """
+    destino_propio = destino is None
+    if destino_propio:
+        destino = DestinoSnowflake()
     try:
-        conn = snowflake.connector.connect(**CONFIG["snowflake"])
-        cursor = conn.cursor()
-        cursor.executemany(insert_query, valores_a_insertar)
-        conn.commit()
-        print("Datos insertados correctamente en Snowflake.")
-    except snowflake.connector.errors.Error as e:
+        if destino_propio:
+            destino.conectar()
+        destino.insertar(construir_tuplas(registros, destino.columnas))
+        if destino_propio:
+            destino.confirmar()
+            print("Datos insertados correctamente en Snowflake.")
+        return True
+    except destino.errores as e:
         print("Error al insertar en Snowflake:", e)
+        return False
     finally:
+        if destino_propio:
+            try:
+                destino.cerrar()
+            except Exception:
+                pass
+
+def fusionar_en_almacen(registros, destino, claves=CLAVE_NEGOCIO):
+    """
+    Aplica los registros sobre TESTING_2025 con MERGE por la clave de negocio
+    (actualiza los existentes e inserta los nuevos). Devuelve True si fue exitoso.
+    """
+    try:
+        destino.fusionar(construir_tuplas(registros, destino.columnas), claves)
+        return True
+    except destino.errores as e:
+        print("Error al fusionar en Snowflake:", e)
+        return False
+
+def registro_ninox(registro, ninox_id):
+    """
+    Agrega el id de Ninox al registro para que la API lo actualice en lugar de crearlo.
+    """
+    if ninox_id is None:
+        return registro
+    return {"id": int(ninox_id) if str(ninox_id).isdigit() else ninox_id, "fields": registro["fields"]}
+
+class EtapaNinox(EtapaDestino):
+    """
+    Envía cada lote a Ninox. Un lote fallido no detiene los siguientes.
+    Con 'estado' sólo se envían las filas nuevas (se crean) o cambiadas
+    (se actualizan por su id de Ninox). Con 'punto_control' (un Manifiesto)
+    cada lote aceptado se confirma por su número y los ya confirmados en una
+    ejecución anterior no se vuelven a enviar.
+    """
+
+    nombre = "Ninox"
+
+    def __init__(self, subidor, timeout=TIMEOUT_NINOX, estado=None, punto_control=None):
+        super().__init__(timeout)
+        self.subidor = subidor
+        self.estado = estado
+        self.punto_control = punto_control
+        self.numero_lote = 0
+
+    def iniciar(self):
+        if self.estado is not None:
+            self.estado.iniciar("ninox")
+
+    def procesar(self, lote):
+        self.numero_lote += 1
+        if self.punto_control is None:
+            return self._enviar(lote)
+        if self.punto_control.lote_confirmado(self.nombre, self.numero_lote):
+            return True
+        exito = self._enviar(lote)
+        if exito:
+            self.punto_control.confirmar_lote(self.nombre, self.numero_lote)
+        return exito
+
+    def _enviar(self, lote):
+        if self.estado is None:
+            return enviar_a_api(lote, subidor=self.subidor)
+        filas = self.estado.delta("ninox", lote)
+        if not filas:
+            return True
+        resultados = self.subidor.enviar([registro_ninox(registro, ninox_id)
+                                          for registro, _, _, ninox_id in filas])
+        inicio = 0
+        for r in resultados:
+            fin = inicio + r.registros
+            if r.ok:
+                self.estado.registrar_ninox(filas[inicio:fin], r.ids or [None] * r.registros)
+            inicio = fin
+        return all(r.ok for r in resultados)
+
+    def finalizar(self, exito):
+        self.subidor.cerrar()
+        if exito and self.punto_control is not None:
+            self.punto_control.confirmar_destino(self.nombre)
+
+class EtapaAlmacen(EtapaDestino):
+    """
+    Inserta cada lote en el almacén y confirma todo en una sola transacción
+    al final; si un lote falla se hace rollback y no se insertan los siguientes.
+    Con 'estado' sólo se fusionan (MERGE) las filas nuevas o cambiadas y sus
+    hashes se confirman en el estado después del commit. Los resúmenes
+    [(Resumen, filas)] se fusionan en sus tablas antes del commit, en la misma
+    transacción que el detalle. Las tablas (de resúmenes y delta) se crean
+    en iniciar(), antes del primer lote: en Snowflake el DDL confirma la
+    transacción abierta y el rollback ya no podría deshacer los lotes.
+    Con 'punto_control' el destino se confirma completo después del commit.
+    """
+
+    nombre = "Snowflake"
+
+    def __init__(self, destino, timeout=TIMEOUT_ALMACEN, estado=None, resumenes=None,
+                 punto_control=None):
+        super().__init__(timeout)
+        self.destino = destino
+        self.estado = estado
+        self.resumenes = resumenes or []
+        self.punto_control = punto_control
+        self.exito = True
+        self.destinos_resumen = []
+
+    def iniciar(self):
+        self.destino.conectar()
+        if self.estado is not None:
+            self.estado.iniciar("almacen")
+            self.destino.crear_tabla_delta(self.estado.clave_negocio)
+        for resumen, filas in self.resumenes:
+            destino = self.destino.para_tabla(resumen.tabla, resumen.columnas)
+            destino.crear_tabla(resumen.tipos)
+            destino.crear_tabla_delta(resumen.claves)
+            self.destinos_resumen.append((resumen, destino, filas))
+
+    def procesar(self, lote):
+        if not self.exito:
+            return False
+        if self.estado is None:
+            self.exito = insertar_en_snowflake(lote, destino=self.destino)
+            return self.exito
+        filas = self.estado.delta("almacen", lote)
+        if filas:
+            # Si todo el lote cambió (primera carga o recarga completa) delta() lo
+            # devuelve completo y en orden: se fusiona el lote para armar las tuplas por columna
+            registros = lote if len(filas) == len(lote) else [registro for registro, _, _, _ in filas]
+            self.exito = fusionar_en_almacen(registros, self.destino, self.estado.clave_negocio)
+            if self.exito:
+                self.estado.marcar_pendiente("almacen", filas)
+        return self.exito
+
+    def cargar_resumenes(self):
+        for resumen, destino, filas in self.destinos_resumen:
+            if filas:
+                destino.fusionar(filas, resumen.claves)
+            print(f"Resumen {resumen.nombre}: {len(filas)} filas en {resumen.tabla}")
+
+    def finalizar(self, exito):
+        error_resumenes = None
         try:
-            cursor.close()
-            conn.close()
-        except Exception:
-            pass
+            if self.destino.conn is not None:
+                if exito and self.resumenes:
+                    try:
+                        self.cargar_resumenes()
+                    except self.destino.errores as e:
+                        print("Error al cargar los resúmenes:", e)
+                        exito, error_resumenes = False, e
+                if exito:
+                    self.destino.confirmar()
+                    if self.estado is not None:
+                        self.estado.confirmar("almacen")
+                    if self.punto_control is not None:
+                        self.punto_control.confirmar_destino(self.nombre)
+                    print("Datos insertados correctamente en Snowflake.")
+                else:
+                    self.destino.revertir()
+                    print("Se revirtió la inserción en Snowflake.")
+        finally:
+            if self.estado is not None:
+                self.estado.descartar("almacen")
+            self.destino.cerrar()
+        if error_resumenes is not None:
+            raise RuntimeError(f"resúmenes: {error_resumenes}")
+
+def cargar_por_lotes(ruta_csv, tamano_lote=TAMANO_LOTE, destino=None, subidor=None,
+                     timeout_ninox=TIMEOUT_NINOX, timeout_almacen=TIMEOUT_ALMACEN,
+                     incremental=CARGA_INCREMENTAL, completo=False, estado=None,
+                     con_resumenes=resumenes.RESUMENES, punto_control=None):
+    """
+    Envía el archivo procesado (CSV, Arrow o Parquet) lote por lote a Ninox y al
+    almacén al mismo tiempo: cada uno en su propio hilo, con su propia pasada
+    por el archivo y su propio límite de tiempo, así que uno lento no frena al otro.
+    La memoria usada depende del tamaño del lote y no del número de filas.
+    En modo incremental sólo se envían las filas nuevas o cambiadas según el
+    estado local; con completo=True se reenvían todas y se reconstruye el estado.
+    Con con_resumenes se cargan también los resúmenes escritos junto al archivo.
+    Con punto_control (un manifiesto.Manifiesto ya iniciado con iniciar_carga)
+    se omiten los destinos y lotes de Ninox que ya confirmó una ejecución anterior.
+    Devuelve (total_registros, resultados) con un ResultadoDestino por destino.
+    """
+    if destino is None:
+        destino = DestinoSnowflake()
+    if subidor is None:
+        subidor = crear_subidor_ninox()
+    estado_propio = incremental and estado is None
+    if estado_propio:
+        estado = EstadoIncremental(completo=completo)
+    resumenes_leidos = resumenes.leer_resumenes(ruta_csv) if con_resumenes else None
+    etapas = [EtapaNinox(subidor, timeout_ninox, estado, punto_control),
+              EtapaAlmacen(destino, timeout_almacen, estado, resumenes_leidos, punto_control)]
+    if punto_control is not None:
+        confirmadas = [e for e in etapas if punto_control.destino_completo(e.nombre)]
+        for etapa in confirmadas:
+            print(f"{etapa.nombre}: ya confirmado en el manifiesto, se omite.")
+            if isinstance(etapa, EtapaNinox):
+                subidor.cerrar()
+        etapas = [e for e in etapas if e not in confirmadas]
+        if not etapas:
+            if estado_propio:
+                estado.cerrar()
+            return 0, []
+
+    def lotes(etapa):
+        # Cada destino lee el archivo por su cuenta y a su ritmo
+        for numero_lote, lote in enumerate(leer_por_lotes(ruta_csv, tamano_lote), start=1):
+            print(f"{etapa.nombre} - lote {numero_lote}: {len(lote)} registros")
+            yield lote
+
+    with telemetria.span("carga.distribucion", lote=tamano_lote, incremental=estado is not None) as s, \
+            telemetria.MedicionMemoria() as memoria:
+        resultados, segundos = distribuir_lotes(lotes, etapas)
+        total_registros = max((r.registros for r in resultados), default=0)
+        s.agregar(filas=total_registros)
+    for r in resultados:
+        telemetria.registrar("carga.destino", r.segundos, destino=r.nombre, estado=r.estado,
+                             lotes=r.lotes, registros=r.registros, ok=r.estado == "ok")
+    # Un destino vencido puede seguir usando el estado desde su hilo
+    if estado_propio and all(r.estado != "timeout" for r in resultados):
+        estado.cerrar()
+
+    print(f"Registros procesados: {total_registros}")
+    if estado is not None:
+        for linea in estado.resumen():
+            print("Incremental ->", linea)
+    for linea in subidor.resumen():
+        print("API Ninox ->", linea)
+    for linea in destino.resumen():
+        print("Almacén ->", linea)
+    for linea in resumen_distribucion(resultados, segundos):
+        print("Destinos ->", linea)
+    print(f"Pico de memoria (RSS) durante la carga: {memoria.pico_mb:.1f} MB")
+    return total_registros, resultados
 
 def main():
-    if len(sys.argv) > 1:
-        ruta_csv = sys.argv[1]
-    else:
-        ruta_csv = r"descargas\e_06032025_508.csv"
+    parser = argparse.ArgumentParser(description="Carga el CSV procesado en Ninox y Snowflake.")
+    parser.add_argument("ruta_csv", nargs="?", default=r"descargas\e_06032025_508.csv",
+                        help="Archivo procesado: .csv, .arrow o .parquet.")
+    parser.add_argument("--lote", type=int, default=TAMANO_LOTE,
+                        help="Número de registros por lote (por defecto %(default)s).")
+    parser.add_argument("--destino", default="snowflake",
+                        help="'snowflake' o 'sqlite:<ruta>' para probar contra una base local.")
+    parser.add_argument("--modo", choices=MODOS, default="auto",
+                        help="Modo de inserción en el almacén (por defecto %(default)s).")
+    parser.add_argument("--bloque-ninox", type=int, default=TAMANO_BLOQUE_NINOX,
+                        help="Registros por solicitud a Ninox (por defecto %(default)s).")
+    parser.add_argument("--concurrencia-ninox", type=int, default=CONCURRENCIA_NINOX,
+                        help="Solicitudes simultáneas a Ninox (por defecto %(default)s).")
+    parser.add_argument("--timeout-ninox", type=float, default=TIMEOUT_NINOX,
+                        help="Segundos máximos para la carga en Ninox (por defecto %(default)s).")
+    parser.add_argument("--timeout-almacen", type=float, default=TIMEOUT_ALMACEN,
+                        help="Segundos máximos para la carga en el almacén (por defecto %(default)s).")
+    parser.add_argument("--full", action="store_true",
+                        help="Recarga completa: reenvía todas las filas aunque no hayan cambiado.")
+    parser.add_argument("--sin-estado", action="store_true",
+                        help="Inserta todas las filas sin MERGE ni estado incremental.")
+    args = parser.parse_args()
+    ruta_csv = args.ruta_csv
     
     print("Verificando ruta CSV...")
     print("Ruta CSV:", ruta_csv)
     
-    try:
-        registros = leer_csv(ruta_csv)
-    except Exception as e:
-        print("Error leyendo el CSV:", e)
+    if not os.path.exists(ruta_csv):
+        print("Error leyendo el CSV: no existe el archivo", ruta_csv)
         return
 
-    print("Enviando registros a Ninox...")
-    enviar_a_api(registros)
-    
-    print("Insertando registros en Snowflake...")
-    insertar_en_snowflake(registros)
+    try:
+        destino = crear_destino(args.destino, modo=args.modo)
+        subidor = crear_subidor_ninox(tamano_bloque=args.bloque_ninox,
+                                      concurrencia=args.concurrencia_ninox)
+        cargar_por_lotes(ruta_csv, args.lote, destino, subidor,
+                         timeout_ninox=args.timeout_ninox or None,
+                         timeout_almacen=args.timeout_almacen or None,
+                         incremental=not args.sin_estado, completo=args.full)
+    except Exception as e:
+        print("Error durante la carga:", e)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,143 @@
+"""
+Generador de exportaciones sintéticas de chedlink.
+
+Escribe un CSV con el mismo formato que la exportación del reporte (las 39
+columnas de esquema.COLUMNAS_EXPORTACION, encoding latin1): claves y fechas
+con la forma ="..." sin comillas alrededor, como las escribe chedlink
+(csv.writer las encerraría entre comillas y duplicaría las internas), fechas
+DD/MM/YYYY, departamentos con acentos, márgenes con '%' y una fracción de
+filas con el NP 3285317 que la transformación descarta. Sirve para medir el
+pipeline sin entrar al portal.
+
+Las filas se generan con numpy por bloques, así que escala de 10 mil a 10
+millones de filas con memoria acotada. Con la misma semilla el archivo es
+siempre el mismo.
+
+Uso:
+    python sintetico.py salida.csv --filas 1000000 [--semilla 0] [--dias 7]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from esquema import COLUMNAS_EXPORTACION
+
+# NP que la transformación elimina
+NP_EXCLUIDO = "3285317"
+
+FILAS_POR_BLOQUE = 100_000
+
+DEPARTAMENTOS = [
+    "Ropa, Zapatería y Te (4)", "Abarrotes Comestibles (1)", "Perecederos (2)",
+    "Línea Blanca y Electrónica (3)", "Farmacia y Perfumería (5)", "Panadería y Tortillería (6)",
+    "Juguetería y Temporada (7)", "Mascotas y Jardinería (8)",
+]
+REGIONES = ["Centro", "Golfo", "Sureste", "Bajío", "Pacífico"]
+CAPAS = ["A", "B", "C", "Básicos", "Moda"]
+COMPRADORES = [f"Comprador {n}" for n in ("Martínez", "Hernández", "Gómez", "Peña", "Ávila", "Ibáñez")]
+
+# Columnas numéricas de la exportación: unidades (enteros) y montos (2 decimales)
+COLUMNAS_UNIDADES = {
+    "DevolProvUni", "InvFinUni", "RecibosPzs", "VentaNetaenUnidades", "TransfEntUni",
+    "TransfSalUni", "VentaNetaenUnidadesAnt", "DiasdeInventario",
+}
+COLUMNAS_PORCENTAJE = {"MargenObtenidoInv", "MargenObtenidoVenta"}
+
+# Columnas que chedlink exporta con la forma ="..."
+COLUMNAS_FORMULA = {"DiaFecha", "NP", "Sku", "NT"}
+
+def _como_formula(valores):
+    """
+    Da a los valores la forma ="..." con la que chedlink exporta claves y fechas.
+    """
+    return np.char.add(np.char.add('="', np.asarray(valores).astype(str)), '"')
+
+def _campo_csv(texto):
+    """
+    Escribe el campo como csv.writer con el dialecto 'excel': entre comillas
+    (y con las comillas duplicadas) sólo si contiene coma, comillas o saltos de línea.
+    """
+    if "," in texto or '"' in texto or "\n" in texto or "\r" in texto:
+        return '"' + texto.replace('"', '""') + '"'
+    return texto
+
+def _lineas(datos):
+    """
+    Líneas CSV del bloque: las columnas ="..." se escriben tal cual, sin
+    comillas alrededor, y las demás con el entrecomillado mínimo.
+    """
+    columnas = []
+    for col in COLUMNAS_EXPORTACION:
+        textos = [str(v) for v in datos[col].tolist()]
+        columnas.append(textos if col in COLUMNAS_FORMULA else [_campo_csv(t) for t in textos])
+    return [",".join(fila) for fila in zip(*columnas)]
+
+def generar_bloque(rng, filas, fechas, fraccion_excluida=0.02, tiendas=300):
+    """
+    Devuelve un diccionario columna -> arreglo con 'filas' filas sintéticas.
+    """
+    tienda = rng.integers(1, tiendas + 1, filas)
+    departamento = rng.integers(0, len(DEPARTAMENTOS), filas)
+    np_ = rng.integers(1_000_000, 9_999_999, filas).astype(str)
+    np_[rng.random(filas) < fraccion_excluida] = NP_EXCLUIDO
+
+    datos = {
+        "DiaFecha": _como_formula(np.asarray(fechas)[rng.integers(0, len(fechas), filas)]),
+        "NP": _como_formula(np_),
+        "Sku": _como_formula(rng.integers(1, 99_999_999, filas)),
+        "Region": np.asarray(REGIONES)[tienda % len(REGIONES)],
+        "Distrito": np.char.add("Distrito ", (tienda // 10).astype(str)),
+        "NT": _como_formula(tienda),
+        "Tienda": np.char.add("Tienda Chedraui ", tienda.astype(str)),
+        "SubDepto": np.char.add("SubDepto ", rng.integers(1, 40, filas).astype(str)),
+        "Depto": np.asarray(DEPARTAMENTOS)[departamento],
+        "Clase": np.char.add("Clase ", rng.integers(1, 200, filas).astype(str)),
+        "SubClase": np.char.add("SubClase ", rng.integers(1, 800, filas).astype(str)),
+        "Capa": np.asarray(CAPAS)[rng.integers(0, len(CAPAS), filas)],
+        "Comprador": np.asarray(COMPRADORES)[departamento % len(COMPRADORES)],
+    }
+    for col in COLUMNAS_EXPORTACION:
+        if col in datos:
+            continue
+        if col in COLUMNAS_PORCENTAJE:
+            datos[col] = np.char.add(np.round(rng.normal(28, 12, filas), 2).astype(str), "%")
+        elif col in COLUMNAS_UNIDADES:
+            datos[col] = rng.integers(-2, 60, filas)
+        else:
+            datos[col] = np.round(rng.gamma(2.0, 450.0, filas) - 50, 2)
+    return datos
+
+def generar(ruta, filas, semilla=0, dias=7, fraccion_excluida=0.02, tiendas=300):
+    """
+    Escribe la exportación sintética en 'ruta' y devuelve el número de filas escritas.
+    """
+    rng = np.random.default_rng(semilla)
+    fechas = [f"{d:02d}/03/2025" for d in range(1, dias + 1)]
+    with open(ruta, "w", encoding="latin1", newline="") as f:
+        # La cabecera de chedlink trae sus propios nombres; script1 los reemplaza
+        f.write(",".join(['="Día"', '="NP"'] + COLUMNAS_EXPORTACION[2:]) + "\r\n")
+        escritas = 0
+        while escritas < filas:
+            n = min(FILAS_POR_BLOQUE, filas - escritas)
+            datos = generar_bloque(rng, n, fechas, fraccion_excluida, tiendas)
+            f.write("\r\n".join(_lineas(datos)) + "\r\n")
+            escritas += n
+    return escritas
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera una exportación sintética de chedlink.")
+    parser.add_argument("ruta", help="Archivo CSV de salida.")
+    parser.add_argument("--filas", type=int, default=100_000,
+                        help="Número de filas (por defecto %(default)s).")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--dias", type=int, default=7, help="Días distintos en DiaFecha.")
+    parser.add_argument("--excluidas", type=float, default=0.02,
+                        help=f"Fracción de filas con NP {NP_EXCLUIDO} (por defecto %(default)s).")
+    args = parser.parse_args()
+    inicio = time.perf_counter()
+    filas = generar(args.ruta, args.filas, args.semilla, args.dias, args.excluidas)
+    print(f"{filas} filas escritas en {args.ruta} en {time.perf_counter() - inicio:.1f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+Telemetría estructurada de las etapas del bot.
+
+Cada etapa se mide con un span (bloque 'with') que registra su duración, el
+pico de memoria (RSS) mientras la etapa estuvo abierta y los atributos que
+agregue la etapa (filas, bytes, estado HTTP, etc.). El pico se mide con un
+hilo que muestrea el RSS cada MUESTREO_MEMORIA segundos mientras haya alguna
+medición abierta: en un worker de Functions que vive varias ejecuciones, el
+máximo histórico del proceso (ru_maxrss) sólo repetiría el de la etapa más
+pesada que haya corrido antes. Las mediciones que ya se tomaron en otro
+lado, como la latencia de cada bloque de Ninox, se registran con registrar().
+
+Cada evento se emite por logging (logger 'telemetria') con los atributos en
+'custom_dimensions', que Application Insights guarda como customDimensions,
+y el mismo contenido en JSON dentro del mensaje. Con RUTA_TELEMETRIA se
+escriben además los eventos como líneas JSON en un archivo local (pruebas).
+
+Con TELEMETRIA=0 span() devuelve siempre el mismo objeto vacío y registrar()
+regresa de inmediato, así que el costo es una comparación por llamada.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+
+TELEMETRIA = os.environ.get("TELEMETRIA", "1") == "1"
+RUTA_TELEMETRIA = os.environ.get("RUTA_TELEMETRIA")
+# Segundos entre muestras del RSS mientras hay una medición de memoria abierta
+MUESTREO_MEMORIA = float(os.environ.get("MUESTREO_MEMORIA", "0.05"))
+
+logger = logging.getLogger("telemetria")
+
+def pico_memoria_mb():
+    """
+    Devuelve el pico de memoria residente (RSS) de toda la vida del proceso en MB.
+    Para el pico de una etapa se usa MedicionMemoria.
+    """
+    try:
+        import resource
+    except ImportError:
+        # Windows no tiene el módulo resource
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss está en bytes en macOS y en KB en Linux
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+_procesos = {}
+
+def memoria_mb():
+    """
+    Devuelve la memoria residente (RSS) actual del proceso en MB.
+    """
+    import psutil
+    pid = os.getpid()
+    # Un objeto por pid: después de un fork el hijo mide su propio proceso
+    if pid not in _procesos:
+        _procesos[pid] = psutil.Process(pid)
+    return _procesos[pid].memory_info().rss / (1024 * 1024)
+
+class _MuestreadorMemoria:
+    """
+    Hilo que muestrea el RSS y actualiza el pico de cada MedicionMemoria
+    abierta. Arranca con la primera medición y termina cuando no queda ninguna.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._abiertas = set()
+        self._hilo = None
+
+    def abrir(self, medicion):
+        medicion.pico_mb = memoria_mb()
+        with self._lock:
+            self._abiertas.add(medicion)
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._muestrear, name="muestreo-memoria",
+                                              daemon=True)
+                self._hilo.start()
+
+    def cerrar(self, medicion):
+        actual = memoria_mb()
+        with self._lock:
+            self._abiertas.discard(medicion)
+            medicion.pico_mb = max(medicion.pico_mb, actual)
+
+    def _muestrear(self):
+        while True:
+            with self._lock:
+                if not self._abiertas:
+                    self._hilo = None
+                    return
+            try:
+                actual = memoria_mb()
+            except Exception:
+                actual = 0.0
+            with self._lock:
+                for medicion in self._abiertas:
+                    medicion.pico_mb = max(medicion.pico_mb, actual)
+            time.sleep(MUESTREO_MEMORIA)
+
+_muestreador = _MuestreadorMemoria()
+
+class MedicionMemoria:
+    """
+    Pico de memoria residente (RSS) del proceso, en MB, mientras el bloque
+    'with' está abierto (pico_mb). Las mediciones pueden anidarse y abrirse
+    desde varios hilos; todas comparten un solo hilo de muestreo.
+    """
+
+    __slots__ = ("pico_mb",)
+
+    def __init__(self):
+        self.pico_mb = 0.0
+
+    def __enter__(self):
+        _muestreador.abrir(self)
+        return self
+
+    def __exit__(self, *exc):
+        _muestreador.cerrar(self)
+        return False
+
+class ExportadorJSON:
+    """
+    Agrega cada evento como una línea JSON al archivo indicado.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+
+    def __call__(self, evento):
+        linea = json.dumps(evento, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.ruta, "a", encoding="utf-8") as f:
+                f.write(linea + "\n")
+
+def _exportar_logging(evento):
+    logger.info("telemetria %s", json.dumps(evento, ensure_ascii=False, default=str),
+                extra={"custom_dimensions": evento})
+
+_estado = threading.local()
+_exportadores = [_exportar_logging]
+_activo = TELEMETRIA
+_id_ejecucion = uuid.uuid4().hex
+
+if RUTA_TELEMETRIA:
+    _exportadores.append(ExportadorJSON(RUTA_TELEMETRIA))
+
+def configurar(activo=None, ruta_json=None, exportadores=None):
+    """
+    Cambia la configuración en tiempo de ejecución: activar o desactivar, agregar
+    un archivo JSON o reemplazar la lista de exportadores (funciones que reciben
+    cada evento como diccionario).
+    """
+    global _activo, _exportadores
+    if activo is not None:
+        _activo = activo
+    if exportadores is not None:
+        _exportadores = list(exportadores)
+    if ruta_json:
+        _exportadores.append(ExportadorJSON(ruta_json))
+
+def activa():
+    return _activo
+
+def nueva_ejecucion():
+    """
+    Genera un nuevo id de ejecución que se agrega a todos los eventos siguientes.
+    """
+    global _id_ejecucion
+    _id_ejecucion = uuid.uuid4().hex
+    return _id_ejecucion
+
+def _emitir(evento):
+    evento["ejecucion"] = _id_ejecucion
+    for exportador in _exportadores:
+        try:
+            exportador(evento)
+        except Exception:
+            # La telemetría nunca debe interrumpir el bot
+            pass
+
+def _pila():
+    pila = getattr(_estado, "pila", None)
+    if pila is None:
+        pila = _estado.pila = []
+    return pila
+
+class Span:
+    """
+    Mide un bloque 'with' y emite un evento al salir. El padre es el span
+    abierto más reciente del mismo hilo.
+    """
+
+    __slots__ = ("nombre", "atributos", "padre", "_inicio", "_memoria")
+
+    def __init__(self, nombre, atributos):
+        self.nombre = nombre
+        self.atributos = atributos
+        self.padre = None
+        self._inicio = None
+        self._memoria = MedicionMemoria()
+
+    def agregar(self, **atributos):
+        self.atributos.update(atributos)
+
+    def __enter__(self):
+        pila = _pila()
+        self.padre = pila[-1].nombre if pila else None
+        pila.append(self)
+        self._memoria.__enter__()
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        segundos = time.perf_counter() - self._inicio
+        self._memoria.__exit__(tipo, valor, traza)
+        pila = _pila()
+        if pila and pila[-1] is self:
+            pila.pop()
+        evento = {"evento": "span", "nombre": self.nombre, "padre": self.padre,
+                  "segundos": round(segundos, 4), "pico_memoria_mb": round(self._memoria.pico_mb, 1)}
+        if tipo is not None:
+            evento["error"] = f"{tipo.__name__}: {valor}"
+        evento.update(self.atributos)
+        evento.setdefault("ok", tipo is None)
+        _emitir(evento)
+        return False
+
+class _SpanNulo:
+    """
+    Span vacío que se devuelve cuando la telemetría está desactivada.
+    """
+
+    __slots__ = ()
+
+    def agregar(self, **atributos):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+SPAN_NULO = _SpanNulo()
+
+def span(nombre, **atributos):
+    """
+    Devuelve el span de una etapa para usar con 'with':
+
+        with telemetria.span("transformacion") as s:
+            ...
+            s.agregar(filas=n)
+    """
+    if not _activo:
+        return SPAN_NULO
+    return Span(nombre, atributos)
+
+def registrar(nombre, segundos, **atributos):
+    """
+    Emite una medición ya tomada (p. ej. la latencia de una solicitud).
+    """
+    if not _activo:
+        return
+    evento = {"evento": "medicion", "nombre": nombre, "segundos": round(segundos, 4)}
+    evento.update(atributos)
+    _emitir(evento)
+
+def leer_json(ruta):
+    """
+    Lee los eventos de un archivo escrito por ExportadorJSON.
+    """
+    with open(ruta, encoding="utf-8") as f:
+        return [json.loads(linea) for linea in f if linea.strip()]
@@ -0,0 +1,28 @@
+"""
+Configuración común de las pruebas.
+
+Los módulos del bot están en la raíz del repositorio. sk.py (los secretos)
+no se versiona: si no existe, las pruebas usan una configuración ficticia
+que no apunta a ningún servicio real.
+"""
+import importlib.util
+import os
+import sys
+import types
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+if importlib.util.find_spec("sk") is None:
+    sys.modules["sk"] = types.SimpleNamespace(CONFIG={
+        "ninox": {"url": "http://127.0.0.1:9/ninox", "headers": {}},
+        "snowflake": {},
+        "chedraui": {"USUARIO": "usuario", "PASSWORD": "clave"},
+    })
+
+def registro(dia="2025-03-01", sku=1, nt=10, **campos):
+    """
+    Registro {"fields": {...}} con la clave de negocio y los campos indicados.
+    """
+    return {"fields": {"DiaFecha": dia, "Sku": sku, "NT": nt, **campos}}
@@ -0,0 +1,25 @@
+"""
+Exportación sintética con el formato de chedlink y comparación contra la línea base.
+"""
+import benchmark
+import sintetico
+
+def test_formulas_sin_comillas(tmp_path):
+    ruta = tmp_path / "exportacion.csv"
+    sintetico.generar(str(ruta), 200, semilla=3)
+    lineas = ruta.read_bytes().decode("latin1").split("\r\n")
+    assert lineas[0].startswith('="Día",="NP",')
+    campos = lineas[1].split(",")
+    assert campos[0].startswith('="') and campos[0].endswith('"')
+    assert '"=""' not in ruta.read_text(encoding="latin1")
+
+def test_base_escalada_por_la_calibracion():
+    base = {"calibracion": 100.0, "etapas": {"tuplas": {"filas_por_segundo": 1000.0}}}
+    # Una máquina a la mitad de velocidad no es una regresión si rinde la mitad
+    mediciones = {"tuplas": {"filas_por_segundo": 500.0}}
+    escala = benchmark.escala_maquina(50.0, base)
+    assert escala == 0.5
+    assert benchmark.comparar_con_base(mediciones, base, 0.2, escala) == []
+    assert benchmark.comparar_con_base(mediciones, base, 0.2) != []
+    # Sin calibración en la base se compara sin escalar
+    assert benchmark.escala_maquina(50.0, {"etapas": {}}) == 1.0
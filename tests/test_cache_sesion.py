@@ -0,0 +1,119 @@
+"""
+Caché cifrado de la sesión de chedlink: un acierto evita el inicio de sesión;
+una sesión expirada, un archivo dañado o cifrado con otra clave vuelven a iniciarla.
+"""
+import time
+
+import pytest
+import requests
+
+import descarga_http
+import script1
+from cache_sesion import CacheSesion
+
+CONFIG = {"chedraui": {"USUARIO": "usuario", "PASSWORD": "clave"}}
+OTRA_CONFIG = {"chedraui": {"USUARIO": "usuario", "PASSWORD": "otra clave"}}
+
+def cookie(valor, **extra):
+    return {"name": "PHPSESSID", "value": valor, "domain": "chedlink.local", "path": "/", **extra}
+
+class PortalFalso:
+    """
+    Portal sin red: la validación acepta sólo la sesión vigente, el inicio de
+    sesión por HTTP entrega una nueva y la exportación escribe el CSV.
+    """
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+        self.vigente = "sesion-1"
+        self.logins = 0
+        self.exportaciones = []
+
+    def validar(self, cookies, url):
+        return any(c["value"] == self.vigente for c in cookies)
+
+    def iniciar_sesion_http(self, url, usuario, password, sesion=None):
+        self.logins += 1
+        self.vigente = f"sesion-{self.logins + 1}"
+        sesion = requests.Session()
+        sesion.cookies.set("PHPSESSID", self.vigente, domain="chedlink.local", path="/")
+        return sesion
+
+    def exportar_por_http(self, sesion, download_dir, clave, parametros=None):
+        self.exportaciones.append(sesion.cookies.get("PHPSESSID"))
+        ruta = self.directorio / "reporte.csv"
+        ruta.write_text("a,b\n1,2\n", encoding="latin1")
+        return str(ruta)
+
+@pytest.fixture
+def portal(tmp_path, monkeypatch):
+    falso = PortalFalso(tmp_path)
+    monkeypatch.setattr(CacheSesion, "validar", lambda cache, cookies, url: falso.validar(cookies, url))
+    monkeypatch.setattr(descarga_http, "iniciar_sesion_http", falso.iniciar_sesion_http)
+    monkeypatch.setattr(descarga_http, "url_exportacion", lambda *args, **kwargs: "http://chedlink.local/exportar")
+    monkeypatch.setattr(script1, "exportar_por_http", falso.exportar_por_http)
+    return falso
+
+@pytest.fixture
+def ruta(tmp_path):
+    return str(tmp_path / "cache" / "sesion.bin")
+
+def descargar(tmp_path, cache):
+    return script1.descargar_reporte(str(tmp_path / "descargas"), modo="auto", cache=cache)
+
+def test_guardar_y_cargar(ruta):
+    cache = CacheSesion(ruta, ttl=60, config=CONFIG)
+    cache.guardar([cookie("abc")])
+    assert CacheSesion(ruta, ttl=60, config=CONFIG).cargar() == [cookie("abc")]
+    assert b"abc" not in open(ruta, "rb").read()
+
+def test_acierto_no_inicia_sesion(tmp_path, portal, ruta):
+    cache = CacheSesion(ruta, ttl=60, config=CONFIG)
+    cache.guardar([cookie("sesion-1")], segundos_login=4.0)
+    assert descargar(tmp_path, cache)
+    assert portal.logins == 0 and portal.exportaciones == ["sesion-1"]
+    estadisticas = cache.estadisticas()
+    assert (estadisticas["aciertos"], estadisticas["fallos"]) == (1, 0)
+
+@pytest.mark.parametrize("vencida", ["ttl", "cookie"])
+def test_sesion_expirada_inicia_sesion(tmp_path, portal, ruta, vencida):
+    if vencida == "ttl":
+        CacheSesion(ruta, ttl=-1, config=CONFIG).guardar([cookie("sesion-1")])
+    else:
+        CacheSesion(ruta, ttl=60, config=CONFIG).guardar([cookie("sesion-1", expiry=time.time() - 5)])
+    cache = CacheSesion(ruta, ttl=60, config=CONFIG)
+    assert cache.cargar() is None
+
+    assert descargar(tmp_path, cache)
+    assert portal.logins == 1 and portal.exportaciones == ["sesion-2"]
+    # La sesión nueva queda en el caché para la siguiente ejecución
+    assert [c["value"] for c in cache.cargar()] == ["sesion-2"]
+    assert cache.estadisticas()["fallos"] == 1
+
+def test_sesion_rechazada_por_el_portal_inicia_sesion(tmp_path, portal, ruta):
+    cache = CacheSesion(ruta, ttl=60, config=CONFIG)
+    cache.guardar([cookie("sesion-0")])
+    assert descargar(tmp_path, cache)
+    assert portal.logins == 1 and portal.exportaciones == ["sesion-2"]
+
+@pytest.mark.parametrize("contenido", [b"", b"no es un token", b"gAAAAA" + b"x" * 80])
+def test_archivo_danado_inicia_sesion(tmp_path, portal, ruta, contenido):
+    cache = CacheSesion(ruta, ttl=60, config=CONFIG)
+    cache.guardar([cookie("sesion-1")])
+    with open(ruta, "wb") as f:
+        f.write(contenido)
+    assert cache.cargar() is None
+
+    assert descargar(tmp_path, cache)
+    assert portal.logins == 1
+    assert [c["value"] for c in cache.cargar()] == ["sesion-2"]
+
+def test_otra_clave_inicia_sesion(tmp_path, portal, ruta):
+    # Un caché cifrado con otras credenciales no se puede descifrar
+    CacheSesion(ruta, ttl=60, config=OTRA_CONFIG).guardar([cookie("sesion-1")])
+    cache = CacheSesion(ruta, ttl=60, config=CONFIG)
+    assert cache.cargar() is None
+
+    assert descargar(tmp_path, cache)
+    assert portal.logins == 1 and portal.exportaciones == ["sesion-2"]
+    assert [c["value"] for c in cache.cargar()] == ["sesion-2"]
@@ -0,0 +1,124 @@
+"""
+Espera de la descarga del CSV (script1.wait_for_csv_file) sobre un directorio local.
+"""
+import os
+import threading
+import time
+
+import pytest
+
+import script1
+
+@pytest.fixture(autouse=True)
+def esperas_cortas(monkeypatch):
+    monkeypatch.setattr(script1, "INTERVALO_SONDEO", 0.02)
+    monkeypatch.setattr(script1, "ESTABILIDAD_DESCARGA", 0.2)
+
+def escribir(ruta, contenido=b"a,b\n1,2\n", mtime=None):
+    with open(ruta, "wb") as f:
+        f.write(contenido)
+    if mtime is not None:
+        os.utime(ruta, (mtime, mtime))
+
+def en_segundo_plano(funcion, retraso):
+    hilo = threading.Timer(retraso, funcion)
+    hilo.start()
+    return hilo
+
+def test_devuelve_el_csv_nuevo(tmp_path):
+    escribir(tmp_path / "reporte.csv")
+    assert script1.wait_for_csv_file(str(tmp_path), timeout=2) == str(tmp_path / "reporte.csv")
+
+def test_ignora_los_archivos_que_ya_estaban(tmp_path):
+    inicio = time.time()
+    escribir(tmp_path / "anterior.csv")
+    escribir(tmp_path / "viejo.csv", mtime=inicio - 3600)
+    assert script1.wait_for_csv_file(str(tmp_path), timeout=0.5, creado_despues_de=inicio,
+                                     ignorar=["anterior.csv"]) is None
+
+    hilo = en_segundo_plano(lambda: escribir(tmp_path / "nuevo.csv"), 0.1)
+    ruta = script1.wait_for_csv_file(str(tmp_path), timeout=3, creado_despues_de=inicio,
+                                     ignorar=["anterior.csv"])
+    hilo.join()
+    assert ruta == str(tmp_path / "nuevo.csv")
+
+def test_crdownload_no_cuenta_como_terminado(tmp_path):
+    escribir(tmp_path / "reporte.csv")
+    escribir(tmp_path / "reporte.csv.crdownload")
+    # Mientras haya una descarga en curso no se devuelve ningún CSV
+    assert script1.wait_for_csv_file(str(tmp_path), timeout=0.5) is None
+
+    hilo = en_segundo_plano(lambda: os.remove(tmp_path / "reporte.csv.crdownload"), 0.2)
+    inicio = time.monotonic()
+    ruta = script1.wait_for_csv_file(str(tmp_path), timeout=3)
+    hilo.join()
+    assert ruta == str(tmp_path / "reporte.csv")
+    assert time.monotonic() - inicio >= 0.2 + script1.ESTABILIDAD_DESCARGA
+
+def test_no_devuelve_un_archivo_que_sigue_creciendo(tmp_path):
+    ruta = tmp_path / "reporte.csv"
+    escribir(ruta, b"a,b\n")
+    termino = []
+
+    def crecer():
+        for i in range(10):
+            time.sleep(0.05)
+            with open(ruta, "ab") as f:
+                f.write(f"{i},{i}\n".encode())
+        termino.append(time.monotonic())
+
+    hilo = threading.Thread(target=crecer)
+    hilo.start()
+    encontrado = script1.wait_for_csv_file(str(tmp_path), timeout=5)
+    devuelto = time.monotonic()
+    hilo.join()
+    assert encontrado == str(ruta)
+    assert termino and devuelto >= termino[0] + script1.ESTABILIDAD_DESCARGA * 0.9
+    assert ruta.read_bytes().count(b"\n") == 11
+
+def test_ignora_vacios_y_otras_extensiones(tmp_path):
+    escribir(tmp_path / "reporte.csv", b"")
+    escribir(tmp_path / "reporte.xlsx")
+    assert script1.wait_for_csv_file(str(tmp_path), timeout=0.5) is None
+
+class NavegadorFalso:
+    """
+    Driver mínimo para exportar_con_navegador: las esperas devuelven el propio
+    driver como elemento y el clic de descarga escribe el CSV.
+    """
+
+    def __init__(self, directorio, contenido):
+        self.directorio = directorio
+        self.page_source = contenido
+        self.switch_to = self
+        self.clics = 0
+
+    def get(self, url):
+        pass
+
+    def default_content(self):
+        pass
+
+    def click(self):
+        # El primer clic abre el menú de Excel; el segundo inicia la descarga
+        self.clics += 1
+        if self.clics == 2:
+            escribir(os.path.join(self.directorio, "reporte.csv"))
+
+def test_html_en_el_directorio_de_cada_reporte(tmp_path, monkeypatch):
+    from selenium.webdriver.support import ui
+    monkeypatch.setattr(ui.WebDriverWait, "until", lambda self, condicion: self._driver)
+    monkeypatch.setattr(script1, "esperar_pagina_lista", lambda driver, timeout=None: None)
+    monkeypatch.setattr(script1, "TIMEOUT_DESCARGA", 3)
+    monkeypatch.chdir(tmp_path)
+    directorios = [tmp_path / "ventas_norte", tmp_path / "ventas_sur"]
+    for directorio in directorios:
+        directorio.mkdir()
+        driver = NavegadorFalso(str(directorio), f"<html>{directorio.name}</html>")
+        ruta = script1.exportar_con_navegador(driver, str(directorio), clave="123")
+        assert ruta == str(directorio / "reporte.csv")
+    # Misma clave, distinto directorio: cada reporte conserva su propio HTML
+    for directorio in directorios:
+        html = directorio / "reporte_chedlink_123.html"
+        assert html.read_text(encoding="utf-8") == f"<html>{directorio.name}</html>"
+    assert not list(tmp_path.glob("*.html"))
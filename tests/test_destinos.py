@@ -0,0 +1,82 @@
+"""
+Contrato de los destinos del almacén contra SQLite.
+"""
+import sqlite3
+
+import pytest
+
+from destinos import DestinoSQLite, crear_destino
+
+COLUMNAS = ["DiaFecha", "Sku", "NT", "VentaNetaenPesos"]
+CLAVES = ["DiaFecha", "Sku", "NT"]
+
+def filas_tabla(destino, tabla=None):
+    return sorted(destino.conn.execute(
+        f"SELECT {', '.join(destino.columnas)} FROM {tabla or destino.tabla}").fetchall())
+
+@pytest.fixture
+def destino(tmp_path):
+    destino = DestinoSQLite(str(tmp_path / "almacen.db"), tabla="DETALLE", columnas=COLUMNAS,
+                            umbral_carga_masiva=3)
+    destino.conectar()
+    yield destino
+    destino.cerrar()
+
+def test_crear_destino():
+    assert isinstance(crear_destino("sqlite:"), DestinoSQLite)
+    with pytest.raises(ValueError):
+        crear_destino("otro")
+
+def test_modo_por_umbral_y_mismo_resultado(destino):
+    assert destino.insertar([("2025-03-01", 1, 10, 5.5)]) == "executemany"
+    assert destino.insertar([("2025-03-02", i, 10, None) for i in range(3)]) == "masiva"
+    assert filas_tabla(destino) == sorted(
+        [("2025-03-01", 1, 10, 5.5)] + [("2025-03-02", i, 10, None) for i in range(3)])
+    assert [linea.split(":")[0] for linea in destino.resumen()] == ["executemany", "masiva"]
+
+def test_revertir_descarta_lo_insertado(destino):
+    destino.insertar([("2025-03-01", 1, 10, 1.0)])
+    destino.confirmar()
+    destino.insertar([("2025-03-01", 2, 10, 2.0)])
+    destino.revertir()
+    assert filas_tabla(destino) == [("2025-03-01", 1, 10, 1.0)]
+
+def test_fusionar_actualiza_e_inserta(destino):
+    destino.crear_tabla_delta(CLAVES)
+    destino.fusionar([("2025-03-01", 1, 10, 1.0), ("2025-03-01", 2, 10, 2.0)], CLAVES)
+    destino.fusionar([("2025-03-01", 2, 10, 20.0), ("2025-03-01", 3, 10, 3.0)], CLAVES)
+    destino.confirmar()
+    assert filas_tabla(destino) == [("2025-03-01", 1, 10, 1.0), ("2025-03-01", 2, 10, 20.0),
+                                    ("2025-03-01", 3, 10, 3.0)]
+
+def test_fusionar_es_idempotente_con_claves_nulas(destino):
+    destino.crear_tabla_delta(CLAVES)
+    filas = [("2025-03-01", 1, None, 1.0), ("2025-03-01", 2, 10, 2.0)]
+    for _ in range(3):
+        destino.fusionar(filas, CLAVES)
+    destino.confirmar()
+    assert filas_tabla(destino) == filas
+
+def test_fusionar_sin_tabla_delta_falla(destino):
+    with pytest.raises(RuntimeError):
+        destino.fusionar([("2025-03-01", 1, 10, 1.0)], CLAVES)
+
+def test_fusion_revertida_no_deja_filas(tmp_path):
+    ruta = str(tmp_path / "almacen.db")
+    with DestinoSQLite(ruta, tabla="DETALLE", columnas=COLUMNAS) as destino:
+        destino.crear_tabla_delta(CLAVES)
+        destino.confirmar()
+        destino.fusionar([("2025-03-01", 1, 10, 1.0)], CLAVES)
+        destino.revertir()
+    assert sqlite3.connect(ruta).execute("SELECT COUNT(*) FROM DETALLE").fetchone() == (0,)
+
+def test_para_tabla_comparte_la_transaccion(destino):
+    resumen = destino.para_tabla("RESUMEN", ["DiaFecha", "Total"])
+    resumen.crear_tabla({"Total": "numero"})
+    resumen.crear_tabla_delta(["DiaFecha"])
+    assert resumen.conn is destino.conn
+    assert resumen.tabla_delta == "RESUMEN_DELTA" and destino.tabla_delta is None
+    resumen.fusionar([("2025-03-01", 7.0)], ["DiaFecha"])
+    destino.insertar([("2025-03-01", 1, 10, 1.0)])
+    destino.revertir()
+    assert filas_tabla(resumen) == [] and filas_tabla(destino) == []
@@ -0,0 +1,79 @@
+"""
+Distribución de lotes: cada destino lee a su ritmo y con su propio límite de tiempo.
+"""
+import threading
+import time
+
+from distribucion import EtapaDestino, distribuir_lotes
+
+LOTES = [[i] * 10 for i in range(20)]
+
+class Etapa(EtapaDestino):
+
+    def __init__(self, nombre, espera=0.0, timeout=None, falla_en=None):
+        super().__init__(timeout)
+        self.nombre = nombre
+        self.espera = espera
+        self.falla_en = falla_en
+        self.recibidos = []
+        self.fin = None
+        self.exito = None
+
+    def procesar(self, lote):
+        time.sleep(self.espera)
+        self.recibidos.append(lote)
+        return lote[0] != self.falla_en
+
+    def finalizar(self, exito):
+        self.exito = exito
+        self.fin = time.perf_counter()
+
+def abrir_lotes(etapa):
+    return iter(LOTES)
+
+def test_un_destino_lento_no_frena_al_rapido():
+    rapido, lento = Etapa("rapido"), Etapa("lento", espera=0.05)
+    inicio = time.perf_counter()
+    resultados, _ = distribuir_lotes(abrir_lotes, [rapido, lento])
+    assert [r.estado for r in resultados] == ["ok", "ok"]
+    assert rapido.recibidos == LOTES and lento.recibidos == LOTES
+    # El rápido termina mucho antes que el lento (20 x 0.05 s)
+    assert rapido.fin - inicio < 0.5 < lento.fin - inicio
+    assert resultados[0].registros == resultados[1].registros == 200
+
+def test_limite_de_tiempo_por_destino():
+    rapido, lento = Etapa("rapido"), Etapa("lento", espera=0.05, timeout=0.3)
+    resultados, _ = distribuir_lotes(abrir_lotes, [rapido, lento])
+    assert resultados[0].estado == "ok" and rapido.recibidos == LOTES
+    assert resultados[1].estado == "timeout"
+    # El hilo vencido deja el lote en curso y finaliza con exito=False
+    limite = time.perf_counter() + 2
+    while lento.fin is None and time.perf_counter() < limite:
+        time.sleep(0.01)
+    assert lento.exito is False and len(lento.recibidos) < len(LOTES)
+
+def test_lote_fallido_y_error_de_lectura():
+    falla = Etapa("falla", falla_en=3)
+    lectura_rota = Etapa("lectura")
+
+    def abrir(etapa):
+        yield from LOTES[:2]
+        if etapa is lectura_rota:
+            raise OSError("archivo truncado")
+        yield from LOTES[2:]
+
+    resultados, _ = distribuir_lotes(abrir, [falla, lectura_rota])
+    assert (resultados[0].estado, falla.exito, resultados[0].lotes) == ("error", False, 20)
+    assert (resultados[1].estado, resultados[1].error) == ("error", "archivo truncado")
+    assert lectura_rota.exito is False
+
+def test_cada_destino_en_su_hilo():
+    hilos = {}
+
+    class Registra(Etapa):
+        def procesar(self, lote):
+            hilos.setdefault(self.nombre, set()).add(threading.current_thread().name)
+            return True
+
+    distribuir_lotes(abrir_lotes, [Registra("a"), Registra("b")])
+    assert hilos == {"a": {"destino-a"}, "b": {"destino-b"}}
@@ -0,0 +1,140 @@
+"""
+Conversión por columna (esquema.ConvertidorRegistros) contra la conversión
+original fila por fila (convertir_fila): mismos valores y mismos tipos.
+"""
+import csv
+import time
+from datetime import datetime
+
+import pytest
+
+import intercambio
+import script1
+import sintetico
+from esquema import COLUMNAS_ALMACEN, COLUMNAS_PROCESADAS, tipo_columna
+
+# --- Conversión original de script2, fila por fila ---
+numeric_fields = [
+    "DevolProvCto", "DevolProvUni", "DevolProvVta", "InvFinCto", "InvFinUni", "InvFinVta",
+    "RebajaVta", "RecibosCto", "RecibosPzs", "RecibosVta", "VentaNetaaCosto",
+    "VentaNetaenPesos", "VentaNetaenUnidades", "TransfEntCto", "TransfEntUni", "TransfEntVta",
+    "TransfSalCto", "TransfSalUni", "TransfSalVta", "VentaNetaenPesosAnt", "VentaNetaenUnidadesAnt",
+    "PVPCosto", "PVPVenta", "MargenObtenidoInv", "MargenObtenidoVenta", "dow", "DiferenciaMargen", "DifPesos"
+]
+
+def parse_numeric(value):
+    if value is None or value.strip() == "":
+        return None
+    value = value.replace(",", "").replace("%", "").strip()
+    try:
+        num = float(value)
+        return int(num) if num.is_integer() else num
+    except ValueError:
+        return value
+
+def formatear_fecha(fecha_str):
+    if not fecha_str or fecha_str.strip() == "":
+        return None
+    try:
+        fecha = datetime.strptime(fecha_str.strip(), "%d/%m/%Y")
+        return fecha.strftime("%Y-%m-%d")
+    except ValueError:
+        return fecha_str.strip()
+
+def convertir_fila(row):
+    nuevos_campos = {}
+    for key, value in row.items():
+        if key == "DiaFecha":
+            nuevo_valor = formatear_fecha(value)
+        elif key in numeric_fields:
+            nuevo_valor = parse_numeric(value)
+        else:
+            nuevo_valor = value.strip() if value and value.strip() != "" else None
+        if nuevo_valor is not None:
+            nuevos_campos[key] = nuevo_valor
+    return {"fields": nuevos_campos}
+
+def registros_originales(ruta_csv):
+    with open(ruta_csv, encoding="latin1", newline="") as f:
+        return [convertir_fila(row) for row in csv.DictReader(f)]
+
+def con_tipos(registros):
+    """
+    Registros como listas de (campo, tipo, valor) para comparar también int contra float.
+    """
+    return [[(k, type(v), v) for k, v in r["fields"].items()] for r in registros]
+
+# Valores raros por tipo: separadores de miles, espacios, texto en columnas
+# numéricas, fechas que no son DD/MM/YYYY (ISO, sin ceros, inexistentes) y vacíos
+RAROS = {
+    "fecha": ["05/03/2025", "2025-03-05", "5/3/2025", "31/02/2025", " 07/03/2025 ", "", "sin fecha"],
+    "numero": ["1,234.50", " 12 ", "-3", "1e3", "abc", "", "0.0", "7.25", "-0.5", "N/D"],
+    "porcentaje": ["25.5%", "30%", "", "-4.25%", "x%", " 12.0 % "],
+    "texto": [" Perecederos ", "", "Línea Blanca (3)", "ÑÁ", "  "],
+}
+
+def escribir_procesado_raro(ruta, filas=60):
+    with open(ruta, "w", encoding="latin1", newline="") as f:
+        escritor = csv.writer(f)
+        escritor.writerow(COLUMNAS_PROCESADAS)
+        for i in range(filas):
+            fila = []
+            for j, col in enumerate(COLUMNAS_PROCESADAS):
+                tipo = tipo_columna(col)
+                valores = RAROS["numero" if tipo == "entero" else tipo]
+                fila.append(valores[(i + j) % len(valores)])
+            escritor.writerow(fila)
+
+@pytest.fixture(scope="module")
+def procesado(tmp_path_factory):
+    """
+    (CSV procesado, archivo Arrow) de una exportación sintética transformada.
+    """
+    directorio = tmp_path_factory.mktemp("procesado")
+    exportacion = str(directorio / "exportacion.csv")
+    sintetico.generar(exportacion, 3000, semilla=7)
+    arrow, _ = script1.transformar_archivo(exportacion, formato="arrow", con_resumenes=False)
+    return arrow[:-len(".arrow")] + ".csv", arrow
+
+def test_csv_procesado_igual_a_convertir_fila(procesado):
+    ruta_csv, _ = procesado
+    nuevos = [r for lote in intercambio.leer_registros_por_lotes(ruta_csv, 700) for r in lote]
+    assert con_tipos(nuevos) == con_tipos(registros_originales(ruta_csv))
+
+def test_archivo_arrow_igual_a_convertir_fila(procesado):
+    ruta_csv, ruta_arrow = procesado
+    nuevos = [r for lote in intercambio.leer_registros_por_lotes(ruta_arrow, 700) for r in lote]
+    assert con_tipos(nuevos) == con_tipos(registros_originales(ruta_csv))
+
+def test_valores_raros_igual_a_convertir_fila(tmp_path):
+    ruta = str(tmp_path / "raro.csv")
+    escribir_procesado_raro(ruta)
+    nuevos = [r for lote in intercambio.leer_registros_por_lotes(ruta, 17) for r in lote]
+    assert con_tipos(nuevos) == con_tipos(registros_originales(ruta))
+
+def test_tuplas_igual_a_las_de_los_registros(procesado):
+    for ruta in procesado:
+        for lote in intercambio.leer_registros_por_lotes(ruta, 1000):
+            esperadas = [tuple(r["fields"].get(col) for col in COLUMNAS_ALMACEN) for r in lote]
+            assert lote.tuplas() == esperadas
+
+def test_rendimiento_contra_convertir_fila(procesado):
+    """
+    La conversión por columna desde el archivo Arrow (lectura incluida) debe
+    ser bastante más rápida que convertir_fila sobre el CSV. Se compara una
+    razón y no filas por segundo para no depender de la máquina; la medición
+    de referencia (245 mil filas) es de unas 3.6 veces.
+    """
+    ruta_csv, ruta_arrow = procesado
+
+    def mejor_de(funcion, veces=3):
+        tiempos = []
+        for _ in range(veces):
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append(time.perf_counter() - inicio)
+        return min(tiempos)
+
+    original = mejor_de(lambda: registros_originales(ruta_csv))
+    por_columna = mejor_de(lambda: [len(l) for l in intercambio.leer_registros_por_lotes(ruta_arrow, 5000)])
+    assert original / por_columna >= 2.0, f"{original:.3f} s contra {por_columna:.3f} s"
@@ -0,0 +1,157 @@
+"""
+Estado incremental y carga por MERGE en el almacén (SQLite).
+"""
+import pytest
+
+import script2
+from destinos import DestinoSQLite
+from incremental import ClaveDuplicada, EstadoIncremental
+from tests.conftest import registro
+
+@pytest.fixture
+def estado(tmp_path):
+    estado = EstadoIncremental(str(tmp_path / "estado.sqlite"))
+    yield estado
+    estado.cerrar()
+
+def confirmar(estado, destino, filas):
+    estado.marcar_pendiente(destino, filas)
+    estado.confirmar(destino)
+
+def test_delta_solo_filas_nuevas_o_cambiadas(estado):
+    lote = [registro(sku=1, VentaNetaenPesos=10), registro(sku=2, VentaNetaenPesos=20)]
+    filas = estado.delta("almacen", lote)
+    assert [r for r, _, _, _ in filas] == lote
+    confirmar(estado, "almacen", filas)
+
+    assert estado.delta("almacen", lote) == []
+    estado.iniciar("almacen")
+    cambiado = [lote[0], registro(sku=2, VentaNetaenPesos=21)]
+    assert [r for r, _, _, _ in estado.delta("almacen", cambiado)] == [cambiado[1]]
+    # Cada destino lleva su propio estado
+    assert len(estado.delta("ninox", lote)) == 2
+
+def test_pendientes_descartados_se_vuelven_a_enviar(estado):
+    lote = [registro(sku=1)]
+    estado.marcar_pendiente("almacen", estado.delta("almacen", lote))
+    estado.descartar("almacen")
+    assert len(estado.delta("almacen", lote)) == 1
+
+def test_recarga_completa_devuelve_todo(tmp_path):
+    ruta = str(tmp_path / "estado.sqlite")
+    lote = [registro(sku=1)]
+    estado = EstadoIncremental(ruta)
+    confirmar(estado, "almacen", estado.delta("almacen", lote))
+    estado.cerrar()
+    completo = EstadoIncremental(ruta, completo=True)
+    assert len(completo.delta("almacen", lote)) == 1
+    completo.cerrar()
+
+def test_claves_repetidas_se_cuentan_aparte(tmp_path, capsys):
+    estado = EstadoIncremental(str(tmp_path / "estado.sqlite"), duplicadas="avisar")
+    lote = [registro(sku=1, VentaNetaenPesos=1), registro(sku=1, VentaNetaenPesos=2), registro(sku=2)]
+    filas = estado.delta("almacen", lote)
+    assert [r for r, _, _, _ in filas] == [lote[1], lote[2]]
+    assert estado.repetidas["almacen"] == 1 and estado.omitidas["almacen"] == 0
+    assert "repiten la clave de negocio" in capsys.readouterr().out
+    assert "1 con clave repetida" in estado.resumen()[0]
+    # Una clave de un lote anterior se reenvía aunque no haya cambiado, para que gane la última
+    anterior = [registro(sku=3, VentaNetaenPesos=1)]
+    confirmar(estado, "almacen", estado.delta("almacen", anterior))
+    estado.iniciar("almacen")
+    estado.delta("almacen", [registro(sku=3, VentaNetaenPesos=2)])
+    [(ultima, _, _, _)] = estado.delta("almacen", anterior)
+    assert ultima == anterior[0] and estado.repetidas["almacen"] == 2
+    estado.cerrar()
+
+def test_claves_repetidas_son_error_por_defecto(estado):
+    with pytest.raises(ClaveDuplicada):
+        estado.delta("almacen", [registro(sku=1), registro(sku=1)])
+
+def test_claves_repetidas_entre_lotes(estado):
+    estado.iniciar("almacen")
+    estado.delta("almacen", [registro(sku=1), registro(sku=2)])
+    # El otro destino lleva su propia cuenta
+    estado.delta("ninox", [registro(sku=1)])
+    with pytest.raises(ClaveDuplicada):
+        estado.delta("almacen", [registro(sku=3), registro(sku=2)])
+    # Una carga nueva empieza sin claves vistas
+    estado.iniciar("almacen")
+    assert len(estado.delta("almacen", [registro(sku=2)])) == 1
+
+def test_clave_de_negocio_validada(tmp_path):
+    with pytest.raises(ValueError):
+        EstadoIncremental(str(tmp_path / "estado.sqlite"), clave_negocio=("DiaFecha", "NoExiste"))
+
+def cargar(ruta_almacen, estado, lotes):
+    """
+    Carga los lotes en el almacén como lo hace cargar_por_lotes (EtapaAlmacen).
+    """
+    etapa = script2.EtapaAlmacen(DestinoSQLite(ruta_almacen), estado=estado)
+    etapa.iniciar()
+    exito = all([etapa.procesar(lote) for lote in lotes])
+    etapa.finalizar(exito)
+    return exito
+
+def contenido(ruta_almacen):
+    import sqlite3
+    return sorted(sqlite3.connect(ruta_almacen).execute(
+        "SELECT DiaFecha, Sku, NT, VentaNetaenPesos FROM TESTING_2025").fetchall())
+
+def test_merge_idempotente(tmp_path):
+    ruta = str(tmp_path / "almacen.db")
+    ruta_estado = str(tmp_path / "estado.sqlite")
+    lotes = [[registro(sku=i, VentaNetaenPesos=i) for i in range(3)],
+             [registro(sku=i, VentaNetaenPesos=i) for i in range(3, 5)]]
+    esperado = [("2025-03-01", i, 10, i) for i in range(5)]
+
+    estado = EstadoIncremental(ruta_estado)
+    assert cargar(ruta, estado, lotes)
+    assert contenido(ruta) == esperado
+    # La misma carga otra vez no envía nada
+    assert cargar(ruta, estado, lotes)
+    assert estado.enviadas["almacen"] == 5 and estado.omitidas["almacen"] == 5
+    estado.cerrar()
+
+    # Una recarga completa reenvía todo y el MERGE no duplica
+    estado = EstadoIncremental(ruta_estado, completo=True)
+    assert cargar(ruta, estado, lotes)
+    estado.cerrar()
+    assert contenido(ruta) == esperado
+
+    # Una fila cambiada se actualiza en su lugar
+    estado = EstadoIncremental(ruta_estado)
+    lotes[1][0] = registro(sku=3, VentaNetaenPesos=30)
+    assert cargar(ruta, estado, lotes)
+    assert estado.enviadas["almacen"] == 1
+    estado.cerrar()
+    assert contenido(ruta) == esperado[:3] + [("2025-03-01", 3, 10, 30), esperado[4]]
+
+def test_clave_repetida_revierte_la_carga(tmp_path):
+    ruta = str(tmp_path / "almacen.db")
+    estado = EstadoIncremental(str(tmp_path / "estado.sqlite"))
+    etapa = script2.EtapaAlmacen(DestinoSQLite(ruta), estado=estado)
+    etapa.iniciar()
+    assert etapa.procesar([registro(sku=1), registro(sku=2)])
+    with pytest.raises(ClaveDuplicada):
+        etapa.procesar([registro(sku=2, VentaNetaenPesos=5)])
+    etapa.finalizar(False)
+    assert contenido(ruta) == []
+    estado.cerrar()
+
+def test_merge_revertido_no_confirma_el_estado(tmp_path, monkeypatch):
+    ruta = str(tmp_path / "almacen.db")
+    estado = EstadoIncremental(str(tmp_path / "estado.sqlite"))
+    lotes = [[registro(sku=1)], [registro(sku=2)]]
+    originales = script2.fusionar_en_almacen
+    llamadas = []
+
+    def falla_el_segundo(registros, destino, claves):
+        llamadas.append(registros)
+        return originales(registros, destino, claves) if len(llamadas) == 1 else False
+    monkeypatch.setattr(script2, "fusionar_en_almacen", falla_el_segundo)
+    assert not cargar(ruta, estado, lotes)
+    assert contenido(ruta) == []
+    # Como no se confirmó nada, la siguiente carga envía las dos filas
+    assert len(estado.delta("almacen", lotes[0] + lotes[1])) == 2
+    estado.cerrar()
@@ -0,0 +1,31 @@
+"""
+Modo de aislamiento del lanzador: las opciones llegan al subproceso de la carga.
+"""
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+import lanzador
+
+@pytest.fixture
+def comandos(monkeypatch):
+    comandos = []
+
+    def ejecutar(comando, **kwargs):
+        comandos.append(comando)
+        salida = "Archivo procesado guardado como: /tmp/e_01032025_10.arrow\n"
+        return SimpleNamespace(returncode=0, stdout=salida, stderr="")
+
+    monkeypatch.setattr(subprocess, "run", ejecutar)
+    return comandos
+
+@pytest.mark.parametrize("argumentos, esperado", [
+    ([], [sys.executable, "script2.py", "/tmp/e_01032025_10.arrow"]),
+    (["--full"], [sys.executable, "script2.py", "/tmp/e_01032025_10.arrow", "--full"]),
+])
+def test_full_llega_a_script2(comandos, monkeypatch, argumentos, esperado):
+    monkeypatch.setattr(sys, "argv", ["lanzador.py", "--subproceso", *argumentos])
+    lanzador.main()
+    assert comandos == [[sys.executable, "script1.py"], esperado]
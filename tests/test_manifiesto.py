@@ -0,0 +1,171 @@
+"""
+Reanudación con el manifiesto: una ejecución que se detuvo a la mitad sigue
+desde la última etapa o lote terminado, y una entrada cambiada empieza de nuevo.
+"""
+import csv
+from types import SimpleNamespace
+
+import pytest
+
+import pipeline
+import script1
+import script2
+from destinos import DestinoSQLite
+from esquema import COLUMNAS_PROCESADAS
+from manifiesto import Manifiesto
+
+FECHA = "2025-03-01"
+
+class EtapasFalsas:
+    """
+    Reemplaza la descarga, la transformación y la carga por funciones que
+    escriben archivos locales y cuentan sus llamadas.
+    """
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+        self.llamadas = []
+        self.carga_ok = True
+        self.descargas = 0
+
+    def descargar_reporte(self, download_dir=None, **kwargs):
+        self.llamadas.append("extraccion")
+        # Cada descarga trae datos nuevos del portal
+        self.descargas += 1
+        ruta = self.directorio / "exportacion.csv"
+        ruta.write_text(f"a,b\n{self.descargas},2\n", encoding="latin1")
+        return str(ruta)
+
+    def transformar_archivo(self, ruta_csv, **kwargs):
+        self.llamadas.append("transformacion")
+        ruta = self.directorio / "procesado.csv"
+        ruta.write_text(open(ruta_csv, encoding="latin1").read().upper(), encoding="latin1")
+        return str(ruta), 1
+
+    def cargar_por_lotes(self, ruta, punto_control=None, **kwargs):
+        self.llamadas.append("carga")
+        estado = "ok" if self.carga_ok else "error"
+        return 1, [SimpleNamespace(nombre="Ninox", estado=estado, error=None)]
+
+@pytest.fixture
+def etapas(tmp_path, monkeypatch):
+    falsas = EtapasFalsas(tmp_path)
+    directorio = str(tmp_path / "manifiestos")
+    monkeypatch.setattr(pipeline, "PRECARGA_BIBLIOTECAS", False)
+    monkeypatch.setattr(pipeline, "Manifiesto", SimpleNamespace(
+        abrir=lambda reporte: Manifiesto.abrir(reporte, FECHA, directorio)))
+    monkeypatch.setattr(script1, "descargar_reporte", falsas.descargar_reporte)
+    monkeypatch.setattr(script1, "transformar_archivo", falsas.transformar_archivo)
+    monkeypatch.setattr(script2, "cargar_por_lotes", falsas.cargar_por_lotes)
+    return falsas
+
+def test_reanuda_desde_la_ultima_etapa_terminada(etapas):
+    etapas.carga_ok = False
+    assert not pipeline.ejecutar(reanudar=True).ok
+    assert etapas.llamadas == ["extraccion", "transformacion", "carga"]
+
+    etapas.llamadas.clear()
+    etapas.carga_ok = True
+    resultado = pipeline.ejecutar(reanudar=True)
+    assert resultado.ok
+    assert etapas.llamadas == ["carga"]
+    assert [e.detalle.get("reanudada", False) for e in resultado.etapas] == [True, True, False]
+
+    # Terminada la ejecución, la siguiente del mismo día empieza un manifiesto nuevo
+    etapas.llamadas.clear()
+    assert pipeline.ejecutar(reanudar=True).ok
+    assert etapas.llamadas == ["extraccion", "transformacion", "carga"]
+
+def test_exportacion_cambiada_empieza_de_nuevo(etapas, tmp_path):
+    etapas.carga_ok = False
+    pipeline.ejecutar(reanudar=True)
+    (tmp_path / "exportacion.csv").write_text("a,b\n3,4\n", encoding="latin1")
+
+    etapas.llamadas.clear()
+    pipeline.ejecutar(reanudar=True)
+    assert etapas.llamadas == ["extraccion", "transformacion", "carga"]
+
+def test_procesado_cambiado_se_vuelve_a_transformar(etapas, tmp_path):
+    etapas.carga_ok = False
+    pipeline.ejecutar(reanudar=True)
+    (tmp_path / "procesado.csv").write_text("otro contenido\n", encoding="latin1")
+
+    etapas.llamadas.clear()
+    pipeline.ejecutar(reanudar=True)
+    assert etapas.llamadas == ["transformacion", "carga"]
+
+def test_reanudar_desactivado_repite_todo(etapas):
+    etapas.carga_ok = False
+    pipeline.ejecutar(reanudar=True)
+    etapas.llamadas.clear()
+    pipeline.ejecutar(reanudar=False)
+    assert etapas.llamadas == ["extraccion", "transformacion", "carga"]
+
+# --- Lotes de la carga ---
+
+class SubidorFalso:
+    """
+    Subidor de Ninox que registra los SKU de cada envío y falla en los lotes indicados.
+    """
+
+    def __init__(self, fallar=()):
+        self.fallar = set(fallar)
+        self.enviados = []
+
+    def enviar(self, registros):
+        numero = len(self.enviados) + 1
+        self.enviados.append([r["fields"]["Sku"] for r in registros])
+        return [SimpleNamespace(ok=numero not in self.fallar, registros=len(registros), ids=None)]
+
+    def cerrar(self):
+        pass
+
+    def resumen(self):
+        return []
+
+def escribir_procesado(ruta, filas):
+    with open(ruta, "w", encoding="latin1", newline="") as f:
+        escritor = csv.DictWriter(f, COLUMNAS_PROCESADAS)
+        escritor.writeheader()
+        for sku in range(1, filas + 1):
+            escritor.writerow({"DiaFecha": "01/03/2025", "Sku": str(sku), "NT": "10"})
+
+def cargar(ruta, manifiesto, subidor, almacen):
+    manifiesto.iniciar_carga("sha-procesado", 2)
+    destino = DestinoSQLite(almacen)
+    _, resultados = script2.cargar_por_lotes(ruta, tamano_lote=2, destino=destino, subidor=subidor,
+                                             incremental=False, con_resumenes=False,
+                                             punto_control=manifiesto)
+    return {r.nombre: r.estado for r in resultados}
+
+def test_carga_reanuda_los_lotes_pendientes(tmp_path):
+    ruta = str(tmp_path / "procesado.csv")
+    escribir_procesado(ruta, 6)
+    directorio = str(tmp_path / "manifiestos")
+    almacen = str(tmp_path / "almacen.sqlite")
+
+    primero = SubidorFalso(fallar={2})
+    manifiesto = Manifiesto.abrir("ventas", FECHA, directorio)
+    estados = cargar(ruta, manifiesto, primero, almacen)
+    assert estados["Ninox"] != "ok" and estados["Snowflake"] == "ok"
+    assert primero.enviados == [["1", "2"], ["3", "4"], ["5", "6"]]
+
+    # La siguiente ejecución sólo envía a Ninox el lote que falló y no repite el almacén
+    segundo = SubidorFalso()
+    manifiesto = Manifiesto.abrir("ventas", FECHA, directorio)
+    estados = cargar(ruta, manifiesto, segundo, almacen)
+    assert estados == {"Ninox": "ok"}
+    assert segundo.enviados == [["3", "4"]]
+    assert manifiesto.destino_completo("Ninox") and manifiesto.destino_completo("Snowflake")
+
+def test_carga_de_otro_archivo_empieza_de_nuevo(tmp_path):
+    directorio = str(tmp_path / "manifiestos")
+    manifiesto = Manifiesto.abrir("ventas", FECHA, directorio)
+    manifiesto.iniciar_carga("sha-anterior", 2)
+    manifiesto.confirmar_lote("Ninox", 1)
+    manifiesto.confirmar_destino("Snowflake")
+
+    manifiesto = Manifiesto.abrir("ventas", FECHA, directorio)
+    manifiesto.iniciar_carga("sha-nuevo", 2)
+    assert not manifiesto.lote_confirmado("Ninox", 1)
+    assert not manifiesto.destino_completo("Snowflake")
@@ -0,0 +1,140 @@
+"""
+SubidorNinox contra un servidor HTTP local: bloques, reintentos y compresión.
+"""
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from ninox import SubidorNinox
+
+class ServidorNinox:
+    """
+    Servidor local que responde como la API de Ninox: un array con un id por
+    registro. 'respuestas' es una lista de códigos que se usan (uno por
+    solicitud, en orden) antes de responder 200; 'rechazar_gzip' responde 400
+    a los cuerpos comprimidos.
+    """
+
+    def __init__(self, respuestas=(), rechazar_gzip=False):
+        self.respuestas = list(respuestas)
+        self.rechazar_gzip = rechazar_gzip
+        self.solicitudes = []
+        self._lock = threading.Lock()
+        self._siguiente_id = 0
+        servidor = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                cuerpo = self._leer_cuerpo()
+                comprimido = self.headers.get("Content-Encoding") == "gzip"
+                with servidor._lock:
+                    codigo = servidor.respuestas.pop(0) if servidor.respuestas else 200
+                    if comprimido and servidor.rechazar_gzip:
+                        codigo = 400
+                    registros = json.loads(gzip.decompress(cuerpo) if comprimido else cuerpo)
+                    servidor.solicitudes.append((codigo, comprimido, registros))
+                    ids = list(range(servidor._siguiente_id, servidor._siguiente_id + len(registros)))
+                    if codigo == 200:
+                        servidor._siguiente_id += len(registros)
+                respuesta = json.dumps([{"id": i} for i in ids] if codigo == 200 else {"error": codigo})
+                self.send_response(codigo)
+                self.send_header("Content-Length", str(len(respuesta)))
+                self.end_headers()
+                self.wfile.write(respuesta.encode())
+
+            def _leer_cuerpo(self):
+                if self.headers.get("Transfer-Encoding") == "chunked":
+                    partes = []
+                    while True:
+                        tamano = int(self.rfile.readline().strip(), 16)
+                        partes.append(self.rfile.read(tamano))
+                        self.rfile.readline()
+                        if tamano == 0:
+                            return b"".join(partes)
+                return self.rfile.read(int(self.headers["Content-Length"]))
+
+        self.http = ThreadingHTTPServer(("127.0.0.1", 0), Manejador)
+        self.url = f"http://127.0.0.1:{self.http.server_port}/registros"
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+
+    def cerrar(self):
+        self.http.shutdown()
+        self.http.server_close()
+
+@pytest.fixture
+def servidor():
+    servidores = []
+
+    def crear(**kwargs):
+        servidores.append(ServidorNinox(**kwargs))
+        return servidores[-1]
+    yield crear
+    for s in servidores:
+        s.cerrar()
+
+def registros(cantidad):
+    return [{"fields": {"Sku": i, "Depto": "Perecederos ñ"}} for i in range(cantidad)]
+
+def test_divide_en_bloques_y_conserva_el_orden(servidor):
+    s = servidor()
+    with SubidorNinox(s.url, {}, tamano_bloque=10, concurrencia=3, espera_base=0) as subidor:
+        resultados = subidor.enviar(registros(25))
+    assert [r.registros for r in resultados] == [10, 10, 5]
+    assert all(r.ok and r.intentos == 1 for r in resultados)
+    assert sorted(len(registros_) for _, _, registros_ in s.solicitudes) == [5, 10, 10]
+    recibidos = sorted(r["fields"]["Sku"] for _, _, lote in s.solicitudes for r in lote)
+    assert recibidos == list(range(25))
+    assert all(len(r.ids) == r.registros for r in resultados)
+
+def test_reintenta_solo_el_bloque_que_falla(servidor):
+    s = servidor(respuestas=[503, 429])
+    with SubidorNinox(s.url, {}, tamano_bloque=5, concurrencia=1, espera_base=0) as subidor:
+        resultados = subidor.enviar(registros(10))
+    assert all(r.ok for r in resultados)
+    assert [r.intentos for r in resultados] == [3, 1]
+    assert [codigo for codigo, _, _ in s.solicitudes] == [503, 429, 200, 200]
+
+def test_no_reintenta_errores_del_cliente(servidor):
+    s = servidor(respuestas=[400])
+    with SubidorNinox(s.url, {}, tamano_bloque=5, concurrencia=1, espera_base=0) as subidor:
+        primero, segundo = subidor.enviar(registros(10))
+    assert (primero.ok, primero.intentos, primero.codigo_estado) == (False, 1, 400)
+    assert segundo.ok
+
+def test_agota_los_reintentos(servidor):
+    s = servidor(respuestas=[500] * 10)
+    with SubidorNinox(s.url, {}, tamano_bloque=5, reintentos=2, espera_base=0) as subidor:
+        [resultado] = subidor.enviar(registros(5))
+    assert (resultado.ok, resultado.intentos, resultado.codigo_estado) == (False, 3, 500)
+
+def test_sin_comprimir_por_defecto(servidor):
+    s = servidor()
+    with SubidorNinox(s.url, {}) as subidor:
+        subidor.enviar(registros(3))
+    assert [comprimido for _, comprimido, _ in s.solicitudes] == [False]
+
+def test_cuerpo_gzip(servidor):
+    s = servidor()
+    with SubidorNinox(s.url, {}, tamano_bloque=50, compresion="gzip") as subidor:
+        [resultado] = subidor.enviar(registros(50))
+    assert resultado.ok and subidor.compresion_verificada
+    [(_, comprimido, recibidos)] = s.solicitudes
+    assert comprimido and recibidos == registros(50)
+    assert resultado.bytes_enviados < resultado.bytes_json
+
+def test_gzip_rechazado_vuelve_a_json(servidor, capsys):
+    s = servidor(rechazar_gzip=True)
+    with SubidorNinox(s.url, {}, tamano_bloque=5, concurrencia=4, compresion="gzip",
+                      espera_base=0) as subidor:
+        resultados = subidor.enviar(registros(40))
+    assert all(r.ok for r in resultados)
+    assert subidor.compresion == "ninguna"
+    assert capsys.readouterr().out.count("se envía sin comprimir") == 1
+    aceptados = [lote for codigo, _, lote in s.solicitudes if codigo == 200]
+    assert sorted(r["fields"]["Sku"] for lote in aceptados for r in lote) == list(range(40))
@@ -0,0 +1,47 @@
+"""
+Reproceso de exportaciones archivadas: el hash y la transformación de cada
+archivo se hacen en el grupo de procesos y se reutilizan al repetir la corrida.
+"""
+import pytest
+
+import reproceso
+import sintetico
+from manifiesto import Manifiesto, hash_archivo
+
+@pytest.fixture
+def exportaciones(tmp_path):
+    rutas = []
+    for semilla in (1, 2):
+        ruta = tmp_path / "exportaciones" / f"ventas_{semilla}.csv"
+        ruta.parent.mkdir(exist_ok=True)
+        sintetico.generar(str(ruta), 300, semilla=semilla)
+        rutas.append(str(ruta))
+    return rutas
+
+def reprocesar(tmp_path, rutas):
+    return reproceso.reprocesar(rutas, str(tmp_path / "salida"), procesos=2, corrida="prueba",
+                                cargar=False, directorio_manifiestos=str(tmp_path / "manifiestos"))
+
+def etapas(tmp_path, ruta):
+    return Manifiesto.leer(reproceso._clave_archivo(ruta), "prueba", str(tmp_path / "manifiestos"))["etapas"]
+
+def test_reutiliza_las_transformaciones_intactas(tmp_path, exportaciones, capsys):
+    assert reprocesar(tmp_path, exportaciones)
+    salida = capsys.readouterr().out
+    assert salida.count("transformación reutilizada") == 0
+    primeras = {ruta: etapas(tmp_path, ruta) for ruta in exportaciones}
+    for ruta, registro in primeras.items():
+        assert registro["extraccion"]["sha256"] == hash_archivo(ruta)
+        assert registro["transformacion"]["entrada"] == registro["extraccion"]["sha256"]
+        assert registro["transformacion"]["sha256"] == hash_archivo(registro["transformacion"]["ruta"])
+
+    # Con una exportación cambiada sólo ésa se vuelve a transformar
+    sintetico.generar(exportaciones[1], 200, semilla=9)
+    assert reprocesar(tmp_path, exportaciones)
+    salida = capsys.readouterr().out
+    assert salida.count("transformación reutilizada") == 1
+    assert etapas(tmp_path, exportaciones[0])["transformacion"] == primeras[exportaciones[0]]["transformacion"]
+    cambiada = etapas(tmp_path, exportaciones[1])
+    assert cambiada["extraccion"]["sha256"] == hash_archivo(exportaciones[1])
+    assert cambiada["transformacion"]["entrada"] == cambiada["extraccion"]["sha256"]
+    assert cambiada["transformacion"]["filas"] < primeras[exportaciones[1]]["transformacion"]["filas"]
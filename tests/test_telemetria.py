@@ -0,0 +1,52 @@
+"""
+Telemetría: el pico de memoria de un span es el de su etapa, no el del proceso.
+"""
+import time
+
+import pytest
+
+import telemetria
+
+MB = 1024 * 1024
+
+@pytest.fixture
+def eventos(monkeypatch):
+    eventos = []
+    monkeypatch.setattr(telemetria, "_activo", True)
+    monkeypatch.setattr(telemetria, "_exportadores", [eventos.append])
+    return eventos
+
+def ocupar(mb, segundos=0.3):
+    """
+    Ocupa 'mb' MB (escritos, así que cuentan en el RSS) durante 'segundos' y los libera.
+    """
+    datos = b"x" * (mb * MB)
+    time.sleep(segundos)
+    del datos
+
+def test_pico_por_etapa(eventos):
+    with telemetria.span("pesada"):
+        ocupar(200)
+    with telemetria.span("ligera"):
+        time.sleep(0.1)
+    pesada, ligera = (e["pico_memoria_mb"] for e in eventos)
+    # Con ru_maxrss la etapa ligera repetiría el pico de la pesada
+    assert pesada - ligera > 150
+
+def test_medicion_capta_picos_transitorios():
+    base = telemetria.memoria_mb()
+    with telemetria.MedicionMemoria() as externa:
+        with telemetria.MedicionMemoria() as interna:
+            ocupar(150)
+        despues = telemetria.memoria_mb()
+    assert interna.pico_mb - base > 100
+    assert externa.pico_mb >= interna.pico_mb
+    assert despues < interna.pico_mb - 100
+
+def test_el_muestreo_termina_sin_mediciones():
+    with telemetria.MedicionMemoria():
+        pass
+    limite = time.monotonic() + 2
+    while telemetria._muestreador._hilo is not None and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert telemetria._muestreador._hilo is None
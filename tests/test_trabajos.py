@@ -0,0 +1,77 @@
+"""
+Trabajos en segundo plano: estado, progreso y una sola ejecución por reporte y fecha.
+"""
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import trabajos
+from trabajos import AlmacenTrabajos, EjecucionEnCurso
+
+@pytest.fixture
+def almacen(tmp_path):
+    return AlmacenTrabajos(str(tmp_path / "trabajos"))
+
+def test_estado_y_progreso(almacen):
+    def funcion(avance):
+        avance("descarga")
+        avance("descarga", SimpleNamespace(ok=True, segundos=1.234, filas=None, error=None))
+        avance("carga")
+        avance("carga", SimpleNamespace(ok=True, segundos=0.5, filas=25, error=None))
+        return True, "listo"
+
+    trabajo, nuevo = trabajos.enviar(funcion, "ventas", "2025-03-01", total_etapas=4, almacen=almacen)
+    assert nuevo
+    final = trabajos.esperar(trabajo.id, intervalo=0.05, timeout=10, almacen=almacen)
+    assert (final.estado, final.salida, final.etapa) == ("ok", "listo", None)
+    assert [e["etapa"] for e in final.etapas] == ["descarga", "carga"]
+    assert final.etapas[0]["segundos"] == 1.23 and final.etapas[1]["filas"] == 25
+    assert final.progreso == 0.5
+
+def test_error_de_la_funcion(almacen):
+    def funcion(avance):
+        raise RuntimeError("sin conexión")
+
+    trabajo, _ = trabajos.enviar(funcion, "ventas", "2025-03-01", almacen=almacen)
+    final = trabajos.esperar(trabajo.id, intervalo=0.05, timeout=10, almacen=almacen)
+    assert (final.estado, final.error) == ("error", "sin conexión")
+
+def test_una_sola_ejecucion_por_reporte_y_fecha(almacen):
+    liberar = threading.Event()
+    llamadas = []
+
+    def funcion(avance):
+        llamadas.append(1)
+        liberar.wait(10)
+        return True, ""
+
+    primero, nuevo = trabajos.enviar(funcion, "ventas", "2025-03-01", almacen=almacen)
+    assert nuevo
+    segundo, nuevo = trabajos.enviar(funcion, "ventas", "2025-03-01", almacen=almacen)
+    assert not nuevo and segundo.id == primero.id
+    otra_fecha, nuevo = trabajos.enviar(lambda avance: (True, ""), "ventas", "2025-03-02",
+                                        almacen=almacen)
+    assert nuevo and otra_fecha.id != primero.id
+
+    liberar.set()
+    assert trabajos.esperar(primero.id, intervalo=0.05, timeout=10, almacen=almacen).estado == "ok"
+    assert len(llamadas) == 1
+    # Con el trabajo terminado, el siguiente envío inicia uno nuevo
+    tercero, nuevo = trabajos.enviar(lambda avance: (True, ""), "ventas", "2025-03-01",
+                                     almacen=almacen)
+    assert nuevo and tercero.id != primero.id
+    trabajos.esperar(tercero.id, intervalo=0.05, timeout=10, almacen=almacen)
+
+def test_candado_tomado_sin_trabajo_activo(almacen, monkeypatch):
+    monkeypatch.setattr(trabajos, "ESPERA_CANDADO", 0.1)
+    clave = almacen.clave("ventas", "2025-03-01")
+    # Otro proceso tiene el candado pero no registró un trabajo
+    with almacen.candado_ejecucion(clave):
+        with pytest.raises(EjecucionEnCurso) as error:
+            trabajos.enviar(lambda avance: (True, ""), "ventas", "2025-03-01", almacen=almacen)
+    assert error.value.trabajo is None
+
+def test_obtener_rechaza_ids_invalidos(almacen):
+    assert almacen.obtener("../etc/passwd") is None
+    assert almacen.obtener("0" * 32) is None
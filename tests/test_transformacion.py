@@ -0,0 +1,74 @@
+"""
+Transformación de la exportación (script1): la lectura con Arrow escribe
+exactamente el mismo archivo que la lectura original con pandas.
+"""
+import filecmp
+import os
+
+import pandas as pd
+import pytest
+
+import script1
+import sintetico
+from esquema import COLUMNAS_EXPORTACION
+
+def leer_csv_por_bloques_pandas(archivo_entrada, tamano_bloque=script1.TAMANO_BLOQUE_CSV):
+    """
+    Lectura original: read_csv con dtype=str y limpieza con .str de pandas.
+    """
+    with pd.read_csv(archivo_entrada, encoding='latin1', header=0, names=COLUMNAS_EXPORTACION,
+                     index_col=False, dtype=str, keep_default_na=False, na_filter=False,
+                     chunksize=tamano_bloque) as lector:
+        for bloque in lector:
+            for col in bloque.columns:
+                limpio = bloque[col].str.strip('"').str.lstrip('="')
+                bloque[col] = limpio.where(limpio.notna(), bloque[col])
+            yield bloque
+
+def escribir_exportacion(ruta):
+    """
+    Exportación pequeña con las dos formas de ="..." (sin comillas, como la
+    escribe chedlink, y entre comillas), acentos, comas dentro de comillas y
+    valores vacíos.
+    """
+    lineas = ['"=""Día""","=""NP""",' + ",".join(COLUMNAS_EXPORTACION[2:])]
+    for i in range(12):
+        fecha = f'="{i % 3 + 1:02d}/03/2025"' if i % 2 else f'"=""{i % 3 + 1:02d}/03/2025"""'
+        np_ = '="3285317"' if i == 4 else f'="{1000 + i}"'
+        depto = '"Ropa, Zapatería y Te (4)"' if i % 3 == 0 else "Línea Blanca (3)"
+        textos = [f'="{i}"', "Sureste", "D1", f'="{10 + i % 2}"', "Tienda Ñ", "Sub", depto,
+                  "Clase", "", "Capa", "Comprador Peña"]
+        numeros = ["" if (i + j) % 7 == 0 else f"{i * 3.25 + j:.2f}" for j in range(24)]
+        lineas.append(",".join([fecha, np_] + textos + numeros + [f"{20 + i}.5%", f"{i}%"]))
+    with open(ruta, "w", encoding="latin1", newline="") as f:
+        f.write("\r\n".join(lineas) + "\r\n")
+
+@pytest.fixture(params=["manual", "sintetico"])
+def exportacion(request, tmp_path):
+    ruta = str(tmp_path / "exportacion.csv")
+    if request.param == "manual":
+        escribir_exportacion(ruta)
+    else:
+        sintetico.generar(ruta, 500, semilla=3)
+    return ruta
+
+@pytest.mark.parametrize("tamano_bloque", [64, 100_000])
+def test_bloques_iguales_a_la_lectura_con_pandas(exportacion, tamano_bloque):
+    nuevos = list(script1.leer_csv_por_bloques(exportacion, tamano_bloque))
+    originales = list(leer_csv_por_bloques_pandas(exportacion, tamano_bloque))
+    assert len(nuevos) == len(originales)
+    for nuevo, original in zip(nuevos, originales):
+        pd.testing.assert_frame_equal(nuevo, original)
+
+def test_mismo_archivo_procesado(exportacion, tmp_path, monkeypatch):
+    salidas = {}
+    for lectura in ("arrow", "pandas"):
+        directorio = tmp_path / lectura
+        directorio.mkdir()
+        if lectura == "pandas":
+            monkeypatch.setattr(script1, "leer_csv_por_bloques", leer_csv_por_bloques_pandas)
+        salidas[lectura], _ = script1.transformar_archivo(
+            exportacion, tamano_bloque=64, formato="csv", con_resumenes=False,
+            directorio_salida=str(directorio))
+    assert os.path.basename(salidas["arrow"]) == os.path.basename(salidas["pandas"])
+    assert filecmp.cmp(salidas["arrow"], salidas["pandas"], shallow=False)
@@ -0,0 +1,258 @@
+"""
+Ejecuciones del bot en segundo plano con estado en disco local.
+
+Cada ejecución es un trabajo con un id; su estado (etapa actual, etapas
+terminadas con sus tiempos, resultado) se guarda como JSON en RUTA_TRABAJOS,
+de modo que otro proceso o la función de estado pueden consultarlo.
+
+Para que dos disparos del mismo reporte y fecha (dos llamadas manuales, o una
+manual y el timer de las 13:10) no abran dos navegadores ni carguen filas
+duplicadas, cada trabajo toma un candado de archivo por reporte y fecha
+durante toda la ejecución. Si el candado ya está tomado, enviar() devuelve el
+trabajo en curso en lugar de iniciar otro; si el candado sigue tomado sin un
+trabajo activo que devolver, lanza EjecucionEnCurso. El sistema operativo
+libera el candado si el proceso termina de forma inesperada.
+
+Uso local (sin Azure):
+    python trabajos.py <id>      # muestra el estado de un trabajo
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+
+from filelock import FileLock, Timeout
+
+RUTA_TRABAJOS = os.environ.get("RUTA_TRABAJOS", os.path.join("/tmp", "trabajos"))
+# Segundos que se espera el candado cuando el trabajo en curso ya terminó y lo está soltando
+ESPERA_CANDADO = float(os.environ.get("ESPERA_CANDADO", "10"))
+
+ESTADOS_ACTIVOS = ("pendiente", "ejecutando")
+
+class EjecucionEnCurso(Exception):
+    """
+    El candado del reporte y fecha sigue tomado después de ESPERA_CANDADO y no
+    hay un trabajo activo que devolver. 'trabajo' es el último trabajo
+    conocido de esa clave (o None).
+    """
+
+    def __init__(self, mensaje, trabajo=None):
+        super().__init__(mensaje)
+        self.trabajo = trabajo
+
+def _ahora():
+    return datetime.now().isoformat(timespec="seconds")
+
+@dataclass
+class Trabajo:
+    id: str
+    reporte: str
+    fecha: str
+    estado: str = "pendiente"
+    etapa: str = None
+    total_etapas: int = None
+    etapas: list = field(default_factory=list)
+    creado: str = None
+    inicio: str = None
+    fin: str = None
+    segundos: float = None
+    salida: str = None
+    error: str = None
+
+    @property
+    def activo(self):
+        return self.estado in ESTADOS_ACTIVOS
+
+    @property
+    def progreso(self):
+        """
+        Fracción de etapas terminadas (None si no se conoce el total).
+        """
+        if not self.total_etapas:
+            return None
+        return round(min(1.0, len(self.etapas) / self.total_etapas), 3)
+
+    def como_dict(self):
+        datos = asdict(self)
+        datos["progreso"] = self.progreso
+        return datos
+
+class AlmacenTrabajos:
+    """
+    Estado de los trabajos en un directorio local: un JSON por trabajo, un
+    candado por reporte y fecha y un apuntador al último trabajo de cada uno.
+    """
+
+    def __init__(self, directorio=RUTA_TRABAJOS):
+        os.makedirs(directorio, exist_ok=True)
+        self.directorio = directorio
+
+    def _ruta(self, nombre):
+        return os.path.join(self.directorio, nombre)
+
+    def guardar(self, trabajo):
+        # Se escribe en un temporal y se reemplaza para que nunca se lea un JSON a medias
+        ruta = self._ruta(f"{trabajo.id}.json")
+        temporal = f"{ruta}.{threading.get_ident()}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(trabajo.como_dict(), f, ensure_ascii=False, indent=2)
+        os.replace(temporal, ruta)
+
+    def obtener(self, id_trabajo):
+        """
+        Devuelve el Trabajo con ese id, o None si no existe.
+        """
+        if not id_trabajo or not re.fullmatch(r"[0-9a-f]{32}", id_trabajo):
+            return None
+        try:
+            with open(self._ruta(f"{id_trabajo}.json"), encoding="utf-8") as f:
+                datos = json.load(f)
+        except FileNotFoundError:
+            return None
+        datos.pop("progreso", None)
+        return Trabajo(**datos)
+
+    def clave(self, reporte, fecha):
+        return re.sub(r"[^\w.-]", "_", f"{reporte}_{fecha}")
+
+    def candado_ejecucion(self, clave):
+        # thread_local=False: lo toma quien envía y lo suelta el hilo que ejecuta
+        return FileLock(self._ruta(f"{clave}.lock"), thread_local=False)
+
+    def candado_registro(self, clave):
+        """
+        Candado corto que serializa los envíos de una misma clave.
+        """
+        return FileLock(self._ruta(f"{clave}.registro.lock"))
+
+    def trabajo_actual(self, clave):
+        try:
+            with open(self._ruta(f"{clave}.actual"), encoding="utf-8") as f:
+                return self.obtener(f.read().strip())
+        except FileNotFoundError:
+            return None
+
+    def marcar_actual(self, clave, id_trabajo):
+        with open(self._ruta(f"{clave}.actual"), "w", encoding="utf-8") as f:
+            f.write(id_trabajo)
+
+def _ejecutar(trabajo, funcion, candado, almacen):
+    """
+    Corre funcion(avance) en el hilo actual, guarda cada cambio de etapa y al
+    final el resultado, y suelta el candado.
+    """
+    lock = threading.Lock()
+    inicio = time.perf_counter()
+
+    def avance(etapa, resultado=None):
+        """
+        Sin resultado marca la etapa que empieza; con resultado (ResultadoEtapa)
+        registra la etapa terminada.
+        """
+        with lock:
+            if resultado is None:
+                trabajo.etapa = etapa
+            else:
+                trabajo.etapas.append({
+                    "etapa": etapa, "ok": resultado.ok, "segundos": round(resultado.segundos, 2),
+                    "filas": resultado.filas, "error": resultado.error,
+                })
+            almacen.guardar(trabajo)
+
+    try:
+        trabajo.estado = "ejecutando"
+        trabajo.inicio = _ahora()
+        almacen.guardar(trabajo)
+        exito, trabajo.salida = funcion(avance)
+        trabajo.estado = "ok" if exito else "error"
+    except Exception as e:
+        trabajo.estado = "error"
+        trabajo.error = str(e)
+    finally:
+        trabajo.etapa = None
+        trabajo.fin = _ahora()
+        trabajo.segundos = round(time.perf_counter() - inicio, 2)
+        almacen.guardar(trabajo)
+        candado.release()
+
+def enviar(funcion, reporte, fecha, total_etapas=None, almacen=None):
+    """
+    Inicia funcion(avance) en un hilo en segundo plano y devuelve (trabajo, nuevo)
+    sin esperar a que termine. 'funcion' devuelve (exito, salida) y puede llamar
+    avance(etapa) y avance(etapa, resultado) para informar su progreso.
+
+    Si ya hay un trabajo en curso para el mismo reporte y fecha, no se inicia
+    otro: se devuelve ese trabajo con nuevo=False. Si el candado no se suelta
+    en ESPERA_CANDADO segundos se lanza EjecucionEnCurso.
+    """
+    almacen = almacen or AlmacenTrabajos()
+    clave = almacen.clave(reporte, fecha)
+    candado = almacen.candado_ejecucion(clave)
+    with almacen.candado_registro(clave):
+        try:
+            candado.acquire(timeout=0)
+        except Timeout:
+            actual = almacen.trabajo_actual(clave)
+            if actual is not None and actual.activo:
+                return actual, False
+            # El trabajo anterior ya terminó y está por soltar el candado
+            try:
+                candado.acquire(timeout=ESPERA_CANDADO)
+            except Timeout:
+                actual = almacen.trabajo_actual(clave)
+                if actual is not None and actual.activo:
+                    return actual, False
+                raise EjecucionEnCurso(
+                    f"Otra ejecución de {reporte} {fecha} tiene el candado desde hace más de "
+                    f"{ESPERA_CANDADO:.0f} s", actual) from None
+
+        anterior = almacen.trabajo_actual(clave)
+        if anterior is not None and anterior.activo:
+            # Tenía el candado un proceso que terminó sin cerrar su trabajo
+            anterior.estado = "error"
+            anterior.error = "ejecución interrumpida"
+            anterior.fin = _ahora()
+            almacen.guardar(anterior)
+
+        trabajo = Trabajo(uuid.uuid4().hex, str(reporte), str(fecha),
+                          total_etapas=total_etapas, creado=_ahora())
+        almacen.guardar(trabajo)
+        almacen.marcar_actual(clave, trabajo.id)
+
+    hilo = threading.Thread(target=_ejecutar, args=(trabajo, funcion, candado, almacen),
+                            name=f"trabajo-{trabajo.id[:8]}")
+    hilo.start()
+    return trabajo, True
+
+def esperar(id_trabajo, intervalo=2.0, timeout=None, almacen=None):
+    """
+    Espera a que el trabajo termine (consultando su estado en disco, así que
+    sirve también para trabajos de otro proceso) y lo devuelve.
+    """
+    almacen = almacen or AlmacenTrabajos()
+    limite = None if timeout is None else time.monotonic() + timeout
+    while True:
+        trabajo = almacen.obtener(id_trabajo)
+        if trabajo is None or not trabajo.activo:
+            return trabajo
+        if limite is not None and time.monotonic() >= limite:
+            return trabajo
+        time.sleep(intervalo)
+
+def obtener(id_trabajo, almacen=None):
+    return (almacen or AlmacenTrabajos()).obtener(id_trabajo)
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Uso: python trabajos.py <id>")
+        sys.exit(2)
+    trabajo = obtener(sys.argv[1])
+    if trabajo is None:
+        print(f"No existe el trabajo {sys.argv[1]}")
+        sys.exit(1)
+    print(json.dumps(trabajo.como_dict(), ensure_ascii=False, indent=2))